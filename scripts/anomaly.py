@@ -0,0 +1,352 @@
+import math
+import time
+import calendar
+from collections import namedtuple
+import numpy as np
+from columnar import gap_breaks, SAMPLE_INTERVAL, MAX_GAP
+
+# ---------- Настройки ----------
+# Правило охранной сигнализации прошивки (checkAlarm в src/main.cpp)
+ALARM_DISTANCE = 50     # см: тревога при 0 < distance < ALARM_DISTANCE
+ALARM_DURATION = 3.0    # сек: сирена звучит не меньше этого после срабатывания
+ARMED_STATES = ("Standby", "Alarm!!!")   # ворота закрыты, охрана включена
+ALARM_STATE = "Alarm!!!"
+
+# Аномалии температуры и влажности: z-оценка относительно экспоненциального среднего
+SCORED_SENSORS = ("temperature", "humidity")
+EWM_SPAN = 150          # отсчётов (5 минут при кадре раз в 2 с)
+Z_THRESHOLD = 4.0       # |z| выше — аномальный отсчёт
+WARMUP = 30             # отсчётов после старта или простоя, пока z не считается
+# Нижняя граница стандартного отклонения: шаг показаний датчика,
+# иначе на ровном участке любое изменение на один шаг дало бы огромный z
+MIN_STD = {"temperature": 0.25, "humidity": 1.0}
+
+EWM_SCALE = 1e12        # предел масштабирования внутри блока ewm_filter
+
+Episode = namedtuple("Episode", "start end samples peak")
+EPISODE_DTYPE = np.dtype([
+    ("start", np.float64), ("end", np.float64), ("samples", np.int64), ("peak", np.float64),
+])
+
+def ewm_alpha(span=EWM_SPAN):
+    return 2.0 / (span + 1.0)
+
+# ---------- Экспоненциальные z-оценки ----------
+def ewm_filter(b, w, y0=0.0):
+    """
+    Рекуррентность y[i] = w * y[i-1] + b[i] (y[-1] = y0) без цикла по отсчётам.
+    Внутри блока — cumsum по b[i] / w**i, масштаб которого ограничен EWM_SCALE;
+    между блоками переносится только последнее значение (цикл по блокам, не по строкам).
+    """
+    n = len(b)
+    if n == 0 or w == 0:
+        return np.asarray(b, dtype=np.float64)
+    block = int(min(n, max(1, math.log(EWM_SCALE) / -math.log(w))))
+    blocks = -(-n // block)
+    padded = np.zeros(blocks * block)
+    padded[:n] = b
+    padded = padded.reshape(blocks, block)
+
+    steps = np.arange(block)
+    powers = w ** steps
+    partial = np.cumsum(padded / powers, axis=1) * powers
+
+    # Значение на входе каждого блока
+    carry = np.empty(blocks)
+    last = y0
+    tail = w ** block
+    for k in range(blocks):
+        carry[k] = last
+        last = partial[k, -1] + tail * last
+    return (partial + np.outer(carry, powers * w)).ravel()[:n]
+
+def ewm_scores(timestamp, values, span=EWM_SPAN, min_std=0.0, warmup=WARMUP, max_gap=MAX_GAP):
+    """
+    z-оценка каждого отсчёта относительно экспоненциального среднего и дисперсии
+    предыдущих: (x - mean) / max(std, min_std). Состояние сбрасывается после простоя
+    дольше max_gap; первые warmup отсчётов после сброса и пропуски (NaN) получают NaN.
+    Совпадает с EwmScore.update, применённым к ряду по порядку.
+    """
+    alpha = ewm_alpha(span)
+    w = 1.0 - alpha
+    scores = np.full(len(values), np.nan, dtype=np.float32)
+
+    finite = np.flatnonzero(np.isfinite(values))
+    x = values[finite].astype(np.float64)
+    bounds = np.concatenate(([0], gap_breaks(timestamp[finite], max_gap), [len(x)]))
+    for first, last in zip(bounds[:-1], bounds[1:]):
+        segment = x[first:last]
+        if len(segment) <= warmup:
+            continue
+        # Среднее: m[0] = x[0], m[j] = w*m[j-1] + alpha*x[j]; дисперсия по отклонениям
+        # от предыдущего среднего: v[0] = 0, v[j] = w*v[j-1] + w*alpha*d[j]**2
+        mean = ewm_filter(alpha * segment[1:], w, segment[0])
+        deviation = segment[1:] - np.concatenate(([segment[0]], mean[:-1]))
+        var = ewm_filter(w * alpha * deviation ** 2, w, 0.0)
+        std = np.sqrt(np.concatenate(([0.0], var[:-1])))
+        z = deviation / np.maximum(std, min_std)
+        z[:max(warmup - 1, 0)] = np.nan
+        scores[finite[first + 1:last]] = z
+    return scores
+
+class EwmScore:
+    """Потоковая z-оценка одного датчика: O(1) памяти и времени на отсчёт."""
+
+    __slots__ = ("alpha", "min_std", "warmup", "max_gap", "count", "mean", "var", "last_ts")
+
+    def __init__(self, span=EWM_SPAN, min_std=0.0, warmup=WARMUP, max_gap=MAX_GAP):
+        self.alpha = ewm_alpha(span)
+        self.min_std = min_std
+        self.warmup = warmup
+        self.max_gap = max_gap
+        self.count = 0
+        self.mean = self.var = 0.0
+        self.last_ts = None
+
+    def update(self, ts, value):
+        """z-оценка отсчёта (NaN, если не определена) с последующим обновлением состояния."""
+        if value is None or value != value:
+            return math.nan
+        if self.last_ts is not None and ts - self.last_ts > self.max_gap:
+            self.count = 0
+        self.last_ts = ts
+
+        if self.count == 0:
+            self.count, self.mean, self.var = 1, float(value), 0.0
+            return math.nan
+        deviation = value - self.mean
+        z = math.nan
+        if self.count >= self.warmup:
+            z = deviation / max(math.sqrt(self.var), self.min_std)
+        self.mean += self.alpha * deviation
+        self.var = (1.0 - self.alpha) * (self.var + self.alpha * deviation * deviation)
+        self.count += 1
+        return z
+
+# ---------- Эпизоды ----------
+def find_episodes(timestamp, active, values=None, hold=ALARM_DURATION, max_gap=MAX_GAP,
+                  reducer=np.fmin):
+    """
+    Эпизоды подряд идущих активных отсчётов — структурированный массив EPISODE_DTYPE.
+    Эпизод заканчивается первым неактивным отсчётом (или через SAMPLE_INTERVAL после
+    последнего активного, если дальше простой или конец данных); эпизоды, между которыми
+    прошло меньше hold, сливаются. peak — reducer по values активных отсчётов.
+    Совпадает с EpisodeTracker, применённым к ряду по порядку.
+    """
+    positions = np.flatnonzero(active)
+    if not len(positions):
+        return np.empty(0, dtype=EPISODE_DTYPE)
+    n = len(timestamp)
+    gap_before = np.zeros(n + 1, dtype=bool)  # позиция n — конец данных
+    gap_before[gap_breaks(timestamp, max_gap)] = True
+    gap_before[n] = True
+
+    # Непрерывные участки активных отсчётов
+    run_first = np.ones(len(positions), dtype=bool)
+    run_first[1:] = (np.diff(positions) > 1) | gap_before[positions[1:]]
+    run_index = np.flatnonzero(run_first)
+    first = positions[run_first]
+    last = positions[np.append(run_first[1:], True)]
+
+    observed = ~gap_before[last + 1]
+    starts = timestamp[first].astype(np.float64)
+    ends = np.where(observed, timestamp[np.minimum(last + 1, n - 1)], timestamp[last] + SAMPLE_INTERVAL)
+    ends = ends.astype(np.float64)
+
+    # Слияние участков, разделённых паузой короче hold
+    episode_first = np.ones(len(first), dtype=bool)
+    episode_first[1:] = ~(observed[:-1] & (starts[1:] - ends[:-1] < hold))
+    episode_last = np.append(episode_first[1:], True)
+
+    episodes = np.empty(int(episode_first.sum()), dtype=EPISODE_DTYPE)
+    episodes["start"] = starts[episode_first]
+    episodes["end"] = ends[episode_last]
+    episodes["samples"] = np.add.reduceat(last - first + 1, np.flatnonzero(episode_first))
+    if values is None:
+        episodes["peak"] = np.nan
+    else:
+        episodes["peak"] = reducer.reduceat(values[positions].astype(np.float64),
+                                            run_index[episode_first])
+    return episodes
+
+class EpisodeTracker:
+    """
+    Потоковое выделение эпизодов с теми же правилами, что find_episodes.
+    update возвращает эпизод, когда он гарантированно завершён, иначе None.
+    """
+
+    __slots__ = ("hold", "max_gap", "reducer", "start", "end", "samples", "peak",
+                 "last_active", "last_ts")
+
+    def __init__(self, hold=ALARM_DURATION, max_gap=MAX_GAP, reducer=min):
+        self.hold = hold
+        self.max_gap = max_gap
+        self.reducer = reducer
+        self.start = None       # начало текущего эпизода
+        self.end = None         # первый неактивный отсчёт после него (эпизод может продолжиться)
+        self.samples = 0
+        self.peak = None
+        self.last_active = None
+        self.last_ts = None
+
+    def _close(self, end=None):
+        episode = Episode(float(self.start), float(end if end is not None else self.end),
+                          self.samples, math.nan if self.peak is None else float(self.peak))
+        self.start = self.end = self.peak = None
+        self.samples = 0
+        return episode
+
+    def update(self, ts, active, value=None):
+        closed = None
+        if self.start is not None and ts - self.last_ts > self.max_gap:
+            closed = self._close(self.end if self.end is not None
+                                 else self.last_active + SAMPLE_INTERVAL)
+        self.last_ts = ts
+
+        if active:
+            if self.start is not None and self.end is not None and ts - self.end >= self.hold:
+                closed = self._close()
+            if self.start is None:
+                self.start = ts
+            self.end = None
+            self.samples += 1
+            self.last_active = ts
+            if value is not None:
+                self.peak = value if self.peak is None else self.reducer(self.peak, value)
+        elif self.start is not None:
+            if self.end is None:
+                self.end = ts
+            elif ts - self.end >= self.hold:
+                closed = self._close()
+        return closed
+
+    def flush(self):
+        """Завершает открытый эпизод (конец данных)."""
+        if self.start is None:
+            return None
+        return self._close(self.end if self.end is not None else self.last_active + SAMPLE_INTERVAL)
+
+# ---------- Правило прошивки ----------
+def state_mask(columns, names):
+    """Отсчёты, состояние которых входит в names (без учёта пробелов по краям)."""
+    codes = [code for code, state in enumerate(columns.states) if state.strip() in names]
+    return np.isin(columns.state, codes)
+
+def alarm_rule(distance, armed, threshold=ALARM_DISTANCE):
+    """Тревога по логике checkAlarm: охрана включена и 0 < distance < threshold."""
+    return armed & (distance > 0) & (distance < threshold)
+
+# ---------- Пакетный проход ----------
+def detect(columns, span=EWM_SPAN, threshold=Z_THRESHOLD, hold=ALARM_DURATION, max_gap=MAX_GAP):
+    """
+    Все виды обнаружения по колонкам SensorColumns (исходные отсчёты, не агрегаты):
+    {'alarm': эпизоды по правилу прошивки (peak — минимальная дистанция),
+     'reported': эпизоды состояния Alarm!!!, 'rule_agreement': доля совпадений правила
+     с состоянием, 'scores': {датчик: z}, датчик: эпизоды |z| > threshold (peak — max |z|)}.
+    """
+    timestamp = columns.timestamp
+    armed = state_mask(columns, ARMED_STATES)
+    reported = state_mask(columns, (ALARM_STATE,))
+    rule = alarm_rule(columns.distance, armed)
+
+    result = {
+        "alarm": find_episodes(timestamp, rule, columns.distance, hold, max_gap, np.fmin),
+        "reported": find_episodes(timestamp, reported, columns.distance, hold, max_gap, np.fmin),
+        "rule_agreement": float((rule == reported).mean()) if len(rule) else math.nan,
+        "scores": {},
+    }
+    for sensor in SCORED_SENSORS:
+        z = ewm_scores(timestamp, getattr(columns, sensor), span, MIN_STD[sensor], max_gap=max_gap)
+        magnitude = np.abs(z)
+        result["scores"][sensor] = z
+        result[sensor] = find_episodes(timestamp, magnitude > threshold, magnitude,
+                                       hold, max_gap, np.maximum)
+    return result
+
+# ---------- Потоковый режим ----------
+class StreamDetector:
+    """
+    Обнаружение на пути приёма для одного устройства: O(1) состояния на датчик.
+    update(data, ts) принимает запись парсера и возвращает завершённые эпизоды
+    [(вид, Episode)], где вид — 'alarm' или имя датчика; если задан device,
+    эпизоды печатаются и считаются в metrics (anomaly_episodes_total).
+    """
+
+    def __init__(self, device=None, metrics=None, span=EWM_SPAN, threshold=Z_THRESHOLD,
+                 hold=ALARM_DURATION, max_gap=MAX_GAP):
+        self.device = device
+        self.metrics = metrics
+        self.threshold = threshold
+        self.scores = {sensor: EwmScore(span, MIN_STD[sensor], max_gap=max_gap)
+                       for sensor in SCORED_SENSORS}
+        self.trackers = {"alarm": EpisodeTracker(hold, max_gap, min)}
+        for sensor in SCORED_SENSORS:
+            self.trackers[sensor] = EpisodeTracker(hold, max_gap, max)
+
+    def update(self, data, ts=None):
+        """ts по умолчанию — текущее местное время, как метки timestamp в базе."""
+        if ts is None:
+            ts = calendar.timegm(time.localtime())
+        closed = []
+        state = (data.get("state") or "").strip()
+        distance = data.get("distance")
+        alarm = (state in ARMED_STATES and distance is not None
+                 and 0 < distance < ALARM_DISTANCE)
+        episode = self.trackers["alarm"].update(ts, alarm, distance)
+        if episode is not None:
+            closed.append(("alarm", episode))
+
+        for sensor, score in self.scores.items():
+            magnitude = abs(score.update(ts, data.get(sensor)))
+            episode = self.trackers[sensor].update(ts, magnitude > self.threshold, magnitude)
+            if episode is not None:
+                closed.append((sensor, episode))
+        if closed:
+            self._report(closed)
+        return closed
+
+    def flush(self):
+        closed = []
+        for kind, tracker in self.trackers.items():
+            episode = tracker.flush()
+            if episode is not None:
+                closed.append((kind, episode))
+        if closed:
+            self._report(closed)
+        return closed
+
+    def _report(self, closed):
+        for kind, episode in closed:
+            if self.device is not None:
+                print(f"[ANOMALY] {self.device} {kind}: {describe(kind, episode)}")
+            if self.metrics is not None:
+                self.metrics.inc("anomaly_episodes_total", kind=kind, device=self.device)
+
+# ---------- Вывод ----------
+def format_time(ts):
+    return str(np.datetime64(int(ts), "s")).replace("T", " ")
+
+def describe(kind, episode):
+    """Строка эпизода для журнала и отчёта."""
+    start, end, samples, peak = episode
+    if kind in ("alarm", "reported"):
+        detail = f"мин. дистанция {peak:.1f} см"
+    else:
+        detail = f"max |z| {peak:.1f}"
+    return (f"{format_time(start)} — {format_time(end)}, {end - start:.0f} с, "
+            f"{samples} отсч., {detail}")
+
+def print_report(result, limit=10):
+    """Сводка detect: число и суммарная длительность эпизодов, последние limit эпизодов."""
+    titles = {
+        "alarm": f"Тревоги по правилу прошивки (охрана и 0 < distance < {ALARM_DISTANCE} см)",
+        "reported": f"Записанное состояние {ALARM_STATE}",
+        **{sensor: f"Аномалии {sensor} (|z| по EWMA)" for sensor in SCORED_SENSORS},
+    }
+    for kind, title in titles.items():
+        episodes = result[kind]
+        total = float((episodes["end"] - episodes["start"]).sum())
+        print(f"\n[ANOMALY] {title}: эпизодов {len(episodes)}, всего {total:.0f} с")
+        for episode in episodes[-limit:] if limit else ():
+            print(f"  {describe(kind, episode)}")
+    print(f"\n[ANOMALY] Совпадение правила с записанным состоянием: {result['rule_agreement']:.1%}")
@@ -0,0 +1,137 @@
+import io
+import os
+import time
+import argparse
+import tempfile
+import threading
+import contextlib
+import numpy as np
+from crypto_utils import load_keyring
+from frame_parser import FrameParser
+from logger_serial import BatchWriter, log_serial_data
+from metrics import Metrics
+from partitions import PartitionCatalog
+from replay_serial import open_pty, load_frames, replay
+
+CHUNK_SIZE = 4096        # размер порции при разборе отдельно от порта
+COMMIT_TIMEOUT = 30.0    # сколько ждать записи последних кадров (сек)
+
+class TimedWriter(BatchWriter):
+    """BatchWriter, запоминающий момент фиксации каждой строки."""
+
+    def __init__(self, *args, **kwargs):
+        self.commit_times = []
+        super().__init__(*args, **kwargs)
+
+    def _write(self, rows):
+        written = super()._write(rows)
+        if written:
+            self.commit_times.extend([time.perf_counter()] * written)
+        return written
+
+def report(name, records, cpu):
+    print(f"{name:<10} {records:>8} записей  {cpu / records * 1e6:>8.1f} мкс CPU/запись  "
+          f"{records / cpu:>10,.0f} записей/с на ядро")
+
+# ---------- Этапы по отдельности ----------
+def bench_parse(capture):
+    parser = FrameParser()
+    records = []
+    started = time.process_time()
+    for offset in range(0, len(capture), CHUNK_SIZE):
+        records += parser.feed(capture[offset:offset + CHUNK_SIZE])
+    report("parse", len(records), time.process_time() - started)
+    return records
+
+def bench_encrypt(records, keyring):
+    started = time.process_time()
+    rows = [(*keyring.encrypt_record(data), keyring.state_tag(data["state"])) for data in records]
+    report("encrypt", len(rows), time.process_time() - started)
+    return rows
+
+def bench_insert(rows):
+    with tempfile.TemporaryDirectory() as data_dir:
+        catalog = PartitionCatalog(data_dir)
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.process_time()
+            with BatchWriter(catalog) as writer:
+                for payload, key_id, tag in rows:
+                    writer.add(payload, tag, None, key_id)
+            cpu = time.process_time() - started
+        catalog.close()
+    report("insert", len(rows), cpu)
+
+# ---------- Сквозной прогон через псевдотерминал ----------
+def bench_end_to_end(frames, rate):
+    """
+    Кадры идут через pty в настоящий log_serial_data.
+    Задержка — от записи кадра в порт до фиксации его строки в базе
+    (порядок строк совпадает с порядком кадров).
+    """
+    master, slave, name = open_pty()
+    send_times = []
+    metrics = Metrics()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        catalog = PartitionCatalog(data_dir)
+        writer = TimedWriter(catalog, metrics=metrics)
+        # Эхо отключено: измеряется приём, а не вывод в консоль
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            logger = threading.Thread(target=log_serial_data, args=(name, catalog, writer),
+                                      kwargs={"echo": False, "metrics": metrics})
+            logger.start()
+            time.sleep(0.5)  # логгер открывает порт
+
+            cpu_started = time.process_time()
+            started = time.perf_counter()
+            replay(master, frames, rate, on_send=lambda index, moment: send_times.append(moment))
+
+            deadline = time.perf_counter() + COMMIT_TIMEOUT
+            while len(writer.commit_times) < len(frames) and time.perf_counter() < deadline:
+                time.sleep(0.01)
+            cpu = time.process_time() - cpu_started
+
+            os.close(master)  # логгер получает обрыв связи и завершается
+            logger.join()
+        os.close(slave)
+        catalog.close()
+
+    committed = len(writer.commit_times)
+    if not committed:
+        print("e2e: ни одна запись не зафиксирована")
+        return
+    elapsed = writer.commit_times[-1] - started
+    latency = np.array(writer.commit_times[:len(send_times)]) - np.array(send_times[:committed])
+    p50, p99 = np.percentile(latency * 1000, [50, 99])
+
+    print(f"e2e        {committed:>8} записей из {len(frames)}  {committed / elapsed:>10,.0f} записей/с")
+    print(f"           задержка кадр → commit: p50 {p50:.1f} мс, p99 {p99:.1f} мс")
+    print(f"           {cpu / committed * 1e6:.1f} мкс CPU/запись (логгер и проигрыватель вместе)")
+    print(f"           этапы: {metrics.stage_summary()}")
+
+# ---------- main ----------
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк приёма: разбор, шифрование, запись")
+    parser.add_argument("--capture", help="файл с записанным потоком (сырые байты)")
+    parser.add_argument("--frames", type=int, default=20000, help="кадров в синтетическом потоке")
+    parser.add_argument("--rate", type=float, default=0,
+                        help="кадров в секунду для сквозного прогона (0 — без ограничения)")
+    parser.add_argument("--no-e2e", action="store_true", help="только этапы по отдельности")
+    args = parser.parse_args()
+
+    frames = load_frames(args.capture, args.frames)
+    capture = b"".join(frames)
+    print(f"Поток: {len(frames)} кадров, {len(capture) / 1024 / 1024:.1f} МБ, "
+          f"CPU: {os.cpu_count()}")
+
+    keyring = load_keyring()
+    records = bench_parse(capture)
+    rows = bench_encrypt(records, keyring)
+    bench_insert(rows)
+
+    if not args.no_e2e:
+        bench_end_to_end(frames, args.rate or None)
+
+
+if __name__ == "__main__":
+    main()
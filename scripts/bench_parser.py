@@ -0,0 +1,78 @@
+import re
+import time
+import argparse
+from frame_parser import FrameParser, synthetic_stream
+
+# ---------- Прежний разбор (для сравнения) ----------
+def legacy_parse(capture: bytes):
+    """Построчное накопление строки и четыре re.search на кадр, как было в logger_serial."""
+    records = []
+    buffer = ""
+    for raw in capture.split(b"\n"):
+        line = raw.decode(errors="ignore").strip()
+        if not line:
+            continue
+        buffer += line + " "
+        if "System state" in line:
+            temp = re.search(r"Temperature:\s*([\d.]+)", buffer)
+            hum = re.search(r"Humidity:\s*([\d.]+)", buffer)
+            dist = re.search(r"Distance:\s*([\d.]+)", buffer)
+            state = re.search(r"System state:\s*([\w! ]+)", buffer)
+            records.append({
+                "temperature": float(temp.group(1)) if temp else None,
+                "humidity": float(hum.group(1)) if hum else None,
+                "distance": float(dist.group(1)) if dist else None,
+                "state": state.group(1) if state else None,
+            })
+            buffer = ""
+    return len(records)
+
+def parse_lines(capture: bytes):
+    """Подача потока по одной строке, как при ser.readline()."""
+    parser = FrameParser()
+    records = 0
+    for line in capture.splitlines(keepends=True):
+        records += len(parser.feed(line))
+    return records
+
+def parse_chunks(capture: bytes, chunk_size):
+    """Подача потока порциями фиксированного размера, как при чтении in_waiting."""
+    parser = FrameParser()
+    records = 0
+    for offset in range(0, len(capture), chunk_size):
+        records += len(parser.feed(capture[offset:offset + chunk_size]))
+    return records
+
+def measure(name, func, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        records = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{name:<28} {records:>9} записей  {records / best:>12,.0f} записей/с")
+
+# ---------- main ----------
+def main():
+    parser = argparse.ArgumentParser(description="Микробенчмарк разбора потока Serial")
+    parser.add_argument("--capture", help="файл с записанным потоком (сырые байты)")
+    parser.add_argument("--frames", type=int, default=100000, help="кадров в синтетическом потоке")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.capture:
+        with open(args.capture, "rb") as f:
+            capture = f.read()
+    else:
+        capture = b"".join(synthetic_stream(args.frames))
+    print(f"Поток: {len(capture) / 1024 / 1024:.1f} МБ")
+
+    measure("legacy (re.search x4)", lambda: legacy_parse(capture), args.repeat)
+    measure("FrameParser, по строкам", lambda: parse_lines(capture), args.repeat)
+    for chunk_size in (64, 4096):
+        measure(f"FrameParser, порции {chunk_size} Б",
+                lambda: parse_chunks(capture, chunk_size), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
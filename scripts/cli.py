@@ -0,0 +1,171 @@
+import os
+import time
+import argparse
+from datetime import datetime
+
+# Модуль загружается при каждом запуске: здесь только стандартная библиотека.
+# data_view (шифрование, SQLite) и тем более data_analyse (NumPy, графики)
+# импортируются внутри команд, которым они нужны
+
+# ---------- Настройки ----------
+TAIL_ROWS = 10          # строк в tail по умолчанию
+FOLLOW_INTERVAL = 1.0   # период опроса новых строк в tail --follow (сек)
+
+EXPORT_FORMATS = ("csv", "xlsx", "json", "db", "parquet", "all", "incremental")
+
+# ---------- Команды ----------
+def cmd_tail(args):
+    from data_view import DataViewer
+
+    viewer = DataViewer(cache_mb=0)
+    rows = viewer.query(limit=args.rows, newest_first=True)
+    rows.reverse()
+    viewer.display_data(rows, limit=len(rows))
+    if not args.follow:
+        return
+
+    last_id = rows[-1]['id'] if rows else 0
+    try:
+        while True:
+            time.sleep(args.interval)
+            for batch in viewer.iter_batches(after_id=last_id):
+                viewer.display_data(batch, limit=len(batch))
+                last_id = batch[-1]['id']
+    except KeyboardInterrupt:
+        pass
+
+def cmd_query(args):
+    from data_view import DataViewer
+    from partitions import TIME_FORMAT
+
+    viewer = DataViewer(cache_mb=0)
+    start = args.start
+    if args.last is not None:
+        start = (datetime.now() - args.last).strftime(TIME_FORMAT)
+    data = viewer.query(start, args.end, args.states, args.limit, args.newest_first)
+    viewer.display_data(data, limit=len(data))
+    print(f"\nНайдено записей: {len(data)}")
+
+def cmd_export(args):
+    from data_view import DataViewer
+
+    viewer = DataViewer(workers=args.workers)
+    if args.format == "incremental":
+        viewer.export_incremental()
+        return
+    if args.format == "parquet":
+        viewer.export_to_parquet(filename=args.output or 'decrypted_data.parquet',
+                                 start=args.start, end=args.end)
+        return
+    if args.format == "all":
+        viewer.export_all_formats()
+        return
+
+    # Остальные форматы принимают готовую выборку
+    data = viewer.get_all_data()
+    export = {
+        "csv": (viewer.export_to_csv, 'decrypted_data.csv'),
+        "xlsx": (viewer.export_to_excel, 'decrypted_data.xlsx'),
+        "json": (viewer.export_to_json, 'decrypted_data.ndjson'),
+        "db": (viewer.save_decrypted_database, 'decrypted_data.db'),
+    }
+    method, default = export[args.format]
+    method(data, args.output or default)
+
+def cmd_report(args):
+    from data_view import DataViewer
+
+    DataViewer(workers=args.workers, cache_mb=0).generate_report()
+
+def cmd_dashboard(args):
+    from data_analyse import DataAnalyzer
+
+    analyzer = DataAnalyzer(args.data, start=args.start, end=args.end, use_rollups=not args.raw,
+                            workers=args.jobs, force=args.force)
+    if args.only:
+        analyzer.render([args.only])
+    else:
+        analyzer.run_analysis()
+
+def cmd_anomalies(args):
+    from data_analyse import EXPORTS_DIR, default_data_file, load_raw_columns, to_epoch
+    from anomaly import detect, print_report, Z_THRESHOLD, EWM_SPAN
+
+    path = os.path.join(EXPORTS_DIR, args.data or default_data_file())
+    columns = load_raw_columns(path, to_epoch(args.start), to_epoch(args.end))
+    print(f"[ANOMALY] {os.path.basename(path)}: {len(columns)} отсчётов")
+    span = EWM_SPAN if args.span is None else args.span
+    threshold = Z_THRESHOLD if args.z is None else args.z
+    print_report(detect(columns, span=span, threshold=threshold), args.limit)
+
+# ---------- Аргументы ----------
+def parse_time(value):
+    from data_view import parse_time as parse
+    return parse(value)
+
+def parse_duration(value):
+    from data_view import parse_duration as parse
+    return parse(value)
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Просмотр, экспорт и анализ данных Arduino")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    tail = commands.add_parser("tail", help="последние записи")
+    tail.add_argument("-n", "--rows", type=int, default=TAIL_ROWS, help="сколько записей показать")
+    tail.add_argument("-f", "--follow", action="store_true", help="дописывать новые записи по мере прихода")
+    tail.add_argument("--interval", type=float, default=FOLLOW_INTERVAL, help="период опроса (сек)")
+    tail.set_defaults(func=cmd_tail)
+
+    query = commands.add_parser("query", help="выборка за период по индексу")
+    query.add_argument("--start", type=parse_time, help="начало периода")
+    query.add_argument("--end", type=parse_time, help="конец периода (не включительно)")
+    query.add_argument("--last", type=parse_duration, help="последний период, например 1h")
+    query.add_argument("--state", action="append", dest="states",
+                       help="фильтр по состоянию (можно несколько раз)")
+    query.add_argument("--limit", type=int, help="максимум записей")
+    query.add_argument("--newest-first", action="store_true", help="сначала новые")
+    query.set_defaults(func=cmd_query)
+
+    export = commands.add_parser("export", help="экспорт расшифрованных данных")
+    export.add_argument("--format", choices=EXPORT_FORMATS, default="incremental")
+    export.add_argument("--output", help="имя файла в папке exports")
+    export.add_argument("--start", type=parse_time, help="начало периода (parquet)")
+    export.add_argument("--end", type=parse_time, help="конец периода (parquet)")
+    export.add_argument("--workers", type=int, help="процессов расшифровки")
+    export.set_defaults(func=cmd_export)
+
+    report = commands.add_parser("report", help="статистический отчёт по накопленным агрегатам")
+    report.add_argument("--workers", type=int, help="процессов расшифровки новых строк")
+    report.set_defaults(func=cmd_report)
+
+    dashboard = commands.add_parser("dashboard", help="графики PNG и интерактивный HTML")
+    dashboard.add_argument("--data", help="файл в exports: decrypted_store.db, decrypted_data*.db или .parquet")
+    dashboard.add_argument("--start", help="начало периода: YYYY-MM-DD[ HH:MM:SS]")
+    dashboard.add_argument("--end", help="конец периода (не включительно)")
+    dashboard.add_argument("--raw", action="store_true", help="не использовать агрегаты")
+    dashboard.add_argument("--only", choices=("static", "dashboard"), help="только один график")
+    dashboard.add_argument("--jobs", type=int, help="процессов отрисовки")
+    dashboard.add_argument("--force", action="store_true", help="перерисовать неизменившиеся графики")
+    dashboard.set_defaults(func=cmd_dashboard)
+
+    anomalies = commands.add_parser("anomalies", help="эпизоды тревог и аномалий датчиков")
+    anomalies.add_argument("--data", help="файл в exports: decrypted_store.db, decrypted_data*.db или .parquet")
+    anomalies.add_argument("--start", help="начало периода: YYYY-MM-DD[ HH:MM:SS]")
+    anomalies.add_argument("--end", help="конец периода (не включительно)")
+    # Значения по умолчанию берутся из anomaly.py при запуске команды (он импортирует NumPy)
+    anomalies.add_argument("--z", type=float, help="порог |z| аномалии (по умолчанию Z_THRESHOLD)")
+    anomalies.add_argument("--span", type=int, help="окно EWMA, отсчётов (по умолчанию EWM_SPAN)")
+    anomalies.add_argument("--limit", type=int, default=TAIL_ROWS, help="последних эпизодов каждого вида")
+    anomalies.set_defaults(func=cmd_anomalies)
+
+    return parser
+
+# ---------- main ----------
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+import os
+import json
+import sqlite3
+import numpy as np
+from frame_parser import STATES, normalize_state
+
+# ---------- Настройки ----------
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = os.path.join(BASE_DIR, "analysis", "cache")
+CACHE_VERSION = 2
+FETCH_SIZE = 50000
+
+# Известные состояния прошивки получают постоянные коды, остальные — следующие по порядку.
+# Все написания сводятся к нормализованному (normalize_state): 'Alarm!!! ' → 'Alarm!!!'
+KNOWN_STATES = list(STATES)
+MISSING = np.float32(-3.0e38)  # метка NULL/нечисловых значений при чтении из SQLite
+NO_STATE = 255                 # код записи без состояния
+
+SENSORS = ("temperature", "humidity", "distance")
+
+SAMPLE_INTERVAL = 2  # период отправки кадров прошивкой, сек (INTERVAL_SENSOR в src/main.cpp)
+MAX_GAP = 30         # разрыв между отсчётами дольше этого — простой логгера, а не данные
+
+class SensorColumns:
+    """
+    Колонки сенсорных данных в типизированных массивах NumPy:
+    timestamp — int64 (секунды эпохи), сенсоры — float32 (NaN для пропусков),
+    state — uint8 коды, расшифровка кодов — в states (NO_STATE — состояние не известно).
+    """
+
+    def __init__(self, timestamp, temperature, humidity, distance, state, states):
+        self.timestamp = timestamp
+        self.temperature = temperature
+        self.humidity = humidity
+        self.distance = distance
+        self.state = state
+        self.states = list(states)
+
+    def __len__(self):
+        return len(self.timestamp)
+
+    def between(self, start=None, end=None):
+        """Отсчёты с меткой времени в [start, end) (секунды эпохи, None — без границы)."""
+        first = 0 if start is None else int(np.searchsorted(self.timestamp, start, "left"))
+        last = len(self) if end is None else int(np.searchsorted(self.timestamp, end, "left"))
+        if first == 0 and last == len(self):
+            return self
+        return SensorColumns(
+            self.timestamp[first:last], self.temperature[first:last],
+            self.humidity[first:last], self.distance[first:last],
+            self.state[first:last], self.states,
+        )
+
+    def with_gaps(self, max_gap=MAX_GAP):
+        """
+        Колонки для графиков: пропуски сенсоров внутри разрыва не длиннее max_gap
+        интерполируются, а после каждого простоя вставляется строка-разрыв
+        (NaN во всех сенсорах, состояние NO_STATE), чтобы линии не соединяли его края.
+        """
+        breaks = gap_breaks(self.timestamp, max_gap)
+        sensors = {sensor: getattr(self, sensor) for sensor in SENSORS}
+        if not len(breaks) and not any(np.isnan(values).any() for values in sensors.values()):
+            return self
+        return SensorColumns(
+            timestamp=np.insert(self.timestamp, breaks, self.timestamp[breaks - 1]),
+            state=np.insert(self.state, breaks, NO_STATE),
+            states=self.states,
+            **{sensor: gapped(self.timestamp, values, breaks, max_gap)
+               for sensor, values in sensors.items()},
+        )
+
+    def to_frame(self):
+        """DataFrame для построения графиков (без разбора строк и object-колонок)."""
+        import pandas as pd
+
+        return pd.DataFrame({
+            "timestamp": pd.to_datetime(self.timestamp, unit="s"),
+            "temperature": self.temperature,
+            "humidity": self.humidity,
+            "distance": self.distance,
+            "state": pd.Categorical.from_codes(
+                np.where(self.state == NO_STATE, -1, self.state.astype(np.int16)), self.states
+            ),
+        })
+
+def state_list(found):
+    """
+    Список нормализованных состояний для кодов: известные — первыми, остальные по алфавиту.
+    Код значения из базы — states.index(normalize_state(value)).
+    """
+    found = {normalize_state(state) for state in found}
+    states = KNOWN_STATES + sorted(
+        state for state in found if state is not None and state not in KNOWN_STATES
+    )
+    if len(states) > NO_STATE:
+        raise ValueError("Слишком много различных состояний для кода uint8")
+    return states
+
+def state_code(states, value):
+    """Код исходного значения состояния в списке state_list (пустое — NO_STATE)."""
+    state = normalize_state(value)
+    return NO_STATE if state is None else states.index(state)
+
+# ---------- Разрывы ----------
+def gap_breaks(timestamp, max_gap=MAX_GAP):
+    """Позиции отсчётов, перед которыми был простой дольше max_gap."""
+    return np.flatnonzero(np.diff(timestamp) > max_gap) + 1
+
+def fill_gaps(timestamp, values, max_gap=MAX_GAP):
+    """
+    Линейная интерполяция NaN по времени между ближайшими известными отсчётами,
+    если они отстоят не дальше max_gap. Длинные разрывы и края ряда остаются NaN.
+    """
+    missing = np.isnan(values)
+    if not missing.any() or missing.all():
+        return values
+
+    # Ближайший известный отсчёт слева и справа от каждой позиции
+    n = len(values)
+    positions = np.arange(n)
+    before = np.maximum.accumulate(np.where(missing, -1, positions))
+    after = np.minimum.accumulate(np.where(missing, n, positions)[::-1])[::-1]
+
+    inside = np.flatnonzero(missing & (before >= 0) & (after < n))
+    before, after = before[inside], after[inside]
+    span = timestamp[after] - timestamp[before]
+    short = span <= max_gap
+    inside, before, after, span = inside[short], before[short], after[short], span[short]
+
+    weight = (timestamp[inside] - timestamp[before]) / np.maximum(span, 1)
+    filled = np.array(values, copy=True)  # кеш отображён в память только для чтения
+    filled[inside] = values[before] + weight * (values[after] - values[before])
+    return filled
+
+def gapped(timestamp, values, breaks, max_gap=MAX_GAP):
+    """Ряд с интерполяцией коротких пропусков и NaN-строками в позициях breaks."""
+    return np.insert(fill_gaps(timestamp, values, max_gap), breaks, np.nan)
+
+# ---------- Чтение из SQLite ----------
+def numeric_sql(column):
+    # Текст (например, <DECRYPTION_ERROR>) и NULL превращаются в метку пропуска
+    return (f"IFNULL(CASE WHEN typeof({column}) IN ('real', 'integer') "
+            f"THEN {column} END, {float(MISSING)!r})")
+
+def read_columns(db_path, table="sensor_data"):
+    """Читает таблицу расшифрованных данных сразу в типизированные массивы."""
+    conn = sqlite3.connect(db_path)
+    try:
+        values = [row[0] for row in conn.execute(f"SELECT DISTINCT state FROM {table}")]
+        states = state_list(values)
+
+        # Код состояния считается в SQL по исходным написаниям; NULL получает код NO_STATE
+        codes = [(value, state_code(states, value)) for value in values if value is not None]
+        cases = " ".join("WHEN ? THEN ?" for _ in codes) or "WHEN NULL THEN NULL"
+        params = [item for pair in codes for item in pair]
+        cur = conn.execute(f"""
+            SELECT CAST(strftime('%s', timestamp) AS INTEGER),
+                   {numeric_sql('temperature')}, {numeric_sql('humidity')}, {numeric_sql('distance')},
+                   CASE state {cases} ELSE {NO_STATE} END
+            FROM {table}
+            WHERE strftime('%s', timestamp) IS NOT NULL
+            ORDER BY timestamp
+        """, params)
+
+        dtype = np.dtype([
+            ("timestamp", np.int64), ("temperature", np.float32),
+            ("humidity", np.float32), ("distance", np.float32), ("state", np.uint8),
+        ])
+        chunks = []
+        while True:
+            rows = cur.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            chunks.append(np.fromiter(rows, dtype=dtype, count=len(rows)))
+    finally:
+        conn.close()
+
+    records = np.concatenate(chunks) if chunks else np.empty(0, dtype=dtype)
+
+    columns = {}
+    for sensor in SENSORS:
+        values = np.ascontiguousarray(records[sensor])
+        values[values == MISSING] = np.nan
+        columns[sensor] = values
+
+    return SensorColumns(
+        np.ascontiguousarray(records["timestamp"]),
+        columns["temperature"], columns["humidity"], columns["distance"],
+        np.ascontiguousarray(records["state"]),
+        states,
+    )
+
+# ---------- Чтение из Parquet ----------
+def load_parquet(path, start=None, end=None):
+    """
+    Колонки из экспорта Parquet (см. data_view.ParquetSink) без промежуточной SQLite:
+    читаются только нужные колонки, а период [start, end) (секунды эпохи) передаётся
+    фильтром — группы строк вне периода пропускаются по их статистике min/max.
+    """
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    filters = []
+    if start is not None:
+        filters.append(("timestamp", ">=", np.datetime64(int(start), "s")))
+    if end is not None:
+        filters.append(("timestamp", "<", np.datetime64(int(end), "s")))
+    table = pq.read_table(
+        path, columns=["timestamp", *SENSORS, "state"],
+        filters=filters or None, read_dictionary=["state"],
+    )
+    table = table.filter(pc.is_valid(table["timestamp"]))
+
+    timestamp = table["timestamp"].cast("timestamp[s]").cast("int64").to_numpy()
+    order = None
+    if len(timestamp) and np.any(timestamp[1:] < timestamp[:-1]):
+        order = np.argsort(timestamp, kind="stable")  # файл идёт в порядке id
+
+    columns = {}
+    for sensor in SENSORS:
+        values = table[sensor].to_numpy().astype(np.float32)  # null → NaN
+        columns[sensor] = values if order is None else values[order]
+
+    # Коды состояний: словарь колонки переводится в коды state_list
+    state = table["state"].combine_chunks()
+    states = state_list(state.dictionary.to_pylist())
+    lookup = np.array([state_code(states, value) for value in state.dictionary.to_pylist()] + [NO_STATE],
+                      dtype=np.uint8)
+    indices = state.indices.fill_null(len(lookup) - 1).to_numpy()
+    codes = lookup[indices]
+
+    return SensorColumns(
+        timestamp if order is None else timestamp[order],
+        columns["temperature"], columns["humidity"], columns["distance"],
+        codes if order is None else codes[order],
+        states,
+    )
+
+# ---------- Дисковый кеш ----------
+def _source_signature(db_path):
+    """Отпечаток источника: mtime и размер базы (и её WAL, если есть)."""
+    signature = []
+    for path in (db_path, db_path + "-wal"):
+        if os.path.exists(path):
+            stat = os.stat(path)
+            signature.append([stat.st_mtime_ns, stat.st_size])
+    return signature
+
+def load_columns(db_path, table="sensor_data", cache_dir=CACHE_DIR):
+    """
+    Колонки из базы через кеш .npy, привязанный к mtime источника.
+    Повторная загрузка отображает файлы в память (mmap) без чтения SQLite.
+    """
+    cache_path = os.path.join(cache_dir, os.path.splitext(os.path.basename(db_path))[0])
+    meta_path = os.path.join(cache_path, "meta.json")
+    signature = _source_signature(db_path)
+
+    if os.path.exists(meta_path):
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        if (meta.get("version") == CACHE_VERSION and meta.get("source") == os.path.abspath(db_path)
+                and meta.get("signature") == signature and meta.get("table") == table):
+            arrays = {
+                name: np.load(os.path.join(cache_path, name + ".npy"), mmap_mode="r")
+                for name in ("timestamp",) + SENSORS + ("state",)
+            }
+            return SensorColumns(states=meta["states"], **arrays)
+
+    columns = read_columns(db_path, table)
+
+    os.makedirs(cache_path, exist_ok=True)
+    for name in ("timestamp",) + SENSORS + ("state",):
+        np.save(os.path.join(cache_path, name + ".npy"), getattr(columns, name))
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "version": CACHE_VERSION,
+            "source": os.path.abspath(db_path),
+            "table": table,
+            "signature": signature,
+            "states": columns.states,
+        }, f, ensure_ascii=False)
+
+    return columns
+
+# ---------- Интервалы состояний ----------
+def state_runs(timestamp, state):
+    """
+    Run-length кодирование колонки состояний.
+    Возвращает массивы (начало, конец, код) непрерывных интервалов;
+    интервал заканчивается в момент начала следующего.
+    """
+    if len(state) == 0:
+        return timestamp[:0], timestamp[:0], state[:0]
+
+    change = np.flatnonzero(state[1:] != state[:-1]) + 1
+    first = np.concatenate(([0], change))
+    last = np.concatenate((change, [len(state) - 1]))
+    return timestamp[first], timestamp[last], state[first]
+
+def merge_short_runs(starts, ends, codes, min_duration):
+    """
+    Убирает интервалы короче min_duration (например, уже одного пикселя графика):
+    их время достаётся предыдущему интервалу, соседние одинаковые сливаются.
+    """
+    if len(codes) == 0 or min_duration <= 0:
+        return starts, ends, codes
+
+    keep = (ends - starts) >= min_duration
+    if not keep.any():
+        keep[np.argmax(ends - starts)] = True
+
+    first_start, last_end = starts[0], ends[-1]
+    starts, codes = starts[keep].copy(), codes[keep]
+    starts[0] = first_start
+    ends = np.append(starts[1:], last_end)
+
+    group_start = np.concatenate(([True], codes[1:] != codes[:-1]))
+    group_end = np.append(group_start[1:], True)
+    return starts[group_start], ends[group_end], codes[group_start]
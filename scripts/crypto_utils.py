@@ -1,34 +1,197 @@
 from cryptography.fernet import Fernet
+import base64
+import hashlib
+import hmac
+import json
+import math
 import os
+import struct
+import threading
+from typing import Optional
+from frame_parser import normalize_state
 
 KEY_FILE = os.path.join("secrets", "secret.key")
+KEYRING_FILE = os.path.join("secrets", "keyring.json")
+LEGACY_KEY_ID = 1  # ключ из secret.key; им зашифрованы строки без key_id
+
+# Форматы хранения записи в таблице logs
+RECORD_FORMAT_FIELDS = 1  # старый формат: отдельный Fernet-токен на каждое поле
+RECORD_FORMAT_BLOB = 2    # одна упакованная запись в одном токене (колонка payload)
+
+# temperature, humidity, distance (float64), далее состояние в UTF-8
+_RECORD_STRUCT = struct.Struct("<ddd")
+
+class KeyringError(Exception):
+    """Ключ повреждён или отсутствует — данные нельзя расшифровать без восстановления."""
+
+# ---------- Связка ключей ----------
+class KeyRing:
+    """
+    Набор версионированных ключей Fernet в памяти.
+    Новые записи шифруются активным ключом, а номер ключа хранится в строке
+    (logs.key_id), поэтому нужный ключ выбирается по словарю, без перебора.
+    Ключ для state_tag хранится отдельно и не меняется при ротации,
+    иначе индекс по состоянию перестал бы совпадать для старых строк.
+    """
+
+    def __init__(self, keys, active_id, tag_key, path=None):
+        self.path = path
+        self._keys = {}
+        self._fernets = {}
+        for key_id, key in keys.items():
+            self._add(int(key_id), key)
+        if active_id not in self._keys or not tag_key:
+            raise KeyringError("В связке нет активного ключа или ключа state_tag")
+        self.active_id = active_id
+        self.tag_key = tag_key.encode() if isinstance(tag_key, str) else bytes(tag_key)
+        self._missing = set()  # номера, которых нет и в файле (файл не перечитывается снова)
+        self._lock = threading.Lock()
+
+    def _add(self, key_id, key):
+        key = key.encode() if isinstance(key, str) else bytes(key)
+        try:
+            fernet = Fernet(key)
+        except Exception:
+            raise KeyringError(
+                f"Ключ {key_id} повреждён. Восстановите {self.path or KEY_FILE} из резервной копии: "
+                f"новый ключ не расшифрует уже записанные данные"
+            )
+        self._keys[key_id] = key
+        self._fernets[key_id] = fernet
+
+    @classmethod
+    def load(cls, path=KEYRING_FILE):
+        try:
+            with open(path, encoding="utf-8") as f:
+                meta = json.load(f)
+            keys = {int(key_id): key for key_id, key in meta["keys"].items()}
+            active_id, tag_key = int(meta["active"]), meta["tag_key"]
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            raise KeyringError(f"Связка ключей {path} повреждена ({e}). "
+                               f"Восстановите файл из резервной копии")
+        return cls(keys, active_id, tag_key, path)
+
+    def save(self):
+        """Атомарная запись связки: сначала во временный файл, затем replace."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "active": self.active_id,
+                "tag_key": self.tag_key.decode(),
+                "keys": {str(key_id): key.decode() for key_id, key in self._keys.items()},
+            }, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def reload(self):
+        """Перечитывает файл связки (ключ мог добавить другой процесс)."""
+        fresh = KeyRing.load(self.path)
+        with self._lock:
+            self._keys, self._fernets = fresh._keys, fresh._fernets
+            self.active_id, self.tag_key = fresh.active_id, fresh.tag_key
+
+    @property
+    def key_ids(self):
+        return sorted(self._keys)
+
+    @property
+    def active_fernet(self):
+        return self._fernets[self.active_id]
+
+    def fernet(self, key_id):
+        """Fernet для ключа key_id (None — строка записана до появления связки)."""
+        if key_id is None:
+            key_id = LEGACY_KEY_ID
+        fernet = self._fernets.get(key_id)
+        if fernet is None and self.path is not None and key_id not in self._missing:
+            self.reload()
+            fernet = self._fernets.get(key_id)
+        if fernet is None:
+            self._missing.add(key_id)
+            raise KeyringError(f"Ключ {key_id} отсутствует в связке")
+        return fernet
+
+    def encrypt_record(self, data):
+        """Шифрует запись активным ключом: возвращает (блоб, key_id)."""
+        key_id = self.active_id
+        return encrypt_record(self._fernets[key_id], data), key_id
+
+    def decrypt_record(self, blob, key_id):
+        return decrypt_record(self.fernet(key_id), blob)
+
+    def state_tag(self, state):
+        return state_tag(self.tag_key, state)
+
+    def rotate(self):
+        """
+        Добавляет новый ключ и делает его активным. Старые строки не трогаются:
+        их перешифровывает фоновый key_rotation по мере возможности.
+        """
+        with self._lock:
+            key_id = max(self._keys) + 1
+            self._add(key_id, Fernet.generate_key())
+            self.active_id = key_id
+            self.save()
+        print(f"[CRYPTO] Активен новый ключ {key_id}")
+        return key_id
+
+    def retire(self, key_id):
+        """Удаляет ключ из связки (вызывающий проверяет, что строк с ним не осталось)."""
+        if key_id == self.active_id:
+            raise KeyringError(f"Ключ {key_id} активен")
+        with self._lock:
+            del self._keys[key_id]
+            del self._fernets[key_id]
+            self.save()
+        print(f"[CRYPTO] Ключ {key_id} выведен из связки")
+
+    def material(self):
+        """Ключи для передачи в процессы-воркеры: (ключи, активный, ключ state_tag)."""
+        return dict(self._keys), self.active_id, self.tag_key
+
+# Загруженные связки: файл читается один раз на процесс
+_keyrings = {}
+
+def load_keyring(path=KEYRING_FILE) -> KeyRing:
+    """
+    Связка ключей из кеша процесса. При первом запуске существующий secret.key
+    становится ключом 1, а для state_tag создаётся отдельный ключ (у старых строк
+    тега нет, поэтому переиндексация не нужна, а вывод ключа 1 не раскрывает индекс);
+    новый ключ создаётся, только если ключей нет совсем.
+    Повреждённый ключ не пересоздаётся — выбрасывается KeyringError.
+    """
+    path = os.path.abspath(path)
+    keyring = _keyrings.get(path)
+    if keyring is not None:
+        return keyring
+
+    if os.path.exists(path):
+        keyring = KeyRing.load(path)
+    else:
+        legacy_path = os.path.join(os.path.dirname(path), os.path.basename(KEY_FILE))
+        if os.path.exists(legacy_path):
+            with open(legacy_path, "rb") as f:
+                key = f.read().strip()
+            keyring = KeyRing({LEGACY_KEY_ID: key}, LEGACY_KEY_ID, Fernet.generate_key(), path)
+            print(f"[CRYPTO] Ключ {legacy_path} перенесён в связку {path}")
+        else:
+            keyring = KeyRing(
+                {LEGACY_KEY_ID: Fernet.generate_key()}, LEGACY_KEY_ID, Fernet.generate_key(), path
+            )
+            print(f"[CRYPTO] Новый ключ создан: {path}")
+        keyring.save()
+
+    _keyrings[path] = keyring
+    return keyring
+
+def load_or_create_key_bytes() -> bytes:
+    """Сырые байты активного ключа (для кода, не знающего о связке)."""
+    keyring = load_keyring()
+    return keyring.material()[0][keyring.active_id]
 
 def load_or_create_key():
     """Создаёт новый или загружает существующий ключ шифрования."""
-    # Создаём папку secrets, если её нет
-    os.makedirs(os.path.dirname(KEY_FILE), exist_ok=True)
-
-    # Если файл отсутствует или пустой — создаём новый ключ
-    if not os.path.exists(KEY_FILE) or os.path.getsize(KEY_FILE) == 0:
-        key = Fernet.generate_key()
-        with open(KEY_FILE, "wb") as f:
-            f.write(key)
-        print(f"[CRYPTO] Новый ключ создан: {KEY_FILE}")
-        return Fernet(key)
-
-    # Пробуем загрузить существующий ключ
-    with open(KEY_FILE, "rb") as f:
-        key = f.read().strip()
-
-    # Проверяем корректность
-    try:
-        return Fernet(key)
-    except Exception:
-        print("[CRYPTO] Обнаружен повреждённый ключ — пересоздаём...")
-        key = Fernet.generate_key()
-        with open(KEY_FILE, "wb") as f:
-            f.write(key)
-        return Fernet(key)
+    return load_keyring().active_fernet
 
 def encrypt_value(fernet, value: str) -> str:
     """Шифрует строку (str → str base64)."""
@@ -44,3 +207,52 @@ def decrypt_value(fernet, value: str) -> str:
         return fernet.decrypt(value.encode()).decode()
     except Exception:
         return "<DECRYPTION_ERROR>"
+
+
+def encrypt_record(fernet, data: dict) -> bytes:
+    """
+    Упаковывает запись целиком и шифрует одним токеном.
+    Результат: байт версии формата + сырой (не base64) Fernet-токен.
+    """
+    def pack_float(value):
+        return float(value) if value is not None else math.nan
+
+    plain = _RECORD_STRUCT.pack(
+        pack_float(data.get("temperature")),
+        pack_float(data.get("humidity")),
+        pack_float(data.get("distance")),
+    ) + (data.get("state") or "").encode()
+
+    token = fernet.encrypt(plain)
+    return bytes([RECORD_FORMAT_BLOB]) + base64.urlsafe_b64decode(token)
+
+def decrypt_record(fernet, blob: bytes) -> dict:
+    """Расшифровывает запись, упакованную encrypt_record (одна проверка HMAC)."""
+    if not blob or blob[0] != RECORD_FORMAT_BLOB:
+        raise ValueError("Неизвестный формат записи")
+
+    plain = fernet.decrypt(base64.urlsafe_b64encode(blob[1:]))
+    temp, hum, dist = _RECORD_STRUCT.unpack_from(plain)
+    state = plain[_RECORD_STRUCT.size:].decode()
+
+    def unpack_float(value):
+        return None if math.isnan(value) else value
+
+    return {
+        "temperature": unpack_float(temp),
+        "humidity": unpack_float(hum),
+        "distance": unpack_float(dist),
+        "state": state or None,
+    }
+
+def state_tag(key: bytes, state) -> Optional[int]:
+    """
+    Ключевой хеш состояния (HMAC-SHA256, 8 байт) для индекса по состоянию:
+    фильтр «все Alarm!!!» работает без расшифровки, а само состояние не раскрывается.
+    Хешируется нормализованное написание (normalize_state); для пустого — None.
+    """
+    state = normalize_state(state)
+    if state is None:
+        return None
+    digest = hmac.new(key, b"state-tag:" + state.encode(), hashlib.sha256).digest()
+    return int.from_bytes(digest[:8], "big", signed=True)
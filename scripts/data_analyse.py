@@ -1,223 +1,183 @@
 import os
-import sqlite3
-import pandas as pd
-import matplotlib.pyplot as plt
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
+import argparse
+import numpy as np
+from columnar import load_columns, load_parquet, state_runs, merge_short_runs, SENSORS
+from downsample import downsample, PLOT_MAX_POINTS
+from rollups import RollupStore, RollupColumns
+from render import RenderScheduler, render_static, render_dashboard
 
 
 # Корневая директория проекта
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 EXPORTS_DIR = os.path.join(BASE_DIR, "exports")
+STORE_NAME = "decrypted_store.db"  # data_view.INCREMENTAL_DB_NAME
 FIGURES_DIR = os.path.join(BASE_DIR, "analysis", "figures")
 REPORTS_DIR = os.path.join(BASE_DIR, "analysis", "reports")
-os.makedirs(FIGURES_DIR, exist_ok=True)
-os.makedirs(REPORTS_DIR, exist_ok=True)
+DASHBOARD_WIDTH_PX = 2000  # ширина дашборда, по которой сливаются интервалы короче пикселя
+STATIC_DPI = 300
+FIGURES = ("static", "dashboard")
+
+def default_data_file():
+    """
+    Самый свежий расшифрованный снимок: постоянное хранилище
+    инкрементального экспорта (decrypted_store.db) или decrypted_data*.db.
+    """
+    data_files = [
+        f for f in os.listdir(EXPORTS_DIR)
+        if f == STORE_NAME or (f.startswith("decrypted_data") and f.endswith(".db"))
+    ]
+    return max(
+        data_files,
+        key=lambda f: os.path.getmtime(os.path.join(EXPORTS_DIR, f)),
+        default=STORE_NAME
+    )
+
+def load_raw_columns(db_path, start=None, end=None):
+    """Исходные отсчёты периода [start, end) (секунды эпохи) из базы или экспорта Parquet."""
+    if db_path.endswith(".parquet"):
+        # Экспорт Parquet читается напрямую: только нужные колонки и группы строк периода
+        return load_parquet(db_path, start, end)
+    return load_columns(db_path).between(start, end)
+
+def to_epoch(value):
+    """Метка времени 'YYYY-MM-DD[ HH:MM:SS]' → секунды эпохи (как strftime('%s') в SQLite)."""
+    if value is None:
+        return None
+    return int(np.datetime64(value, "s").astype(np.int64))
 
 class DataAnalyzer:
-    def __init__(self, data_file=None):
-        if data_file is None:
-            data_files = [
-                f for f in os.listdir(EXPORTS_DIR)
-                if f.startswith("decrypted_data_") and f.endswith(".db")
-            ]
-            data_file = sorted(data_files)[-1] if data_files else "decrypted_data.db"
-
-        self.db_path = os.path.join(EXPORTS_DIR, data_file)
+    def __init__(self, data_file=None, max_points=PLOT_MAX_POINTS, downsample_method="minmax",
+                 start=None, end=None, use_rollups=True, workers=None, force=False):
+        self.db_path = os.path.join(EXPORTS_DIR, data_file or default_data_file())
+        self.max_points = max_points
+        self.downsample_method = downsample_method
+        self.workers = workers
+        self.force = force
+        self._series = {}
+
+        # Агрегаты только читаются (их досчитывает export_incremental): для длинного
+        # периода берётся самый детальный уровень, укладывающийся в max_points.
+        # Если агрегатов нет или они отстают от строк — исходные строки с прореживанием
+        start, end = to_epoch(start), to_epoch(end)
+        self.rollup_tier = None
+        if use_rollups and not self.db_path.endswith(".parquet"):
+            rollups = RollupStore(self.db_path, readonly=True)
+            try:
+                if rollups.is_current():
+                    self.rollup_tier = rollups.choose_tier(start, end, max_points)
+                    if self.rollup_tier is not None:
+                        self.columns = rollups.load(self.rollup_tier, start, end)
+            finally:
+                rollups.close()
+        if self.rollup_tier is None:
+            self.columns = load_raw_columns(self.db_path, start, end)
+        print(f"[INFO] Источник данных: {self.rollup_tier or 'исходные строки'} "
+              f"({len(self.columns)} точек)")
         self.df = self._load_and_prepare_data()
 
     # --- 🔧 Подготовка данных ---
     def _load_and_prepare_data(self):
-        conn = sqlite3.connect(self.db_path)
-        df = pd.read_sql_query("SELECT * FROM sensor_data", conn)
-        conn.close()
-
-        df["timestamp"] = pd.to_datetime(df["timestamp"], errors="coerce")
-        df["temperature"] = pd.to_numeric(df["temperature"], errors="coerce")
-        df["humidity"] = pd.to_numeric(df["humidity"], errors="coerce")
-        df["distance"] = pd.to_numeric(df["distance"], errors="coerce")
-        df.sort_values("timestamp", inplace=True)
+        # Колонки уже типизированы и отсортированы по времени (см. columnar.py).
+        # 🔹 Короткие пропуски интерполируются один раз для обоих видов графиков,
+        # простои логгера остаются NaN-разрывами, а не выдуманными значениями
+        self.columns = self.columns.with_gaps()
+        return self.columns.to_frame()
+
+    # --- 🔍 Прореживание рядов для графиков ---
+    def plot_series(self, sensor):
+        """
+        Ряд сенсора для графиков, прореженный до max_points с сохранением формы.
+        Считается один раз и используется обоими видами графиков.
+        """
+        if sensor in self._series:
+            return self._series[sensor]
+
+        x = self.df["timestamp"].to_numpy()
+        values = self.df[sensor].to_numpy()
+        if isinstance(self.columns, RollupColumns):
+            # Агрегаты уже укладываются в max_points: прореживать нечего,
+            # а для minmax берётся огибающая min/max интервалов
+            if self.downsample_method == "minmax":
+                self._series[sensor] = self.columns.envelope(sensor)
+            else:
+                self._series[sensor] = (x, values)
+            return self._series[sensor]
+
+        self._series[sensor] = downsample(x, values, self.max_points, self.downsample_method)
+        return self._series[sensor]
+
+    # --- 📊 Входные данные графиков ---
+    def state_distribution(self):
+        """Доля состояний: время в состоянии по агрегатам или число исходных строк."""
+        import pandas as pd
+
+        if isinstance(self.columns, RollupColumns):
+            counts = pd.Series(self.columns.state_time)
+        else:
+            counts = self.df["state"].value_counts()
+        return counts[counts > 0]
+
+    def _static_inputs(self):
+        return dict(
+            series={sensor: self.plot_series(sensor) for sensor in SENSORS},
+            state_counts={str(state): float(count) for state, count in self.state_distribution().items()},
+            dpi=STATIC_DPI,
+        )
 
-        # 🔹 Заполняем пропущенные значения, чтобы графики не обрывались
-        df.interpolate(method="linear", inplace=True)
-        df.fillna(method="bfill", inplace=True)
-        df.fillna(method="ffill", inplace=True)
+    def _dashboard_inputs(self):
+        # Интервалы состояния: RLE по кодам, интервалы короче пикселя сливаются
+        timestamps = self.columns.timestamp
+        starts, ends, codes = state_runs(timestamps, self.columns.state)
+        if len(timestamps):
+            pixel = (timestamps[-1] - timestamps[0]) / DASHBOARD_WIDTH_PX
+            starts, ends, codes = merge_short_runs(starts, ends, codes, pixel)
+        return dict(
+            series={sensor: self.plot_series(sensor) for sensor in SENSORS},
+            starts=starts, ends=ends, codes=codes, states=self.columns.states,
+        )
 
-        return df
+    # --- 🖼 Отрисовка ---
+    def render(self, figures=FIGURES):
+        """
+        Рисует выбранные графики через RenderScheduler: неизменившиеся пропускаются,
+        остальные рисуются параллельно в отдельных процессах.
+        """
+        scheduler = RenderScheduler(workers=self.workers, force=self.force)
+        if "static" in figures:
+            scheduler.add("static", render_static,
+                          os.path.join(FIGURES_DIR, "interactive_dashboard.png"), **self._static_inputs())
+        if "dashboard" in figures:
+            scheduler.add("dashboard", render_dashboard,
+                          os.path.join(REPORTS_DIR, "interactive_dashboard.html"), **self._dashboard_inputs())
+        return scheduler.run()
 
-    # --- 📊 Статические графики ---
     def create_static_plots(self):
-        fig, axes = plt.subplots(2, 2, figsize=(14, 10))
-        plt.style.use("seaborn-v0_8")
-
-        axes[0, 0].plot(self.df["timestamp"], self.df["temperature"], "r-")
-        axes[0, 0].set_title("Температура по времени")
-        axes[0, 0].set_ylabel("Температура (°C)")
-
-        axes[0, 1].plot(self.df["timestamp"], self.df["humidity"], "b-")
-        axes[0, 1].set_title("Влажность по времени")
-        axes[0, 1].set_ylabel("Влажность (%)")
-
-        axes[1, 0].plot(self.df["timestamp"], self.df["distance"], "g-")
-        axes[1, 0].set_title("Расстояние по времени")
-        axes[1, 0].set_ylabel("Расстояние (см)")
-
-        state_counts = self.df["state"].value_counts()
-        axes[1, 1].pie(
-            state_counts.values,
-            labels=state_counts.index,
-            autopct="%1.1f%%",
-            startangle=90,
-        )
-        axes[1, 1].set_title("Распределение состояний системы")
-
-        plt.tight_layout()
-        plt.savefig(os.path.join(FIGURES_DIR, "interactive_dashboard.png"), dpi=300)
-        plt.close(fig)
-        print("[OK] Сохранён общий PNG-график в figures/interactive_dashboard.png")
+        self.render(["static"])
         print("Уникальные состояния:", self.df["state"].unique())
 
-
-    # --- 🌐 Интерактивный дашборд ---
     def create_interactive_dashboard(self):
-
-        # Заполняем пропуски, если есть
-        self.df.interpolate(method="linear", inplace=True)
-
-        fig = go.Figure()
-
-        # --- Основные графики ---
-        fig.add_trace(go.Scatter(
-            x=self.df["timestamp"], y=self.df["temperature"],
-            mode="lines", name="Температура (°C)",
-            line=dict(color="red", width=2),
-            yaxis="y1"
-        ))
-
-        fig.add_trace(go.Scatter(
-            x=self.df["timestamp"], y=self.df["humidity"],
-            mode="lines", name="Влажность (%)",
-            line=dict(color="blue", width=2, dash="dot"),
-            yaxis="y2"
-        ))
-
-        fig.add_trace(go.Scatter(
-            x=self.df["timestamp"], y=self.df["distance"],
-            mode="lines", name="Расстояние (см)",
-            line=dict(color="green", width=2, dash="dash"),
-            yaxis="y3"
-        ))
-
-        # --- Цвета состояний ---
-        colors = {
-            "off": "rgba(0,255,0,0.25)",      # зелёный
-            "standby": "rgba(255,255,0,0.25)", # жёлтый
-            "alarm!!!": "rgba(255,0,0,0.25)"   # красный
-        }
-
-        # --- Создаём интервалы состояния ---
-        df_state = self.df.copy()
-        df_state["state_clean"] = df_state["state"].astype(str).str.strip().str.lower()
-
-        prev_state = None
-        start_time = None
-
-        for i, row in df_state.iterrows():
-            state = row["state_clean"]
-            timestamp = row["timestamp"]
-
-            if prev_state is None:
-                prev_state = state
-                start_time = timestamp
-                continue
-
-            # Если состояние изменилось — закрываем интервал
-            if state != prev_state:
-                end_time = timestamp
-                color = colors.get(prev_state, "rgba(150,150,150,0.05)")
-                fig.add_vrect(
-                    x0=start_time,
-                    x1=end_time,
-                    fillcolor=color,
-                    opacity=0.25,
-                    layer="below",
-                    line_width=0,
-                    annotation_text=prev_state.capitalize(),
-                    annotation_position="top left"
-                )
-                start_time = timestamp
-                prev_state = state
-
-        # Закрашиваем последний интервал
-        if start_time is not None and prev_state is not None:
-            end_time = df_state["timestamp"].iloc[-1]
-            color = colors.get(prev_state, "rgba(150,150,150,0.05)")
-            fig.add_vrect(
-                x0=start_time,
-                x1=end_time,
-                fillcolor=color,
-                opacity=0.25,
-                layer="below",
-                line_width=0,
-                annotation_text=prev_state.capitalize(),
-                annotation_position="top left"
-            )
-
-        # --- Настройки осей и легенды ---
-        fig.update_layout(
-            title="📊 Температура, Влажность и Расстояние с подсветкой состояния системы",
-            xaxis=dict(title="Время"),
-            yaxis=dict(
-                title=dict(text="Температура (°C)", font=dict(color="red")),
-                tickfont=dict(color="red"),
-            ),
-            yaxis2=dict(
-                title=dict(text="Влажность (%)", font=dict(color="blue")),
-                tickfont=dict(color="blue"),
-                overlaying="y",
-                side="right",
-            ),
-            yaxis3=dict(
-                title=dict(text="Расстояние (см)", font=dict(color="green")),
-                tickfont=dict(color="green"),
-                overlaying="y",
-                side="right",
-                anchor="free",
-                position=0.98,
-            ),
-            template="plotly_white",
-            height=700,
-            legend=dict(x=0.5, y=-0.25, orientation="h", yanchor="bottom", xanchor="center"),
-            margin=dict(t=80, b=120)
-        )
-
-        # --- Добавляем легенду по состояниям ---
-        for name, color in colors.items():
-            fig.add_trace(go.Scatter(
-                x=[None], y=[None],
-                mode="markers",
-                marker=dict(size=15, color=color),
-                name=name.capitalize()
-            ))
-
-        # --- Сохраняем ---
-        html_path = os.path.join(REPORTS_DIR, "interactive_dashboard.html")
-        # png_path = os.path.join(REPORTS_DIR, "interactive_dashboard.png")
-        fig.write_html(html_path)
-        # fig.write_image(png_path, scale=2)
-        print(f"[OK] Интерактивный дашборд сохранён: {html_path}")
-
+        self.render(["dashboard"])
 
     # --- 🚀 Основной запуск ---
     def run_analysis(self):
         print("[INFO] Анализ данных запущен...")
-        self.create_static_plots()
-        self.create_interactive_dashboard()
+        self.render()
         print("[DONE] Анализ завершён!")
 
 
 def main():
-    analyzer = DataAnalyzer()
+    parser = argparse.ArgumentParser(description="Графики и дашборд по расшифрованным данным")
+    parser.add_argument("--data", help="файл в exports: decrypted_store.db, decrypted_data*.db или экспорт .parquet "
+                                       "(по умолчанию — самая свежая база)")
+    parser.add_argument("--start", help="начало периода: YYYY-MM-DD[ HH:MM:SS]")
+    parser.add_argument("--end", help="конец периода (не включительно)")
+    parser.add_argument("--raw", action="store_true", help="не использовать агрегаты")
+    parser.add_argument("--jobs", type=int, help="процессов отрисовки (по умолчанию — по числу ядер)")
+    parser.add_argument("--force", action="store_true", help="перерисовать даже неизменившиеся графики")
+    args = parser.parse_args()
+
+    analyzer = DataAnalyzer(args.data, start=args.start, end=args.end, use_rollups=not args.raw,
+                            workers=args.jobs, force=args.force)
     analyzer.run_analysis()
 
 
@@ -1,57 +1,609 @@
 import sqlite3
 import json
 import os
-import pandas as pd
+import sys
+import time
+import hashlib
 import csv
-from datetime import datetime
-from crypto_utils import load_or_create_key, decrypt_value
+import argparse
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from crypto_utils import KeyRing, KeyringError, load_keyring, decrypt_value
+from partitions import PartitionCatalog, DATA_DIR, TIME_FORMAT
+from online_stats import StatsStore, DECRYPTION_ERROR, summarize, to_float
+from frame_parser import normalize_state
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-DB_PATH = os.path.join(BASE_DIR, "data", "data.db")
 
-class DataViewer:
-    def __init__(self):
-        self.db_path = DB_PATH
-        self.fernet = load_or_create_key()
-        
-    def decrypt_row_data(self, row):
-        """Расшифровка данных строки"""
-        id, ts, temp, hum, dist, state = row
+LOGS_COLUMNS = [
+    "id", "timestamp", "temperature", "humidity", "distance", "state", "payload", "device", "key_id"
+]
+
+def logs_columns(conn):
+    """Список колонок для выборки из logs с учётом старых баз без новых колонок."""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(logs)")}
+    return ", ".join(
+        name if name in columns else f"NULL AS {name}" for name in LOGS_COLUMNS
+    )
+
+def select_range(conn, first_id, last_id=None, start=None, end=None):
+    """
+    Выборка строк logs с id в [first_id, last_id) и, при необходимости,
+    с меткой времени в [start, end). Возвращает курсор.
+    """
+    query = f"SELECT {logs_columns(conn)} FROM logs WHERE id >= ?"
+    params = [first_id]
+    if last_id is not None:
+        query += " AND id < ?"
+        params.append(last_id)
+    if start is not None:
+        query += " AND timestamp >= ?"
+        params.append(start)
+    if end is not None:
+        query += " AND timestamp < ?"
+        params.append(end)
+    return conn.execute(query + " ORDER BY id", params)
+
+DECRYPT_CHUNK_SIZE = 10000   # строк на одну задачу параллельной расшифровки
+PARALLEL_MIN_ROWS = 20000    # меньше этого — расшифровываем в текущем процессе
+QUERY_FETCH_SIZE = 500       # строк за один fetchmany в query
+DECRYPT_CACHE_MB = 128       # предел памяти кеша расшифрованных строк (0 — без кеша)
+
+# Поля записи, которую не удалось расшифровать
+FAILED_FIELDS = dict.fromkeys(('temperature', 'humidity', 'distance', 'state'), DECRYPTION_ERROR)
+
+def decrypt_row(keyring, row):
+    """Расшифровка одной строки logs (оба формата хранения) ключом из key_id строки"""
+    id, ts, temp, hum, dist, state, payload, device, key_id = row
+
+    # Новый формат: вся запись в одном зашифрованном блобе
+    if payload is not None:
         try:
-            temp_decrypted = decrypt_value(self.fernet, temp)
-            hum_decrypted = decrypt_value(self.fernet, hum)
-            dist_decrypted = decrypt_value(self.fernet, dist)
-            state_decrypted = decrypt_value(self.fernet, state)
+            record = keyring.decrypt_record(payload, key_id)
         except Exception:
-            # Если данные не зашифрованы (старые записи)
-            temp_decrypted = temp
-            hum_decrypted = hum
-            dist_decrypted = dist
-            state_decrypted = state
-        
+            record = FAILED_FIELDS
+        else:
+            record['state'] = normalize_state(record.get('state'))
+        return {'id': id, 'timestamp': ts, **record, 'device': device}
+
+    # Старый формат: отдельный токен на каждое поле
+    try:
+        fernet = keyring.fernet(key_id)
+    except KeyringError:
+        return {'id': id, 'timestamp': ts, **FAILED_FIELDS, 'device': device}
+    try:
+        temp_decrypted = decrypt_value(fernet, temp)
+        hum_decrypted = decrypt_value(fernet, hum)
+        dist_decrypted = decrypt_value(fernet, dist)
+        state_decrypted = decrypt_value(fernet, state)
+    except Exception:
+        # Если данные не зашифрованы (старые записи)
+        temp_decrypted = temp
+        hum_decrypted = hum
+        dist_decrypted = dist
+        state_decrypted = state
+
+    return {
+        'id': id,
+        'timestamp': ts,
+        'temperature': temp_decrypted,
+        'humidity': hum_decrypted,
+        'distance': dist_decrypted,
+        'state': normalize_state(state_decrypted),
+        'device': device
+    }
+
+def row_digest(row):
+    """Короткий хеш шифротекста строки: при перешифровке ключ кеша меняется."""
+    payload = row[6]
+    if payload is None:
+        payload = "|".join(str(value) for value in row[2:6]).encode()
+    return hashlib.blake2b(payload, digest_size=8).digest()
+
+# ---------- Кеш расшифрованных строк ----------
+class DecryptCache:
+    """
+    LRU расшифрованных строк по ключу (id, хеш токена) с пределом по памяти.
+    Токены Fernet неизменяемы, поэтому повторная загрузка расшифровывает
+    только новые (или перешифрованные) строки. Размер записи оценивается
+    через sys.getsizeof.
+    """
+
+    ENTRY_OVERHEAD = 200  # ключ (кортеж, bytes) и узел OrderedDict
+
+    def __init__(self, max_bytes=DECRYPT_CACHE_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # (id, хеш) → (запись, размер)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, record):
+        # Ошибки расшифровки не кешируются: ключ могут восстановить
+        if DECRYPTION_ERROR in record.values():
+            return
+        size = (self.ENTRY_OVERHEAD + sys.getsizeof(record)
+                + sum(sys.getsizeof(value) for value in record.values()))
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.bytes -= old[1]
+        self._entries[key] = (record, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes and self._entries:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.bytes -= evicted
+            self.evictions += 1
+
+    def stats(self):
+        total = self.hits + self.misses
         return {
-            'id': id,
-            'timestamp': ts,
-            'temperature': temp_decrypted,
-            'humidity': hum_decrypted,
-            'distance': dist_decrypted,
-            'state': state_decrypted
+            "entries": len(self._entries),
+            "mb": round(self.bytes / 1024 / 1024, 1),
+            "limit_mb": round(self.max_bytes / 1024 / 1024, 1),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
         }
+
+# ---------- Параллельная расшифровка (процессы-воркеры) ----------
+_worker_keyring = None
+
+def _init_decrypt_worker(material):
+    """Инициализация воркера: ключи передаются один раз на процесс."""
+    global _worker_keyring
+    _worker_keyring = KeyRing(*material)
+
+def _decrypt_rows(rows):
+    """Расшифровывает строки logs, которых не нашлось в кеше основного процесса."""
+    return [decrypt_row(_worker_keyring, row) for row in rows]
+
+FIELDNAMES = ['id', 'timestamp', 'temperature', 'humidity', 'distance', 'state', 'device']
+EXCEL_MAX_ROWS = 1048575     # ограничение листа Excel (без строки заголовка)
+PARQUET_ROW_GROUP = 131072   # строк в группе Parquet: единица пропуска при фильтре по времени
+PARQUET_COMPRESSION = 'zstd'
+PARQUET_MISSING = "[EXPORT] pyarrow не установлен, Parquet пропущен (pip install pyarrow)"
+INCREMENTAL_DB_NAME = 'decrypted_store.db'  # постоянное хранилище инкрементального экспорта
+STATS_DB_NAME = 'aggregates.db'             # накопительные агрегаты для отчёта
+
+def export_path(filename):
+    """Путь к файлу экспорта в папке exports"""
+    path = os.path.join(BASE_DIR, "exports", filename)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+# ---------- Приёмники потокового экспорта ----------
+class CsvSink:
+    """CSV: строки дописываются пачками по мере расшифровки"""
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'w', newline='', encoding='utf-8')
+        self.writer = csv.DictWriter(self.file, fieldnames=FIELDNAMES)
+        self.writer.writeheader()
+
+    def write(self, batch):
+        self.writer.writerows(batch)
+
+    def close(self):
+        self.file.close()
+
+class NdjsonSink:
+    """NDJSON: одна JSON-запись на строку, без общего массива в памяти"""
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'w', encoding='utf-8')
+
+    def write(self, batch):
+        self.file.writelines(json.dumps(entry, ensure_ascii=False) + "\n" for entry in batch)
+
+    def close(self):
+        self.file.close()
+
+class ExcelSink:
+    """Excel: write-only книга openpyxl, строки не держатся в памяти"""
+    def __init__(self, path):
+        from openpyxl import Workbook
+
+        self.path = path
+        self.rows = 0
+        self.workbook = Workbook(write_only=True)
+        self.sheet = self.workbook.create_sheet()
+        self.sheet.append(FIELDNAMES)
+
+    def write(self, batch):
+        for entry in batch:
+            if self.rows >= EXCEL_MAX_ROWS:
+                return
+            self.sheet.append([entry[name] for name in FIELDNAMES])
+            self.rows += 1
+
+    def close(self):
+        if self.rows >= EXCEL_MAX_ROWS:
+            print(f"[EXPORT] Excel ограничен {EXCEL_MAX_ROWS} строками, остальные пропущены")
+        self.workbook.save(self.path)
+
+class ParquetSink:
+    """
+    Parquet: типизированные колонки со сжатием, группы строк по PARQUET_ROW_GROUP.
+    Группа пишется, как только набрана, поэтому в памяти не больше одной группы;
+    min/max метки времени в группах позволяют читателю пропускать лишние (см. columnar.load_parquet)
+    """
+    def __init__(self, path, row_group_size=PARQUET_ROW_GROUP):
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        self.pc = pc
+        self.path = path
+        self.row_group_size = row_group_size
+        self.schema = pa.schema([
+            ('id', pa.int64()),
+            ('timestamp', pa.timestamp('s')),
+            ('temperature', pa.float32()),
+            ('humidity', pa.float32()),
+            ('distance', pa.float32()),
+            ('state', pa.string()),
+            ('device', pa.string()),
+        ])
+        # Строковые колонки с немногими значениями хранятся словарём
+        self.writer = pq.ParquetWriter(path, self.schema, compression=PARQUET_COMPRESSION)
+        self.pending = []
+        self.pending_rows = 0
+
+    def write(self, batch):
+        pa = self.pa
+        timestamps = self.pc.strptime(
+            pa.array([entry['timestamp'] for entry in batch], pa.string()),
+            format=TIME_FORMAT, unit='s', error_is_null=True
+        )
+        columns = [
+            pa.array([entry['id'] for entry in batch], pa.int64()),
+            timestamps,
+            *(pa.array([to_float(entry[name]) for entry in batch], pa.float32())
+              for name in ('temperature', 'humidity', 'distance')),
+            pa.array([None if entry['state'] is None else str(entry['state']) for entry in batch], pa.string()),
+            pa.array([entry.get('device') for entry in batch], pa.string()),
+        ]
+        self.pending.append(pa.RecordBatch.from_arrays(columns, schema=self.schema))
+        self.pending_rows += len(batch)
+        if self.pending_rows >= self.row_group_size:
+            self._flush()
+
+    def _flush(self):
+        if not self.pending:
+            return
+        table = self.pa.Table.from_batches(self.pending, schema=self.schema)
+        self.writer.write_table(table, row_group_size=self.row_group_size)
+        self.pending = []
+        self.pending_rows = 0
+
+    def close(self):
+        self._flush()
+        self.writer.close()
+
+class SQLiteSink:
+    """SQLite: таблица sensor_data, вставка executemany по транзакции на пачку"""
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS sensor_data (
+                id INTEGER PRIMARY KEY,
+                timestamp TEXT,
+                temperature REAL,
+                humidity REAL,
+                distance REAL,
+                state TEXT,
+                device TEXT
+            )
+        ''')
+        # Хранилища, созданные до появления нескольких устройств
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(sensor_data)")]
+        if 'device' not in columns:
+            self.conn.execute("ALTER TABLE sensor_data ADD COLUMN device TEXT")
+        self.conn.commit()
+
+    def write(self, batch):
+        with self.conn:
+            self.conn.executemany('''
+                INSERT INTO sensor_data
+                (id, timestamp, temperature, humidity, distance, state, device)
+                VALUES (:id, :timestamp, :temperature, :humidity, :distance, :state, :device)
+            ''', batch)
+
+    def close(self):
+        self.conn.close()
+
+class IncrementalStore(SQLiteSink):
+    """
+    Постоянное расшифрованное хранилище для инкрементального экспорта.
+    Вместе с каждой пачкой в той же транзакции сохраняется последний
+    выгруженный logs.id (high-water mark), поэтому прерванный экспорт
+    просто продолжится со следующего запуска.
+    """
+    def __init__(self, path):
+        super().__init__(path)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS export_state (
+                key TEXT PRIMARY KEY,
+                value INTEGER
+            )
+        ''')
+        self.conn.commit()
+
+    @property
+    def last_id(self):
+        row = self.conn.execute(
+            "SELECT value FROM export_state WHERE key = 'last_id'"
+        ).fetchone()
+        return row[0] if row else 0
+
+    def write(self, batch):
+        with self.conn:
+            self.conn.executemany('''
+                INSERT OR REPLACE INTO sensor_data
+                (id, timestamp, temperature, humidity, distance, state, device)
+                VALUES (:id, :timestamp, :temperature, :humidity, :distance, :state, :device)
+            ''', batch)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO export_state (key, value) VALUES ('last_id', ?)",
+                (batch[-1]['id'],)
+            )
+
+def until_failed(batches):
+    """
+    Пачки до первой нерасшифрованной строки. Инкрементальный экспорт на ней
+    останавливается, поэтому high-water mark не уходит дальше и строка
+    (вместе со следующими) будет выгружена, когда ключ восстановят.
+    """
+    for batch in batches:
+        for i, entry in enumerate(batch):
+            if DECRYPTION_ERROR in entry.values():
+                if i:
+                    yield batch[:i]
+                print(f"[EXPORT] Запись {entry['id']} не расшифрована: экспорт остановлен "
+                      f"на ней и продолжится с неё после восстановления ключа")
+                return
+        yield batch
+
+class DataViewer:
+    def __init__(self, workers=None, data_dir=DATA_DIR, cache_mb=DECRYPT_CACHE_MB):
+        self.catalog = PartitionCatalog(data_dir)
+        self.keyring = load_keyring()
+        self.workers = workers or os.cpu_count() or 1
+        self.cache = DecryptCache(cache_mb * 1024 * 1024) if cache_mb else None
+        
+    def decrypt_row_data(self, row):
+        """Расшифровка данных строки (через кеш, если он включён)"""
+        if self.cache is None:
+            return decrypt_row(self.keyring, row)
+        key = (row[0], row_digest(row))
+        record = self.cache.get(key)
+        if record is None:
+            record = decrypt_row(self.keyring, row)
+            self.cache.put(key, record)
+        return record
+
+    def _id_ranges(self, after_id=0, start=None, end=None):
+        """
+        Партиции, нужные для чтения, с диапазонами id после after_id:
+        список (путь, первый id, последний id). Пустые партиции пропускаются.
+        """
+        ranges = []
+        for path in self.catalog.partitions(start, end):
+            conn = sqlite3.connect(path)
+            first_id, last_id = conn.execute(
+                "SELECT MIN(id), MAX(id) FROM logs WHERE id > ?", (after_id,)
+            ).fetchone()
+            conn.close()
+            if first_id is not None:
+                ranges.append((path, first_id, last_id))
+        return ranges
+
+    def iter_batches(self, batch_size=DECRYPT_CHUNK_SIZE, after_id=0, start=None, end=None):
+        """
+        Генератор пачек расшифрованных записей с id > after_id в порядке id.
+        start/end ограничивают период: открываются только нужные партиции.
+        В памяти одновременно находится лишь несколько пачек.
+        """
+        ranges = self._id_ranges(after_id, start, end)
+        if not ranges:
+            return
+
+        # Строки, уже лежащие в кеше, процессам отдавать незачем (оценка по размеру кеша)
+        total = sum(last_id - first_id + 1 for _, first_id, last_id in ranges)
+        if self.cache is not None:
+            total -= len(self.cache)
+        if self.workers > 1 and total >= PARALLEL_MIN_ROWS:
+            yield from self._iter_parallel(ranges, batch_size, start, end)
+        else:
+            for path, first_id, _ in ranges:
+                yield from self._iter_sequential(path, first_id, batch_size, start, end)
     
     def get_all_data(self):
         """Получение всех данных из базы данных"""
-        conn = sqlite3.connect(self.db_path)
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM logs ORDER BY timestamp")
-        rows = cur.fetchall()
-        conn.close()
-
+        started = time.perf_counter()
         data = []
-        for row in rows:
-            data_entry = self.decrypt_row_data(row)
-            data.append(data_entry)
-        
+        for batch in self.iter_batches():
+            data.extend(batch)
+
+        elapsed = time.perf_counter() - started
+        if data and elapsed > 0:
+            print(f"[DECRYPT] {len(data)} записей за {elapsed:.2f} с "
+                  f"({len(data) / elapsed:.0f} записей/с)")
         return data
+
+    def _iter_sequential(self, db_path, first_id, batch_size, start=None, end=None):
+        """Расшифровка партиции в текущем процессе, чтение курсора через fetchmany"""
+        conn = sqlite3.connect(db_path)
+        try:
+            cur = select_range(conn, first_id, start=start, end=end)
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield [self.decrypt_row_data(row) for row in rows]
+        finally:
+            conn.close()
+
+    def _iter_parallel(self, ranges, batch_size, start=None, end=None):
+        """
+        Читает партиции чанками по batch_size строк, берёт из кеша уже расшифрованные
+        строки и отдаёт остальные в пул процессов. Ключи передаются воркерам один раз
+        через initializer, порядок чанков сохраняется, а число чанков «в полёте»
+        ограничено, чтобы память не росла с размером таблицы.
+        """
+        workers = self.workers
+        print(f"[DECRYPT] Параллельная расшифровка: процессов {workers}")
+        # Пул (multiprocessing) нужен только большим выборкам: быстрые команды его не загружают.
+        # Процессы запускаются при первой задаче — если всё нашлось в кеше, их не будет
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_decrypt_worker,
+            initargs=(self.keyring.material(),)
+        ) as executor:
+            pending = deque()
+            for path, first_id, _ in ranges:
+                conn = sqlite3.connect(path)
+                try:
+                    cur = select_range(conn, first_id, start=start, end=end)
+                    while True:
+                        rows = cur.fetchmany(batch_size)
+                        if not rows:
+                            break
+                        records, missing = self._lookup(rows)
+                        future = executor.submit(_decrypt_rows, [rows[i] for i in missing]) if missing else None
+                        pending.append((rows, records, missing, future))
+                        if len(pending) >= workers * 2:
+                            yield self._complete(*pending.popleft())
+                finally:
+                    conn.close()
+            while pending:
+                yield self._complete(*pending.popleft())
+
+    def _lookup(self, rows):
+        """
+        Записи чанка из кеша: (список записей с None на месте промахов,
+        номера строк-промахов, которые нужно расшифровать).
+        """
+        if self.cache is None:
+            return [None] * len(rows), list(range(len(rows)))
+        records = [self.cache.get((row[0], row_digest(row))) for row in rows]
+        return records, [i for i, record in enumerate(records) if record is None]
+
+    def _complete(self, rows, records, missing, future):
+        """Дополняет чанк расшифрованными воркером строками и кладёт их в кеш."""
+        if future is not None:
+            for i, record in zip(missing, future.result()):
+                records[i] = record
+                if self.cache is not None:
+                    row = rows[i]
+                    self.cache.put((row[0], row_digest(row)), record)
+        return records
+
+    def query(self, start=None, end=None, states=None, limit=None, newest_first=False):
+        """
+        Выборка записей за период [start, end) с фильтром по состояниям.
+        Используются индексы по timestamp и state_tag, поэтому расшифровываются
+        только подходящие строки. Строки без state_tag (старые записи)
+        проверяются по состоянию уже после расшифровки.
+        """
+        tags = []
+        if states:
+            states = {normalize_state(state) for state in states}
+            tags = [self.keyring.state_tag(state) for state in states if state is not None]
+
+        sql_filter = []
+        params = []
+        if start is not None:
+            sql_filter.append("timestamp >= ?")
+            params.append(start)
+        if end is not None:
+            sql_filter.append("timestamp < ?")
+            params.append(end)
+        order = "DESC" if newest_first else "ASC"
+
+        partitions = self.catalog.partitions(start, end)
+        if newest_first:
+            partitions.reverse()
+
+        result = []
+        for path in partitions:
+            conn = sqlite3.connect(path)
+            try:
+                # Схему партиций догоняет писатель; в базе без state_tag
+                # все строки проверяются после расшифровки
+                partition_filter, partition_params = list(sql_filter), list(params)
+                if tags and 'state_tag' in {row[1] for row in conn.execute("PRAGMA table_info(logs)")}:
+                    partition_filter.append(
+                        f"(state_tag IN ({', '.join('?' * len(tags))}) OR state_tag IS NULL)")
+                    partition_params.extend(tags)
+                where = f"WHERE {' AND '.join(partition_filter)}" if partition_filter else ""
+                cur = conn.execute(
+                    f"SELECT {logs_columns(conn)} FROM logs {where} "
+                    f"ORDER BY timestamp {order}, id {order}",
+                    partition_params
+                )
+                while True:
+                    rows = cur.fetchmany(QUERY_FETCH_SIZE)
+                    if not rows:
+                        break
+                    for row in rows:
+                        entry = self.decrypt_row_data(row)
+                        if states and normalize_state(entry['state']) not in states:
+                            continue
+                        result.append(entry)
+                        if limit and len(result) >= limit:
+                            return result
+            finally:
+                conn.close()
+        return result
+
+    def count(self):
+        """Общее число записей во всех активных партициях"""
+        total = 0
+        for path in self.catalog.partitions():
+            conn = sqlite3.connect(path)
+            total += conn.execute("SELECT COUNT(*) FROM logs").fetchone()[0]
+            conn.close()
+        return total
+
+    def stream_export(self, sinks, batches=None):
+        """Один проход по данным с раздачей каждой пачки во все приёмники"""
+        if batches is None:
+            batches = self.iter_batches()
+
+        count = 0
+        started = time.perf_counter()
+        try:
+            for batch in batches:
+                for sink in sinks:
+                    sink.write(batch)
+                count += len(batch)
+        finally:
+            for sink in sinks:
+                sink.close()
+
+        elapsed = time.perf_counter() - started
+        if count and elapsed > 0:
+            print(f"[EXPORT] {count} записей за {elapsed:.2f} с ({count / elapsed:.0f} записей/с)")
+        return count
     
     def export_to_csv(self, data, filename='decrypted_data.csv'):
         """Экспорт в CSV файл"""
@@ -59,19 +611,10 @@ class DataViewer:
             print("Нет данных для экспорта")
             return
         
-        # Определяем путь для сохранения
-        export_path = os.path.join(BASE_DIR, "exports", filename)
-        os.makedirs(os.path.dirname(export_path), exist_ok=True)
-        
-        # Записываем в CSV
-        with open(export_path, 'w', newline='', encoding='utf-8') as csvfile:
-            fieldnames = ['id', 'timestamp', 'temperature', 'humidity', 'distance', 'state']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(data)
-        
-        print(f"Данные экспортированы в {export_path}")
-        return export_path
+        path = export_path(filename)
+        self.stream_export([CsvSink(path)], [data])
+        print(f"Данные экспортированы в {path}")
+        return path
     
     def export_to_excel(self, data, filename='decrypted_data.xlsx'):
         """Экспорт в Excel файл"""
@@ -79,78 +622,63 @@ class DataViewer:
             print("Нет данных для экспорта")
             return
         
-        # Определяем путь для сохранения
-        export_path = os.path.join(BASE_DIR, "exports", filename)
-        os.makedirs(os.path.dirname(export_path), exist_ok=True)
-        
-        # Преобразуем в DataFrame и сохраняем
-        df = pd.DataFrame(data)
-        df.to_excel(export_path, index=False, engine='openpyxl')
-        print(f"Данные экспортированы в {export_path}")
-        return export_path
+        path = export_path(filename)
+        self.stream_export([ExcelSink(path)], [data])
+        print(f"Данные экспортированы в {path}")
+        return path
     
-    def export_to_json(self, data, filename='decrypted_data.json'):
-        """Экспорт в JSON файл"""
+    def export_to_json(self, data, filename='decrypted_data.ndjson'):
+        """Экспорт в JSON (NDJSON: одна запись на строку)"""
         if not data:
             print("Нет данных для экспорта")
             return
         
-        # Определяем путь для сохранения
-        export_path = os.path.join(BASE_DIR, "exports", filename)
-        os.makedirs(os.path.dirname(export_path), exist_ok=True)
-        
-        with open(export_path, 'w', encoding='utf-8') as jsonfile:
-            json.dump(data, jsonfile, ensure_ascii=False, indent=2)
-        print(f"Данные экспортированы в {export_path}")
-        return export_path
+        path = export_path(filename)
+        self.stream_export([NdjsonSink(path)], [data])
+        print(f"Данные экспортированы в {path}")
+        return path
     
+    def export_to_parquet(self, data=None, filename='decrypted_data.parquet', start=None, end=None):
+        """
+        Экспорт в Parquet. Без data записи читаются из базы пачками
+        (за период [start, end), если он задан), и память не зависит от размера logs.
+        """
+        if data is not None and not data:
+            print("Нет данных для экспорта")
+            return
+
+        path = export_path(filename)
+        try:
+            sink = ParquetSink(path)
+        except ImportError:
+            print(PARQUET_MISSING)
+            return
+        count = self.stream_export(
+            [sink],
+            [data] if data is not None else self.iter_batches(start=start, end=end)
+        )
+        print(f"Данные экспортированы в {path} ({count} записей, "
+              f"{os.path.getsize(path) / 1024 / 1024:.1f} МБ)")
+        return path
+
     def save_decrypted_database(self, data, filename='decrypted_data.db'):
         """Создание новой базы данных с расшифрованными данными"""
         if not data:
             print("Нет данных для экспорта")
             return
         
-        # Определяем путь для сохранения
-        export_path = os.path.join(BASE_DIR, "exports", filename)
-        os.makedirs(os.path.dirname(export_path), exist_ok=True)
-        
-        conn = sqlite3.connect(export_path)
-        cursor = conn.cursor()
-        
-        # Создаем таблицу для расшифрованных данных
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS sensor_data (
-                id INTEGER PRIMARY KEY,
-                timestamp TEXT,
-                temperature REAL,
-                humidity REAL,
-                distance REAL,
-                state TEXT
-            )
-        ''')
-        
-        # Вставляем данные
-        for entry in data:
-            cursor.execute('''
-                INSERT INTO sensor_data 
-                (id, timestamp, temperature, humidity, distance, state)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (
-                entry['id'],
-                entry['timestamp'],
-                entry['temperature'],
-                entry['humidity'],
-                entry['distance'],
-                entry['state']
-            ))
-        
-        conn.commit()
-        conn.close()
-        print(f"Расшифрованная база данных сохранена как {export_path}")
-        return export_path
+        if filename == INCREMENTAL_DB_NAME:
+            print(f"Имя {filename} занято хранилищем инкрементального экспорта, выберите другое")
+            return
+        path = export_path(filename)
+        self.stream_export([SQLiteSink(path)], [data])
+        print(f"Расшифрованная база данных сохранена как {path}")
+        return path
     
     def create_analysis_dataframe(self, data):
         """Создание DataFrame для анализа"""
+        import pandas as pd
+
         if not data:
             return pd.DataFrame()
         
@@ -170,49 +698,63 @@ class DataViewer:
         
         return df
     
-    def generate_report(self, data):
-        """Генерация отчета со статистикой"""
-        if not data:
+    def update_stats(self):
+        """Досчитывает агрегаты по строкам, появившимся после прошлого обновления"""
+        store = StatsStore(export_path(STATS_DB_NAME))
+        try:
+            for batch in self.iter_batches(after_id=store.last_id):
+                store.write(batch)
+            return store.summary()
+        finally:
+            store.close()
+
+    def generate_report(self, data=None):
+        """
+        Генерация отчета со статистикой: по переданным записям data
+        или, без data, по накопленным агрегатам всей базы
+        """
+        summary = self.update_stats() if data is None else summarize(data)
+        if not summary['rows']:
             print("Нет данных для отчета")
             return
         
-        df = self.create_analysis_dataframe(data)
-        
         print("\n" + "="*50)
         print("СТАТИСТИЧЕСКИЙ ОТЧЕТ ДАННЫХ")
         print("="*50)
         
         # Основная статистика
-        print(f"Всего записей: {len(data)}")
-        print(f"Период данных: с {df['timestamp'].min()} по {df['timestamp'].max()}")
+        print(f"Всего записей: {summary['rows']}")
+        if summary['skipped']:
+            print(f"Пропущено нерасшифрованных записей: {summary['skipped']}")
+        print(f"Период данных: с {summary['first_ts']} по {summary['last_ts']}")
         
         # Статистика по состояниям
-        state_stats = df['state'].value_counts()
         print("\nСтатистика по состояниям системы:")
-        for state, count in state_stats.items():
+        for state, count in summary['states'].items():
             print(f"  {state}: {count} записей")
         
-        # Статистика по температуре и влажности
-        print(f"\nТемпература:")
-        print(f"  Средняя: {df['temperature'].mean():.1f}°C")
-        print(f"  Минимальная: {df['temperature'].min():.1f}°C")
-        print(f"  Максимальная: {df['temperature'].max():.1f}°C")
-        
-        print(f"\nВлажность:")
-        print(f"  Средняя: {df['humidity'].mean():.1f}%")
-        print(f"  Минимальная: {df['humidity'].min():.1f}%")
-        print(f"  Максимальная: {df['humidity'].max():.1f}%")
-        
-        print(f"\nРасстояние:")
-        print(f"  Среднее: {df['distance'].mean():.1f}см")
-        print(f"  Минимальное: {df['distance'].min():.1f}см")
-        print(f"  Максимальное: {df['distance'].max():.1f}см")
+        # Статистика по датчикам
+        titles = {
+            'temperature': ("Температура", "°C", ("Средняя", "Минимальная", "Максимальная")),
+            'humidity': ("Влажность", "%", ("Средняя", "Минимальная", "Максимальная")),
+            'distance': ("Расстояние", "см", ("Среднее", "Минимальное", "Максимальное")),
+        }
+        for sensor, (title, unit, labels) in titles.items():
+            stats = summary['sensors'].get(sensor)
+            if not stats:
+                continue
+            print(f"\n{title}:")
+            print(f"  {labels[0]}: {stats['mean']:.1f}{unit}")
+            print(f"  {labels[1]}: {stats['min']:.1f}{unit}")
+            print(f"  {labels[2]}: {stats['max']:.1f}{unit}")
+            print(f"  Стандартное отклонение: {stats['std']:.1f}{unit}")
         
         # Ежедневная статистика
-        daily_stats = df.groupby('date').size()
-        if not daily_stats.empty:
-            print(f"\nМаксимальная активность в день: {daily_stats.max()} событий")
-            print(f"Минимальная активность в день: {daily_stats.min()} событий")
+        daily = summary['daily']
+        if daily:
+            print(f"\nМаксимальная активность в день: {max(daily.values())} событий")
+            print(f"Минимальная активность в день: {min(daily.values())} событий")
+        return summary
     
     def display_data(self, data, limit=10):
         """Отображение данных в консоли"""
@@ -226,58 +768,116 @@ class DataViewer:
             print(f"\n... и еще {len(data) - limit} записей")
     
     def export_all_formats(self, data=None):
-        """Экспорт данных во все форматы"""
-        if data is None:
-            data = self.get_all_data()
-        
-        if not data:
+        """
+        Экспорт данных во все форматы за один проход.
+        Без data записи читаются из базы пачками, и память не зависит от размера logs.
+        """
+        empty = not data if data is not None else not self._id_ranges()
+        if empty:
             print("Нет данных для экспорта")
             return
         
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         
         files = {
-            'csv': self.export_to_csv(data, f'decrypted_data_{timestamp}.csv'),
-            'excel': self.export_to_excel(data, f'decrypted_data_{timestamp}.xlsx'),
-            'json': self.export_to_json(data, f'decrypted_data_{timestamp}.json'),
-            'database': self.save_decrypted_database(data, f'decrypted_data_{timestamp}.db')
+            'csv': export_path(f'decrypted_data_{timestamp}.csv'),
+            'excel': export_path(f'decrypted_data_{timestamp}.xlsx'),
+            'json': export_path(f'decrypted_data_{timestamp}.ndjson'),
+            'database': export_path(f'decrypted_data_{timestamp}.db'),
+            'parquet': export_path(f'decrypted_data_{timestamp}.parquet')
         }
+        sinks = [
+            CsvSink(files['csv']),
+            ExcelSink(files['excel']),
+            NdjsonSink(files['json']),
+            SQLiteSink(files['database']),
+        ]
+        try:
+            sinks.append(ParquetSink(files['parquet']))
+        except ImportError:
+            print(PARQUET_MISSING)
+            del files['parquet']
+        if data is None:
+            # Агрегаты отчёта досчитываются попутно (уже учтённые строки пропускаются)
+            sinks.append(StatsStore(export_path(STATS_DB_NAME)))
+        self.stream_export(sinks, [data] if data is not None else None)
+        for path in files.values():
+            print(f"Данные экспортированы в {path}")
         
+        # Без data агрегаты уже досчитаны этим проходом, отчёт читает их без повторной расшифровки
         self.generate_report(data)
         print(f"\nВсе файлы экспортированы с меткой времени: {timestamp}")
         return files
     
+    def export_incremental(self, filename=INCREMENTAL_DB_NAME):
+        """
+        Инкрементальный экспорт: расшифровываются только записи, появившиеся
+        после прошлого запуска, и дописываются в постоянное хранилище.
+        """
+        path = export_path(filename)
+        store = IncrementalStore(path)
+        last_id = store.last_id
+        stats = StatsStore(export_path(STATS_DB_NAME))
+
+        count = self.stream_export([store, stats], until_failed(self.iter_batches(after_id=last_id)))
+        if count:
+            print(f"Добавлено {count} новых записей в {path}")
+            # Минутные, часовые и дневные агрегаты досчитываются по новым строкам
+            from rollups import RollupStore
+
+            rollups = RollupStore(path)
+            rollups.update()
+            rollups.close()
+        else:
+            print(f"Новых записей нет (последний id: {last_id})")
+        return path
+
     def interactive_menu(self):
         """Интерактивное меню для пользователя"""
-        print("Загрузка данных...")
-        data = self.get_all_data()
-        
-        if not data:
+        total = self.count()
+        if not total:
             print("Данные не найдены!")
             return
         
-        print(f"Загружено {len(data)} записей")
+        print(f"В базе {total} записей")
+        data = None  # полная выборка загружается только для экспорта и отчётов
         
         while True:
             print("\n" + "="*50)
             print("МЕНЮ ПРОСМОТРА И ЭКСПОРТА ДАННЫХ")
             print("="*50)
+            if self.cache is not None:
+                stats = self.cache.stats()
+                print(f"Кеш расшифровки: {stats['entries']} записей, "
+                      f"{stats['mb']} из {stats['limit_mb']} МБ | "
+                      f"попаданий {stats['hits']}, промахов {stats['misses']}, "
+                      f"вытеснено {stats['evictions']}")
             print("1. Просмотр данных в консоли")
             print("2. Экспорт в CSV")
             print("3. Экспорт в Excel")
-            print("4. Экспорт в JSON")
+            print("4. Экспорт в JSON (NDJSON)")
             print("5. Создать расшифрованную базу данных")
             print("6. Сгенерировать статистический отчет")
             print("7. Экспорт во все форматы")
             print("8. Обновить данные")
+            print("9. Инкрементальный экспорт (только новые записи)")
+            print("10. Экспорт в Parquet")
             print("0. Выход")
             
             choice = input("\nВыберите действие: ").strip()
             
+            if choice in ('2', '3', '4', '5', '7') and data is None:
+                print("Загрузка данных...")
+                data = self.get_all_data()
+                print(f"Загружено {len(data)} записей")
+            
             if choice == '1':
                 limit = input("Сколько записей показать (по умолчанию 10): ").strip()
                 limit = int(limit) if limit.isdigit() else 10
-                self.display_data(data, limit)
+                self.display_data(self.query(limit=limit), limit)
+                total = self.count()
+                if total > limit:
+                    print(f"\n... и еще {total - limit} записей")
             elif choice == '2':
                 filename = input("Введите имя файла (по умолчанию: decrypted_data.csv): ").strip()
                 self.export_to_csv(data, filename or 'decrypted_data.csv')
@@ -285,8 +885,8 @@ class DataViewer:
                 filename = input("Введите имя файла (по умолчанию: decrypted_data.xlsx): ").strip()
                 self.export_to_excel(data, filename or 'decrypted_data.xlsx')
             elif choice == '4':
-                filename = input("Введите имя файла (по умолчанию: decrypted_data.json): ").strip()
-                self.export_to_json(data, filename or 'decrypted_data.json')
+                filename = input("Введите имя файла (по умолчанию: decrypted_data.ndjson): ").strip()
+                self.export_to_json(data, filename or 'decrypted_data.ndjson')
             elif choice == '5':
                 filename = input("Введите имя файла (по умолчанию: decrypted_data.db): ").strip()
                 self.save_decrypted_database(data, filename or 'decrypted_data.db')
@@ -295,8 +895,15 @@ class DataViewer:
             elif choice == '7':
                 self.export_all_formats(data)
             elif choice == '8':
+                # Расшифровываются только строки, которых ещё нет в кеше
                 data = self.get_all_data()
                 print(f"Данные обновлены. Загружено {len(data)} записей")
+            elif choice == '9':
+                self.export_incremental()
+            elif choice == '10':
+                # Без загрузки всей выборки: пачки идут из базы прямо в файл
+                filename = input("Введите имя файла (по умолчанию: decrypted_data.parquet): ").strip()
+                self.export_to_parquet(filename=filename or 'decrypted_data.parquet')
             elif choice == '0':
                 break
             else:
@@ -308,6 +915,65 @@ def view_data():
     data = viewer.get_all_data()
     viewer.display_data(data, limit=len(data))
 
-if __name__ == "__main__":
+def export_incremental():
+    """Инкрементальный экспорт для ежедневных заданий (без меню)"""
     viewer = DataViewer()
-    viewer.interactive_menu()
\ No newline at end of file
+    return viewer.export_incremental()
+
+def parse_time(value):
+    """Время из командной строки: 'YYYY-MM-DD' или 'YYYY-MM-DD HH:MM:SS'"""
+    for fmt in (TIME_FORMAT, "%Y-%m-%d"):
+        try:
+            return datetime.strptime(value, fmt).strftime(TIME_FORMAT)
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError(f"Неверный формат времени: {value}")
+
+def parse_duration(value):
+    """Длительность вида 30s, 15m, 1h, 7d"""
+    units = {'s': 'seconds', 'm': 'minutes', 'h': 'hours', 'd': 'days'}
+    if len(value) < 2 or value[-1] not in units or not value[:-1].isdigit():
+        raise argparse.ArgumentTypeError(f"Неверная длительность: {value}")
+    return timedelta(**{units[value[-1]]: int(value[:-1])})
+
+def main():
+    parser = argparse.ArgumentParser(description="Просмотр и экспорт расшифрованных данных")
+    parser.add_argument("--cache-mb", type=int, default=DECRYPT_CACHE_MB,
+                        help="предел памяти кеша расшифровки в МБ (0 — выключить)")
+    commands = parser.add_subparsers(dest="command")
+
+    query_parser = commands.add_parser("query", help="выборка за период по индексу")
+    query_parser.add_argument("--start", type=parse_time, help="начало периода")
+    query_parser.add_argument("--end", type=parse_time, help="конец периода (не включительно)")
+    query_parser.add_argument("--last", type=parse_duration, help="последний период, например 1h")
+    query_parser.add_argument("--state", action="append", dest="states",
+                              help="фильтр по состоянию (можно несколько раз)")
+    query_parser.add_argument("--limit", type=int, help="максимум записей")
+    query_parser.add_argument("--newest-first", action="store_true", help="сначала новые")
+
+    commands.add_parser("incremental", help="инкрементальный экспорт новых записей")
+
+    parquet_parser = commands.add_parser("parquet", help="потоковый экспорт в Parquet")
+    parquet_parser.add_argument("--start", type=parse_time, help="начало периода")
+    parquet_parser.add_argument("--end", type=parse_time, help="конец периода (не включительно)")
+    parquet_parser.add_argument("--output", default="decrypted_data.parquet",
+                                help="имя файла в папке exports")
+    args = parser.parse_args()
+
+    viewer = DataViewer(cache_mb=args.cache_mb)
+    if args.command == "query":
+        start = args.start
+        if args.last is not None:
+            start = (datetime.now() - args.last).strftime(TIME_FORMAT)
+        data = viewer.query(start, args.end, args.states, args.limit, args.newest_first)
+        viewer.display_data(data, limit=len(data))
+        print(f"\nНайдено записей: {len(data)}")
+    elif args.command == "incremental":
+        viewer.export_incremental()
+    elif args.command == "parquet":
+        viewer.export_to_parquet(filename=args.output, start=args.start, end=args.end)
+    else:
+        viewer.interactive_menu()
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,76 @@
+import numpy as np
+
+# ---------- Настройки ----------
+PLOT_MAX_POINTS = 4000   # точек на одну линию графика
+
+def minmax_indices(values, n_out):
+    """
+    Индексы точек для прореживания min/max: в каждом интервале остаются
+    минимум и максимум, поэтому пики и провалы (тревоги) не теряются.
+    Интервал с NaN (простой, см. columnar.gap_breaks) даёт NaN-точку — разрыв линии сохраняется.
+    """
+    n = len(values)
+    buckets = max(n_out // 2, 1)
+    if n <= n_out:
+        return np.arange(n)
+
+    size = -(-n // buckets)  # деление с округлением вверх
+    padded = np.full(buckets * size, np.nan, dtype=np.float64)
+    padded[:n] = values
+    padded = padded.reshape(buckets, size)
+
+    offsets = np.arange(buckets) * size
+    low = offsets + np.argmin(np.where(np.isnan(padded), np.inf, padded), axis=1)
+    high = offsets + np.argmax(np.where(np.isnan(padded), -np.inf, padded), axis=1)
+    # Первый NaN интервала (без дополнения в конце) — точка разрыва
+    gaps = np.zeros(buckets * size, dtype=bool)
+    gaps[:n] = np.isnan(values)
+    gaps = gaps.reshape(buckets, size)
+    breaks = (offsets + np.argmax(gaps, axis=1))[gaps.any(axis=1)]
+
+    indices = np.unique(np.concatenate(([0, n - 1], low, high, breaks)))
+    return indices[indices < n]
+
+def lttb_indices(x, values, n_out):
+    """
+    Индексы точек по алгоритму Largest-Triangle-Three-Buckets:
+    из каждого интервала берётся точка, дающая наибольший треугольник
+    с предыдущей выбранной точкой и средним следующего интервала.
+    """
+    n = len(values)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(values, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    selected = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo = hi
+        next_hi = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_lo:next_hi].mean()
+        next_y = y[next_lo:next_hi]
+        avg_y = np.nanmean(next_y) if np.isfinite(next_y).any() else y[selected]
+
+        area = np.abs(
+            (x[selected] - avg_x) * (y[lo:hi] - y[selected])
+            - (x[selected] - x[lo:hi]) * (avg_y - y[selected])
+        )
+        selected = lo + (int(np.nanargmax(area)) if np.isfinite(area).any() else 0)
+        indices[i + 1] = selected
+
+    return indices
+
+def downsample(x, values, n_out=PLOT_MAX_POINTS, method="minmax"):
+    """Прореживание ряда перед построением графика: возвращает (x, values)."""
+    if method == "lttb":
+        indices = lttb_indices(x, values, n_out)
+    elif method == "minmax":
+        indices = minmax_indices(values, n_out)
+    else:
+        raise ValueError(f"Неизвестный метод прореживания: {method}")
+    return x[indices], values[indices]
@@ -0,0 +1,179 @@
+import re
+import random
+
+# ---------- Формат кадра прошивки (src/main.cpp, updateSerial) ----------
+# Temperature: 23.40 °C
+# Humidity: 40.00 %
+# Distance: 120.00 sm
+# System state: Alarm!!!
+# Быстрый путь: целый кадр из четырёх строк одним совпадением
+NUMBER = rb"([-+]?\d+(?:\.\d+)?)"
+FRAME_RE = re.compile(
+    rb"[ \t\r]*Temperature:[ \t]*" + NUMBER + rb"[^\n]*\n"
+    rb"[ \t\r]*Humidity:[ \t]*" + NUMBER + rb"[^\n]*\n"
+    rb"[ \t\r]*Distance:[ \t]*" + NUMBER + rb"[^\n]*\n"
+    rb"[ \t\r]*System state:[ \t]*([\w! ]*)[^\n]*\n"
+)
+
+# Медленный путь для неполных и повреждённых кадров:
+# одна строка потока за одно совпадение — имя числового поля и число,
+# либо состояние, либо ничего (тогда вся строка — в последней группе)
+LINE_RE = re.compile(
+    rb"(?:[^\n]*?(?:(Temperature|Humidity|Distance):[ \t]*([-+]?\d+(?:\.\d+)?)?"
+    rb"|System state:[ \t]*([\w! ]*))|)([^\n]*)\n"
+)
+
+# Поле определяется по первой букве имени (совпадения — срезы bytearray, они не хешируются)
+FIELDS = {
+    ord("T"): "temperature",
+    ord("H"): "humidity",
+    ord("D"): "distance",
+}
+MAX_LINE = 256  # строка длиннее без перевода строки считается мусором
+MAX_FRAME = 4 * MAX_LINE  # столько байт полных строк без состояния ждут конца кадра
+STATES = ("OFF", "Standby", "Alarm!!!")  # getSystemStateText в src/main.cpp
+
+def normalize_state(state):
+    """
+    Единое написание состояния: без пробелов по краям, пустое — None.
+    Старые записи хранят 'Alarm!!! ' с пробелом в конце, новые — 'Alarm!!!'.
+    """
+    if state is None:
+        return None
+    if isinstance(state, bytes):
+        state = state.decode(errors="replace")
+    return str(state).strip() or None
+
+class FrameParser:
+    """
+    Инкрементальный разбор потока Serial: на вход подаются байты в любых
+    порциях, на выходе — записи, как только кадр завершён строкой System state.
+    Неполные строки ждут продолжения, мусор и битые поля считаются в счётчиках.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._fields = {}
+        self.frames = 0        # выданные записи
+        self.incomplete = 0    # записи, в которых не хватало полей
+        self.malformed = 0     # поля с нечитаемым значением
+        self.dropped = 0       # кадры, оборванные началом следующего
+        self.garbage = 0       # строки, не похожие на поля кадра
+
+    def feed(self, data: bytes):
+        """Принимает очередную порцию байт и возвращает список завершённых записей."""
+        buffer = self._buffer
+        buffer += data
+        if b"\n" not in data:
+            if len(buffer) - buffer.rfind(b"\n") - 1 > MAX_LINE:
+                buffer.clear()
+                self.garbage += 1
+            return []
+        if not self._fields and len(buffer) <= MAX_FRAME and b"System state:" not in buffer:
+            return []  # кадр ещё не дошёл до строки состояния
+
+        fields = self._fields
+        records = []
+        consumed = 0
+        frame_match = FRAME_RE.match
+        line_match = LINE_RE.match
+        size = len(buffer)
+
+        while True:
+            # На границе кадра ждём строку состояния и разбираем кадр целиком.
+            # Без ожидания при мелких порциях чтения кадр разбирался бы по строкам
+            # и никогда не попадал на быстрый путь
+            if not fields:
+                state_at = buffer.find(b"System state:", consumed)
+                if state_at < 0 or buffer.find(b"\n", state_at) < 0:
+                    if size - consumed <= MAX_FRAME:
+                        break
+                else:
+                    match = frame_match(buffer, consumed)
+                    if match is not None:
+                        temperature, humidity, distance, state = match.groups()
+                        records.append(self._emit(
+                            float(temperature), float(humidity), float(distance),
+                            normalize_state(state)
+                        ))
+                        consumed = match.end()
+                        continue
+
+            match = line_match(buffer, consumed)
+            if match is None:
+                break
+            name, number, state, rest = match.groups()
+            consumed = match.end()
+
+            if name is not None:
+                field = FIELDS[name[0]]
+                # Поле повторилось до конца кадра — предыдущий кадр оборван
+                if field in fields:
+                    self.dropped += 1
+                    fields.clear()
+                if number is None:
+                    self.malformed += 1
+                    fields[field] = None
+                else:
+                    fields[field] = float(number)
+            elif state is not None:
+                self._fields = {}
+                records.append(self._emit(
+                    fields.get("temperature"), fields.get("humidity"), fields.get("distance"),
+                    normalize_state(state)
+                ))
+                fields = self._fields
+            elif rest.strip():
+                self.garbage += 1
+
+        if consumed:
+            del buffer[:consumed]
+        if len(buffer) - buffer.rfind(b"\n") - 1 > MAX_LINE:
+            buffer.clear()
+            self.garbage += 1
+
+        return records
+
+    def _emit(self, temperature, humidity, distance, state):
+        if temperature is None or humidity is None or distance is None or state is None:
+            self.incomplete += 1
+        self.frames += 1
+        return {
+            "temperature": temperature,
+            "humidity": humidity,
+            "distance": distance,
+            "state": state,
+        }
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "incomplete": self.incomplete,
+            "malformed": self.malformed,
+            "dropped": self.dropped,
+            "garbage": self.garbage,
+        }
+
+# ---------- Синтетический поток ----------
+def format_frame(temperature, humidity, distance, state) -> bytes:
+    """Кадр в том же виде, что печатает прошивка (Serial.println даёт \\r\\n)."""
+    return (
+        f"Temperature: {temperature:.2f} °C\r\n"
+        f"Humidity: {humidity:.2f} %\r\n"
+        f"Distance: {distance:.2f} sm\r\n"
+        f"System state: {state}\r\n"
+    ).encode()
+
+def synthetic_stream(frames, seed=0):
+    """Генератор кадров со случайными, но правдоподобными показаниями."""
+    rng = random.Random(seed)
+    state = "OFF"
+    for _ in range(frames):
+        if rng.random() < 0.02:
+            state = rng.choice(STATES)
+        yield format_frame(
+            20 + rng.random() * 5,
+            40 + rng.random() * 10,
+            rng.random() * 200,
+            state,
+        )
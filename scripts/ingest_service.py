@@ -0,0 +1,288 @@
+import time
+import signal
+import asyncio
+import argparse
+import serial
+import serial.tools.list_ports
+from concurrent.futures import ThreadPoolExecutor
+from crypto_utils import load_keyring
+from frame_parser import FrameParser
+from key_rotation import start_rotation
+from logger_serial import BAUD_RATE, BatchWriter, init_db, is_arduino_port
+from metrics import Metrics, start_metrics, register_parser
+
+# ---------- Настройки ----------
+SCAN_INTERVAL = 2.0      # период опроса списка портов (сек)
+READ_TIMEOUT = 0.5       # таймаут одного чтения порта (сек)
+RECONNECT_MIN = 1.0      # первая пауза перед переподключением (сек)
+RECONNECT_MAX = 30.0     # предел экспоненциальной паузы (сек)
+MAX_DEVICES = 16         # потоков чтения в пуле (по одному на порт)
+
+def device_id(port):
+    """Постоянный идентификатор платы: серийный номер USB, иначе имя порта."""
+    return port.serial_number or port.device
+
+# ---------- Одно устройство ----------
+class DeviceReader:
+    """
+    Сопрограмма чтения одного порта: блокирующие вызовы pyserial выполняются
+    в пуле потоков, разбор и шифрование — в цикле событий, записи уходят
+    в общий BatchWriter с пометкой устройства. При обрыве связи порт
+    переоткрывается с экспоненциальной паузой.
+    """
+
+    def __init__(self, port, device, service):
+        self.port = port
+        self.device = device
+        self.service = service
+        self.parser = FrameParser()
+        self.connected = False
+        register_parser(service.metrics, self.parser, device)
+
+        self.records = 0
+        self.bytes_read = 0
+        self.reconnects = 0
+
+    def _open(self):
+        return serial.Serial(self.port, BAUD_RATE, timeout=READ_TIMEOUT)
+
+    @staticmethod
+    def _read(ser):
+        # Первый байт ждём с таймаутом порта, остальное забираем разом
+        return ser.read(ser.in_waiting or 1)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        executor = self.service.executor
+        metrics = self.service.metrics
+        delay = RECONNECT_MIN
+        while True:
+            try:
+                ser = await loop.run_in_executor(executor, self._open)
+            except (serial.SerialException, OSError) as e:
+                print(f"[INGEST] {self.device}: не удалось открыть {self.port}: {e}. "
+                      f"Повтор через {delay:.1f} с")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX)
+                self.reconnects += 1
+                continue
+
+            print(f"[INGEST] {self.device}: подключено к {self.port}")
+            self.connected = True
+            pending = None
+            try:
+                while True:
+                    started = time.perf_counter()
+                    pending = loop.run_in_executor(executor, self._read, ser)
+                    data = await pending
+                    pending = None
+                    if not data:
+                        continue
+                    parse_started = time.perf_counter()
+                    metrics.observe("stage_seconds", parse_started - started, stage="read", device=self.device)
+                    metrics.inc("bytes_total", len(data), device=self.device)
+                    self.bytes_read += len(data)
+
+                    records = self.parser.feed(data)
+                    metrics.observe("stage_seconds", time.perf_counter() - parse_started,
+                                    stage="parse", device=self.device)
+                    if records:
+                        self.service.store(self.device, records)
+                        self.records += len(records)
+                        metrics.inc("frames_total", len(records), device=self.device)
+                        delay = RECONNECT_MIN  # связь устойчива — сбрасываем паузу
+            except (serial.SerialException, OSError) as e:
+                print(f"[INGEST] {self.device}: связь потеряна ({e}). "
+                      f"Повтор через {delay:.1f} с")
+            finally:
+                self.connected = False
+                # Порт закрываем только после завершения чтения в потоке пула
+                if pending is not None:
+                    await asyncio.wait([pending])
+                ser.close()
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX)
+            self.reconnects += 1
+
+    def stats(self):
+        return {
+            "port": self.port,
+            "records": self.records,
+            "bytes": self.bytes_read,
+            "reconnects": self.reconnects,
+            **self.parser.stats(),
+        }
+
+# ---------- Служба приёма ----------
+class IngestService:
+    """
+    Приём данных со всех подключённых плат в одном процессе.
+    Список портов опрашивается каждые scan_interval секунд: для новой платы
+    запускается DeviceReader, для отключённой — останавливается.
+    Порты из static_ports (например, pty для проверки) читаются всегда.
+    """
+
+    def __init__(self, catalog, static_ports=(), detect=True, scan_interval=SCAN_INTERVAL,
+                 metrics=None, live=None, anomalies=False):
+        self.catalog = catalog
+        self.static_ports = list(static_ports)
+        self.detect = detect
+        self.scan_interval = scan_interval
+        self.metrics = metrics or Metrics()
+        self.live = live    # LiveBuffer живого графика (все устройства)
+        self.detectors = {} if anomalies else None  # устройство → anomaly.StreamDetector
+
+        self.keyring = load_keyring()
+        self.writer = BatchWriter(catalog, metrics=self.metrics)
+        self.executor = ThreadPoolExecutor(max_workers=MAX_DEVICES, thread_name_prefix="serial")
+
+        self.readers = {}   # порт → DeviceReader
+        self._tasks = {}    # порт → asyncio.Task
+        self._stop = None
+
+    def store(self, device, records):
+        """Шифрует разобранные записи и ставит их в общую очередь записи."""
+        keyring = self.keyring
+        observe = self.metrics.observe
+        detector = None
+        if self.detectors is not None:
+            detector = self.detectors.get(device)
+            if detector is None:
+                from anomaly import StreamDetector
+
+                detector = self.detectors[device] = StreamDetector(device, self.metrics)
+        for data in records:
+            started = time.perf_counter()
+            payload, key_id = keyring.encrypt_record(data)
+            tag = keyring.state_tag(data["state"])
+            observe("stage_seconds", time.perf_counter() - started, stage="encrypt", device=device)
+            self.writer.add(payload, tag, device, key_id)
+            if self.live is not None:
+                self.live.publish(data, device)
+            if detector is not None:
+                started = time.perf_counter()
+                detector.update(data)
+                observe("stage_seconds", time.perf_counter() - started, stage="detect", device=device)
+
+    def _start(self, port, device):
+        reader = DeviceReader(port, device, self)
+        self.readers[port] = reader
+        task = asyncio.create_task(reader.run(), name=f"device:{port}")
+        task.add_done_callback(lambda task: self._reader_done(port, task))
+        self._tasks[port] = task
+        print(f"[INGEST] Устройство {device} ({port}) добавлено")
+
+    def _reader_done(self, port, task):
+        """
+        Чтение завершилось не по отмене — непредвиденная ошибка (обрывы связи
+        DeviceReader обрабатывает сам). Ошибка печатается, а порт снимается
+        с учёта, чтобы следующий опрос запустил чтение заново.
+        """
+        if task.cancelled() or task.exception() is None:
+            return
+        print(f"[INGEST] {self.readers[port].device}: чтение остановлено ошибкой: "
+              f"{task.exception()!r}. Перезапуск при следующем опросе портов")
+        if self._tasks.get(port) is task:
+            del self._tasks[port]
+
+    async def _stop_reader(self, port):
+        task = self._tasks.pop(port)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        print(f"[INGEST] Устройство {self.readers[port].device} ({port}) отключено")
+
+    async def scan(self):
+        """Сверяет запущенные чтения со списком портов системы."""
+        loop = asyncio.get_running_loop()
+        found = {}
+        if self.detect:
+            ports = await loop.run_in_executor(None, serial.tools.list_ports.comports)
+            found = {port.device: device_id(port) for port in ports if is_arduino_port(port)}
+        for port in self.static_ports:
+            found.setdefault(port, port)
+
+        for port, device in found.items():
+            if port not in self._tasks:
+                self._start(port, device)
+        for port in list(self._tasks):
+            if port not in found:
+                await self._stop_reader(port)
+
+    async def run(self):
+        self._stop = asyncio.Event()
+        rotator = start_rotation(self.catalog, self.keyring)
+        try:
+            while not self._stop.is_set():
+                await self.scan()
+                try:
+                    await asyncio.wait_for(self._stop.wait(), self.scan_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for port in list(self._tasks):
+                await self._stop_reader(port)
+            self.executor.shutdown(wait=True)
+            if rotator is not None:
+                rotator.stop()
+            self.writer.close()
+            for detector in (self.detectors or {}).values():
+                detector.flush()
+            for reader in self.readers.values():
+                print(f"[INGEST] {reader.device}: {reader.stats()}")
+            print(f"[INGEST] Задержки этапов: {self.metrics.stage_summary()}")
+
+    def stop(self):
+        if self._stop is not None:
+            self._stop.set()
+
+# ---------- main ----------
+async def serve(catalog, ports, detect, metrics=None, live=None, anomalies=False):
+    service = IngestService(catalog, ports, detect, metrics=metrics, live=live, anomalies=anomalies)
+    loop = asyncio.get_running_loop()
+    try:
+        loop.add_signal_handler(signal.SIGTERM, service.stop)
+    except (NotImplementedError, AttributeError):
+        pass  # Windows: остаётся только Ctrl+C
+    await service.run()
+
+def main():
+    parser = argparse.ArgumentParser(description="Приём данных с нескольких Arduino")
+    parser.add_argument("--port", action="append", default=[],
+                        help="порт, читаемый всегда (можно указать несколько раз)")
+    parser.add_argument("--no-detect", action="store_true",
+                        help="не искать платы, читать только порты из --port")
+    parser.add_argument("--metrics-port", type=int,
+                        help="порт HTTP-эндпоинта /metrics в формате Prometheus (только localhost)")
+    parser.add_argument("--stats-interval", type=float,
+                        help="печатать статистику этапов и устройств каждые N секунд")
+    parser.add_argument("--live-port", type=int,
+                        help="порт живого графика в браузере (только localhost)")
+    parser.add_argument("--anomalies", action="store_true",
+                        help="искать эпизоды тревог и аномалий датчиков на лету")
+    args = parser.parse_args()
+
+    print("[INGEST] Инициализация базы данных...")
+    catalog = init_db()
+    metrics = Metrics()
+    stop_metrics = start_metrics(metrics, args.metrics_port, args.stats_interval)
+    live = live_server = None
+    if args.live_port is not None:
+        from live import LiveBuffer, serve_live
+
+        live = LiveBuffer()
+        live_server = serve_live(live, args.live_port)
+    try:
+        asyncio.run(serve(catalog, args.port, not args.no_detect, metrics, live, args.anomalies))
+    except KeyboardInterrupt:
+        print("[INGEST] Остановка по запросу пользователя")
+    finally:
+        stop_metrics()
+        if live_server is not None:
+            live_server.shutdown()
+            live_server.server_close()
+        catalog.close()
+
+
+if __name__ == "__main__":
+    main()
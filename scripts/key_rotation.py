@@ -0,0 +1,189 @@
+import os
+import sqlite3
+import argparse
+import threading
+from crypto_utils import LEGACY_KEY_ID, KeyringError, load_keyring, decrypt_value
+from partitions import PartitionCatalog, init_logs_schema
+
+# ---------- Настройки ----------
+REWRAP_BATCH = 500      # строк в одной транзакции перешифровки
+REWRAP_PAUSE = 0.05     # пауза между транзакциями, чтобы не мешать логгеру (сек)
+
+UPDATE_SQL = """
+    UPDATE logs
+    SET payload = ?, key_id = ?, state_tag = ?,
+        temperature = NULL, humidity = NULL, distance = NULL, state = NULL
+    WHERE id = ?
+"""
+
+def _legacy_float(value):
+    return float(value) if value not in ("", None) else None
+
+def _decrypt(keyring, row):
+    """Запись строки logs в виде словаря (оба формата хранения)."""
+    _, temp, hum, dist, state, payload, key_id = row
+    if payload is not None:
+        return keyring.decrypt_record(payload, key_id)
+
+    fernet = keyring.fernet(key_id)
+    values = [decrypt_value(fernet, value) for value in (temp, hum, dist, state)]
+    if "<DECRYPTION_ERROR>" in values:
+        raise ValueError("Поле не расшифровывается")
+    return {
+        "temperature": _legacy_float(values[0]),
+        "humidity": _legacy_float(values[1]),
+        "distance": _legacy_float(values[2]),
+        "state": values[3] or None,
+    }
+
+def rewrap_partition(path, keyring, batch_size=REWRAP_BATCH, pause=REWRAP_PAUSE, stop=None):
+    """
+    Перешифровывает активным ключом строки партиции, записанные другими ключами,
+    небольшими транзакциями. Строки старого формата заодно переводятся
+    в payload и получают state_tag. Возвращает (перешифровано, ошибок).
+    """
+    conn = sqlite3.connect(path, timeout=30)
+    init_logs_schema(conn)
+    active_id = keyring.active_id
+    rewrapped = failed = 0
+    last_id = 0
+    try:
+        while stop is None or not stop.is_set():
+            rows = conn.execute(f"""
+                SELECT id, temperature, humidity, distance, state, payload, key_id
+                FROM logs
+                WHERE id > ? AND IFNULL(key_id, {LEGACY_KEY_ID}) != ?
+                ORDER BY id LIMIT ?
+            """, (last_id, active_id, batch_size)).fetchall()
+            if not rows:
+                break
+
+            updates = []
+            for row in rows:
+                try:
+                    data = _decrypt(keyring, row)
+                except Exception:
+                    failed += 1  # строка остаётся как есть, её ключ нужно восстановить
+                    continue
+                payload, key_id = keyring.encrypt_record(data)
+                updates.append((payload, key_id, keyring.state_tag(data["state"]), row[0]))
+
+            with conn:
+                conn.executemany(UPDATE_SQL, updates)
+            rewrapped += len(updates)
+            last_id = rows[-1][0]
+
+            if stop is not None and stop.wait(pause):
+                break
+    finally:
+        conn.close()
+    return rewrapped, failed
+
+def key_usage(path):
+    """Число строк партиции по номерам ключей."""
+    conn = sqlite3.connect(path)
+    try:
+        # Архивные партиции только читаются: в базе без key_id все строки на ключе 1
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(logs)")]
+        key_column = "key_id" if "key_id" in columns else "NULL"
+        return dict(conn.execute(
+            f"SELECT IFNULL({key_column}, {LEGACY_KEY_ID}), COUNT(*) FROM logs GROUP BY 1"
+        ).fetchall())
+    finally:
+        conn.close()
+
+def stored_partitions(catalog):
+    """Все сохранившиеся файлы партиций, включая архивные."""
+    paths = []
+    for name, _, _, status, rel_path in catalog.describe():
+        path = os.path.join(catalog.data_dir, rel_path)
+        if status != "dropped" and os.path.exists(path):
+            paths.append((name, path))
+    return paths
+
+# ---------- Фоновая перешифровка ----------
+class KeyRotator(threading.Thread):
+    """
+    Фоновый проход по активным партициям после ротации ключа.
+    Работает малыми транзакциями с паузами, поэтому запись новых данных
+    не останавливается; прерванный проход просто продолжится при следующем запуске.
+    """
+
+    def __init__(self, catalog, keyring, batch_size=REWRAP_BATCH, pause=REWRAP_PAUSE):
+        super().__init__(daemon=True)
+        self.paths = catalog.partitions()
+        self.keyring = keyring
+        self.batch_size = batch_size
+        self.pause = pause
+        self.rewrapped = 0
+        self.failed = 0
+        self._stopping = threading.Event()
+
+    def run(self):
+        for path in self.paths:
+            if self._stopping.is_set():
+                break
+            rewrapped, failed = rewrap_partition(
+                path, self.keyring, self.batch_size, self.pause, self._stopping
+            )
+            self.rewrapped += rewrapped
+            self.failed += failed
+            if rewrapped or failed:
+                print(f"[CRYPTO] {os.path.basename(path)}: перешифровано {rewrapped}, ошибок {failed}")
+
+    def stop(self):
+        self._stopping.set()
+
+def start_rotation(catalog, keyring):
+    """Запускает KeyRotator, если в связке есть неактивные ключи."""
+    if len(keyring.key_ids) < 2:
+        return None
+    rotator = KeyRotator(catalog, keyring)
+    rotator.start()
+    return rotator
+
+# ---------- main ----------
+def main():
+    parser = argparse.ArgumentParser(description="Ротация ключей шифрования")
+    sub = parser.add_subparsers(dest="command")
+    sub.add_parser("status", help="ключи связки и число строк по ключам")
+    rotate = sub.add_parser("rotate", help="новый активный ключ")
+    rotate.add_argument("--rewrap", action="store_true", help="сразу перешифровать старые строки")
+    sub.add_parser("rewrap", help="перешифровать строки активным ключом")
+    retire = sub.add_parser("retire", help="удалить неиспользуемый ключ")
+    retire.add_argument("key_id", type=int)
+    args = parser.parse_args()
+
+    try:
+        keyring = load_keyring()
+    except KeyringError as e:
+        print(f"[CRYPTO] {e}")
+        return
+
+    catalog = PartitionCatalog()
+    try:
+        if args.command == "rotate":
+            keyring.rotate()
+        if args.command == "rewrap" or (args.command == "rotate" and args.rewrap):
+            for path in catalog.partitions():
+                rewrapped, failed = rewrap_partition(path, keyring, pause=0)
+                print(f"[CRYPTO] {os.path.basename(path)}: перешифровано {rewrapped}, ошибок {failed}")
+        if args.command == "retire":
+            # Архивные партиции тоже проверяются: без ключа их уже не прочитать
+            used = [name for name, path in stored_partitions(catalog)
+                    if key_usage(path).get(args.key_id)]
+            if used:
+                print(f"[CRYPTO] Ключ {args.key_id} ещё используется: {', '.join(used)}")
+            else:
+                keyring.retire(args.key_id)
+
+        print(f"Ключи: {keyring.key_ids}, активный: {keyring.active_id}")
+        for name, path in stored_partitions(catalog):
+            usage = ", ".join(f"ключ {key_id}: {count}" for key_id, count in sorted(key_usage(path).items()))
+            print(f"{name:<16} {usage or 'пусто'}")
+    finally:
+        catalog.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+from itertools import islice
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ---------- Настройки ----------
+LIVE_HOST = "127.0.0.1"   # только локальный доступ
+LIVE_BUFFER = 3600        # записей в кольцевом буфере (2 часа при кадре раз в 2 с)
+LIVE_WINDOW = 1800        # точек на линию в браузере
+HEARTBEAT = 15.0          # пауза без данных, после которой шлётся комментарий SSE (сек)
+
+# ---------- Кольцевой буфер ----------
+class LiveBuffer:
+    """
+    Последние расшифрованные записи в памяти процесса логгера.
+    Каждая запись получает возрастающий номер seq: клиент запрашивает
+    записи после своего последнего номера и не пропускает ничего, что ещё в буфере.
+    Номера начинаются заново при каждом запуске процесса, поэтому к ним
+    прилагается boot — случайный идентификатор запуска.
+    publish — одно добавление в deque под блокировкой, горячий путь не замедляется.
+    """
+
+    def __init__(self, capacity=LIVE_BUFFER):
+        self._records = deque(maxlen=capacity)
+        self._seq = 0
+        self._cond = threading.Condition()
+        self.boot = os.urandom(4).hex()
+
+    def event_id(self, seq):
+        """Идентификатор события SSE: запуск и номер записи."""
+        return f"{self.boot}-{seq}"
+
+    def parse_event_id(self, value):
+        """
+        Номер из Last-Event-ID (или ?since=). Номер другого запуска,
+        нечитаемое значение и номер больше текущего дают 0: клиент получит весь буфер.
+        """
+        boot, _, seq = (value or "").rpartition("-")
+        if boot not in ("", self.boot) or not seq.isdigit():
+            return 0
+        seq = int(seq)
+        return seq if seq <= self._seq else 0
+
+    def publish(self, data, device=None):
+        record = {
+            "ts": time.time(),
+            "device": device,
+            "temperature": data.get("temperature"),
+            "humidity": data.get("humidity"),
+            "distance": data.get("distance"),
+            "state": data.get("state"),
+        }
+        with self._cond:
+            self._seq += 1
+            record["seq"] = self._seq
+            self._records.append(record)
+            self._cond.notify_all()
+
+    @property
+    def seq(self):
+        return self._seq
+
+    def since(self, seq):
+        """Записи с номером больше seq (из тех, что ещё в буфере); seq больше текущего — как 0."""
+        with self._cond:
+            if seq > self._seq:
+                seq = 0
+            if not self._records or seq >= self._seq:
+                return []
+            skip = max(0, seq - self._records[0]["seq"] + 1)
+            return list(islice(self._records, skip, None))
+
+    def wait(self, seq, timeout):
+        """Ждёт записей новее seq не дольше timeout секунд."""
+        with self._cond:
+            if seq > self._seq:
+                seq = 0  # номер прошлого запуска процесса
+            self._cond.wait_for(lambda: self._seq > seq, timeout)
+        return self.since(seq)
+
+# ---------- Страница ----------
+PAGE = """<!doctype html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Arduino: живой график</title>
+<script src="/plotly.js"></script>
+<style>
+  body { font-family: sans-serif; margin: 0; }
+  #status { padding: 10px 16px; font-size: 20px; background: #eee; }
+  #status.alarm { background: #c00; color: #fff; }
+  #chart { height: 85vh; }
+</style>
+</head>
+<body>
+<div id="status">Ожидание данных…</div>
+<div id="chart"></div>
+<script>
+const COLORS = __COLORS__;
+const UNKNOWN = "__UNKNOWN__";
+const WINDOW = __WINDOW__;
+const SENSORS = ["temperature", "humidity", "distance"];
+let device = new URLSearchParams(location.search).get("device");
+let bands = [];  // интервалы состояния: {state, x0, x1}
+
+Plotly.newPlot("chart", [
+  {x: [], y: [], mode: "lines", name: "Температура (°C)", line: {color: "red", width: 2}, yaxis: "y1"},
+  {x: [], y: [], mode: "lines", name: "Влажность (%)", line: {color: "blue", width: 2, dash: "dot"}, yaxis: "y2"},
+  {x: [], y: [], mode: "lines", name: "Расстояние (см)", line: {color: "green", width: 2, dash: "dash"}, yaxis: "y3"},
+], {
+  xaxis: {title: {text: "Время"}},
+  yaxis: {title: {text: "Температура (°C)", font: {color: "red"}}, tickfont: {color: "red"}},
+  yaxis2: {title: {text: "Влажность (%)", font: {color: "blue"}}, tickfont: {color: "blue"},
+           overlaying: "y", side: "right"},
+  yaxis3: {title: {text: "Расстояние (см)", font: {color: "green"}}, tickfont: {color: "green"},
+           overlaying: "y", side: "right", anchor: "free", position: 0.98},
+  template: "plotly_white",
+  legend: {x: 0.5, y: -0.2, orientation: "h", xanchor: "center"},
+  shapes: [],
+}, {responsive: true});
+
+function onRecords(records) {
+  const x = [[], [], []], y = [[], [], []];
+  let last = null;
+  for (const r of records) {
+    if (device === null) device = r.device;
+    if (r.device !== device) continue;
+    const t = new Date(r.ts * 1000);
+    SENSORS.forEach((sensor, i) => { x[i].push(t); y[i].push(r[sensor]); });
+    // Полоса состояния тянется до последней записи; смена состояния открывает новую
+    const band = bands[bands.length - 1];
+    if (band) band.x1 = t;
+    if (!band || band.state !== r.state) bands.push({state: r.state, x0: t, x1: t});
+    last = r;
+  }
+  if (last === null) return;
+
+  Plotly.extendTraces("chart", {x, y}, [0, 1, 2], WINDOW);
+  const first = document.getElementById("chart").data[0].x[0];
+  bands = bands.filter(band => band.x1 >= first);
+  Plotly.relayout("chart", {shapes: bands.map(band => ({
+    type: "rect", xref: "x", yref: "paper", x0: band.x0, x1: band.x1, y0: 0, y1: 1,
+    fillcolor: COLORS[(band.state || "").toLowerCase()] || UNKNOWN, line: {width: 0}, layer: "below",
+  }))});
+
+  const status = document.getElementById("status");
+  status.textContent = `${device}: ${last.state} | T=${last.temperature} °C | ` +
+    `H=${last.humidity} % | D=${last.distance} см | ${new Date(last.ts * 1000).toLocaleTimeString()}`;
+  status.className = (last.state || "").toLowerCase().startsWith("alarm") ? "alarm" : "";
+}
+
+const source = new EventSource("/events");
+source.onmessage = event => onRecords(JSON.parse(event.data));
+source.onerror = () => { document.getElementById("status").textContent = "Нет связи с логгером, переподключение…"; };
+</script>
+</body>
+</html>
+"""
+
+def render_page(window=LIVE_WINDOW):
+    from render import STATE_COLORS, UNKNOWN_COLOR
+
+    return (PAGE
+            .replace("__COLORS__", json.dumps(STATE_COLORS))
+            .replace("__UNKNOWN__", UNKNOWN_COLOR)
+            .replace("__WINDOW__", str(window)))
+
+# ---------- HTTP-сервер ----------
+class LiveHandler(BaseHTTPRequestHandler):
+    def _send(self, body, content_type, cache="no-cache"):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", cache)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/":
+            self._send(self.server.asset("page"), "text/html; charset=utf-8")
+        elif url.path == "/plotly.js":
+            self._send(self.server.asset("plotly"), "text/javascript; charset=utf-8", "max-age=3600")
+        elif url.path == "/events":
+            self._events(url)
+        else:
+            self.send_error(404)
+
+    def _events(self, url):
+        buffer = self.server.buffer
+        last = buffer.parse_event_id(
+            self.headers.get("Last-Event-ID") or parse_qs(url.query).get("since", ["0"])[0]
+        )
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        try:
+            while not self.server.stopping.is_set():
+                records = buffer.wait(last, HEARTBEAT)
+                if records:
+                    last = records[-1]["seq"]
+                    data = json.dumps(records, ensure_ascii=False)
+                    self.wfile.write(f"id: {buffer.event_id(last)}\ndata: {data}\n\n".encode())
+                else:
+                    self.wfile.write(b": ping\n\n")  # держит соединение через прокси
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # вкладка закрыта
+
+    def log_message(self, format, *args):
+        pass  # запросы браузера не засоряют консоль логгера
+
+class LiveServer(ThreadingHTTPServer):
+    """
+    Сервер живого графика: / — страница, /events — поток SSE.
+    Клиент сначала получает содержимое буфера, затем новые записи по мере публикации;
+    после обрыва EventSource переподключается с Last-Event-ID и получает пропущенное,
+    а после перезапуска логгера — весь новый буфер.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, buffer):
+        super().__init__(address, LiveHandler)
+        self.buffer = buffer
+        self.stopping = threading.Event()
+        self._assets = {}
+
+    def asset(self, name):
+        # Страница и plotly.js (около 5 МБ) собираются при первом запросе
+        if name not in self._assets:
+            if name == "page":
+                self._assets[name] = render_page().encode()
+            else:
+                from plotly.offline import get_plotlyjs
+                self._assets[name] = get_plotlyjs().encode()
+        return self._assets[name]
+
+    def shutdown(self):
+        self.stopping.set()
+        super().shutdown()
+
+def serve_live(buffer, port, host=LIVE_HOST):
+    """Запускает LiveServer в фоновом потоке; возвращает сервер (shutdown() — остановка)."""
+    server = LiveServer((host, port), buffer)
+    threading.Thread(target=server.serve_forever, daemon=True, name="live-http").start()
+    print(f"[LIVE] Живой график: http://{host}:{server.server_port}/")
+    return server
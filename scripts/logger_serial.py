@@ -1,133 +1,425 @@
 import os
-import re
 import time
+import queue
+import argparse
 import sqlite3
+import threading
 import serial
 from datetime import datetime
 import serial.tools.list_ports
-from crypto_utils import load_or_create_key, encrypt_value
+from crypto_utils import load_keyring
+from partitions import PartitionCatalog, init_logs_schema
+from frame_parser import FrameParser
+from key_rotation import start_rotation
+from metrics import Metrics, start_metrics, register_parser
 
 # ---------- Настройки ----------
-DB_PATH = os.path.join("data", "data.db")
 BAUD_RATE = 115200
-LOG_INTERVAL = 0.1 # задержка чтения Serial (сек)
+READ_QUEUE_SIZE = 1024 # максимум непрочитанных порций между потоком чтения и разбором
+QUEUE_PUT_TIMEOUT = 0.5 # шаг ожидания места в полной очереди (сек)
+BATCH_SIZE = 500 # максимальный размер пачки записей перед сбросом в базу
+FLUSH_INTERVAL = 0.25 # максимальная задержка записи пачки (сек)
+MAX_PENDING = 100000  # предел очереди записи, пока база недоступна (старейшие строки отбрасываются)
 
 # ---------- Инициализация базы ----------
 def init_db():
+    """Открывает каталог партиций logs, применяет политику хранения и догоняет схему партиций."""
     os.makedirs("logs", exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT,
-            temperature REAL,
-            humidity REAL,
-            distance REAL,
-            state TEXT
-        )
-    """)
-    conn.commit()
-    conn.close()
+    catalog = PartitionCatalog()
+    catalog.apply_retention()
+    catalog.upgrade_schema()
+    return catalog
 
 # ---------- Определение COM-порта ----------
+def is_arduino_port(port):
+    return "Arduino" in port.description or "USB-SERIAL" in port.description
+
 def detect_arduino_port():
     ports = serial.tools.list_ports.comports()
     for port in ports:
-        if "Arduino" in port.description or "USB-SERIAL" in port.description:
+        if is_arduino_port(port):
             return port.device
     return ports[0].device if ports else None
 
-# ---------- Парсинг строки ----------
-def parse_data(line: str):
+# ---------- Запись в базу ----------
+class BatchWriter:
     """
-    Пример входных строк:
-    Temperature: 23.4 °C
-    Humidity: 40 %
-    Distance: 120 sm
-    System state: Alarm!!!
+    Долгоживущий писатель в базу: соединение с текущей партицией в режиме WAL,
+    записи копятся в очереди и сбрасываются одной транзакцией через executemany,
+    когда набирается batch_size строк или проходит flush_interval секунд.
+    Сброс выполняет фоновый поток: add() только ставит строку в очередь,
+    поэтому вызывающий (в том числе цикл событий службы приёма) не ждёт базу.
+    Строки раскладываются по партициям каталога по метке времени.
     """
-    temp = re.search(r"Temperature:\s*([\d.]+)", line)
-    hum = re.search(r"Humidity:\s*([\d.]+)", line)
-    dist = re.search(r"Distance:\s*([\d.]+)", line)
-    state = re.search(r"System state:\s*([\w! ]+)", line)
-
-    return {
-        "temperature": float(temp.group(1)) if temp else None,
-        "humidity": float(hum.group(1)) if hum else None,
-        "distance": float(dist.group(1)) if dist else None,
-        "state": state.group(1) if state else None,
-    }
 
-# ---------- Запись в базу ----------
-def insert_data(data):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("""
-        INSERT INTO logs (timestamp, temperature, humidity, distance, state)
+    INSERT_SQL = """
+        INSERT INTO logs (timestamp, payload, state_tag, device, key_id)
         VALUES (?, ?, ?, ?, ?)
-    """, (
-        datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        data["temperature"],
-        data["humidity"],
-        data["distance"],
-        data["state"]
-    ))
-    conn.commit()
-    conn.close()
+    """
+
+    def __init__(self, catalog, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL, metrics=None,
+                 max_pending=MAX_PENDING):
+        self.catalog = catalog
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.dropped = 0  # строк отброшено из-за переполнения очереди
+        self.metrics = metrics
+        if metrics is not None:
+            metrics.register("pending_rows", lambda: len(self._pending))
+
+        self._db_path = None
+        self.conn = None
+        self._error = None  # последняя ошибка записи; сбрасывается успешным сбросом
+
+        self._pending = []
+        self._lock = threading.Lock()        # очередь строк
+        self._write_lock = threading.Lock()  # соединение: пишет один поток за раз
+        self._wake = threading.Event()       # набралась пачка — сбросить, не дожидаясь таймера
+        self._stop = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        self._flusher.start()
+
+    def add(self, payload, tag=None, device=None, key_id=None):
+        """
+        Ставит зашифрованную запись в очередь; метка времени фиксируется в момент приёма.
+        Ошибки записи сюда не пробрасываются: пока база недоступна, строки копятся
+        в очереди (не больше max_pending), а сбой виден в логе и метриках.
+        """
+        row = (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), payload, tag, device, key_id)
+        dropped = 0
+        with self._lock:
+            self._pending.append(row)
+            full = len(self._pending) >= self.batch_size
+            if len(self._pending) > self.max_pending:
+                dropped = len(self._pending) - self.max_pending
+                del self._pending[:dropped]
+        if full:
+            self._wake.set()
+        if dropped:
+            if not self.dropped:
+                print(f"[STORAGE] Очередь записи переполнена ({self.max_pending} строк), "
+                      f"старейшие строки отбрасываются")
+            self.dropped += dropped
+            if self.metrics is not None:
+                self.metrics.inc("rows_dropped_total", dropped)
+
+    def flush(self):
+        """Записывает все накопленные строки; если записать не удалось — пробрасывает ошибку."""
+        self._flush()
+        error = self._error
+        if error is not None:
+            raise error
+
+    def _flush(self):
+        with self._write_lock:
+            with self._lock:
+                rows, self._pending = self._pending, []
+            if rows:
+                self._write(rows)
+
+    def _write(self, rows):
+        """Пишет строки по партициям; возвращает число записанных, остальные — снова в очереди."""
+        started = time.perf_counter()
+
+        # Строки идут по времени, поэтому пачка делится на непрерывные куски по партициям
+        written = 0
+        try:
+            while written < len(rows):
+                path = self.catalog.path_for(rows[written][0])
+                period_start, period_end = self.catalog.current_period
+                end = written + 1
+                while end < len(rows) and period_start <= rows[end][0] < period_end:
+                    end += 1
+                with self._connection(path):
+                    self.conn.executemany(self.INSERT_SQL, rows[written:end])
+                written = end
+        except (sqlite3.Error, RuntimeError, OSError) as e:
+            # Незаписанные строки возвращаются в начало очереди: следующий сброс их повторит
+            with self._lock:
+                self._pending[:0] = rows[written:]
+            if self._error is None:
+                print(f"[STORAGE] Ошибка записи ({e}), строк в очереди: {len(self._pending)}")
+            self._error = e
+            if self.metrics is not None:
+                self.metrics.inc("write_errors_total")
+        else:
+            if self._error is not None:
+                print("[STORAGE] Запись восстановлена")
+            self._error = None
+
+        if self.metrics is not None and written:
+            self.metrics.observe("stage_seconds", time.perf_counter() - started, stage="insert")
+            self.metrics.inc("rows_written_total", written)
+        return written
+
+    def _connection(self, path):
+        """Соединение с партицией; при переходе на новую старое закрывается."""
+        if path != self._db_path:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = self._db_path = None
+            conn = sqlite3.connect(path, check_same_thread=False)
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                init_logs_schema(conn)
+            except sqlite3.Error:
+                conn.close()
+                raise
+            self.conn, self._db_path = conn, path
+        return self.conn
+
+    def _flush_loop(self):
+        # Сбрасываем очередь по таймеру, даже если поток данных остановился,
+        # и сразу, когда набралась пачка. Ошибка записи не останавливает поток:
+        # сброс повторится не раньше чем через flush_interval
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self._flush()
+            if self._error is not None:
+                self._stop.wait(self.flush_interval)
+
+    def close(self):
+        """
+        Останавливает фоновый сброс, дописывает остаток и закрывает соединение.
+        Строки, которые так и не удалось записать, попадают только в лог.
+        """
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._wake.set()
+        self._flusher.join()
+        self._flush()
+        if self._pending:
+            print(f"[STORAGE] Не записано строк: {len(self._pending)} ({self._error})")
+        if self.conn is not None:
+            self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+# ---------- Чтение Serial ----------
+class SerialReader(threading.Thread):
+    """
+    Поток чтения порта: блокируется до прихода данных и забирает всё,
+    что накопилось во входном буфере (in_waiting), без фиксированных пауз.
+    Порции байт передаются в очередь вместе с моментом чтения;
+    её заполнение — метрика обратного давления.
+    """
+
+    def __init__(self, ser, chunks, metrics=None, device=None):
+        super().__init__(daemon=True)
+        self.ser = ser
+        self.chunks = chunks
+        self.metrics = metrics
+        self.device = device
+        self.error = None
+        self._stopping = threading.Event()
+
+        self.bytes_read = 0
+        self.reads = 0
+        self.max_depth = 0         # наибольшая глубина очереди
+        self.blocked_time = 0.0    # время ожидания места в очереди (сек)
+
+    def run(self):
+        try:
+            while not self._stopping.is_set():
+                # Первый байт ждём с таймаутом порта, остальное забираем разом
+                started = time.perf_counter()
+                data = self.ser.read(self.ser.in_waiting or 1)
+                if not data:
+                    continue
+                read_at = time.perf_counter()
+                self.bytes_read += len(data)
+                self.reads += 1
+                if self.metrics is not None:
+                    # При простое сюда входит ожидание данных от платы
+                    self.metrics.observe("stage_seconds", read_at - started, stage="read", device=self.device)
+                    self.metrics.inc("bytes_total", len(data), device=self.device)
+
+                try:
+                    self.chunks.put_nowait((read_at, data))
+                except queue.Full:
+                    # Ждём места порциями, чтобы stop() не повис на полной очереди
+                    started = time.perf_counter()
+                    while not self._stopping.is_set():
+                        try:
+                            self.chunks.put((read_at, data), timeout=QUEUE_PUT_TIMEOUT)
+                            break
+                        except queue.Full:
+                            continue
+                    self.blocked_time += time.perf_counter() - started
+                self.max_depth = max(self.max_depth, self.chunks.qsize())
+        except serial.SerialException as e:
+            if not self._stopping.is_set():
+                self.error = e
+        finally:
+            # Сигнал потребителю: чтение завершено. Если очередь полна, потребитель
+            # узнает о завершении по is_alive() после её разбора
+            try:
+                self.chunks.put_nowait(None)
+            except queue.Full:
+                pass
+
+    def stop(self):
+        self._stopping.set()
+
+    def stats(self):
+        return {
+            "bytes": self.bytes_read,
+            "reads": self.reads,
+            "queue_depth": self.chunks.qsize(),
+            "max_queue_depth": self.max_depth,
+            "blocked_sec": round(self.blocked_time, 3),
+        }
 
 # ---------- Основной логгер ----------
-def log_serial_data(port):
-    # Загружаем (или создаём) ключ шифрования
-    fernet = load_or_create_key()
+def log_serial_data(port, catalog, writer=None, echo=True, metrics=None, live=None, detector=None):
+    """
+    Читает порт, шифрует кадры и пишет их в базу.
+    echo=False отключает печать принятого потока в консоль (она сама нагружает горячий путь).
+    Задержки этапов read/queue_wait/parse/encrypt/insert и счётчики копятся в metrics.
+    Разобранные записи публикуются в live (LiveBuffer) для живого графика
+    и проходят через detector (anomaly.StreamDetector), если он задан.
+    """
+    # Загружаем (или создаём) ключи шифрования; старые строки
+    # перешифровываются в фоне, если после ротации остались неактивные ключи
+    keyring = load_keyring()
+    rotator = start_rotation(catalog, keyring)
 
+    metrics = metrics or Metrics()
+    if writer is None:
+        writer = BatchWriter(catalog, metrics=metrics)
+    elif writer.metrics is None:
+        writer.metrics = metrics
+    parser = FrameParser()
+    chunks = queue.Queue(maxsize=READ_QUEUE_SIZE)
+    metrics.register("queue_depth", chunks.qsize, device=port)
+    register_parser(metrics, parser, port)
+    observe = metrics.observe
+    perf_counter = time.perf_counter
+    reader = None
     try:
         with serial.Serial(port, BAUD_RATE, timeout=1) as ser:
-            print(f"[LOGGER] Подключено к {port}. Запись в {DB_PATH}")
-            buffer = ""
+            print(f"[LOGGER] Подключено к {port}. Запись в {catalog.data_dir}")
+            reader = SerialReader(ser, chunks, metrics, port)
+            reader.start()
 
-            while True:
-                line = ser.readline().decode(errors="ignore").strip()
-                if line:
-                    print(line)
-                    buffer += line + " "
+            try:
+                while True:
+                    try:
+                        item = chunks.get(timeout=1)
+                    except queue.Empty:
+                        if not reader.is_alive():
+                            break
+                        continue
+                    if item is None:
+                        break
+                    read_at, chunk = item
+                    started = perf_counter()
+                    observe("stage_seconds", started - read_at, stage="queue_wait", device=port)
 
-                    # Когда накопили блок из нескольких полей (например, строка с состоянием)
-                    if "System state" in line:
-                        data = parse_data(buffer)
+                    if echo:
+                        print(chunk.decode(errors="ignore"), end="", flush=True)
 
-                        # --- 🔐 Шифрование перед записью ---
-                        encrypted_data = {}
-                        for key, value in data.items():
-                            if value is not None:
-                                encrypted_data[key] = encrypt_value(fernet, str(value))
-                            else:
-                                encrypted_data[key] = None
+                    # Парсер сам собирает кадр и отдаёт запись после строки System state
+                    started = perf_counter()
+                    records = parser.feed(chunk)
+                    observe("stage_seconds", perf_counter() - started, stage="parse", device=port)
 
-                        # Теперь вместо исходных данных записываем зашифрованные
-                        insert_data(encrypted_data)
+                    for data in records:
+                        # --- 🔐 Шифрование перед записью: одна запись — один токен ---
+                        started = perf_counter()
+                        payload, key_id = keyring.encrypt_record(data)
+                        tag = keyring.state_tag(data["state"])
+                        observe("stage_seconds", perf_counter() - started, stage="encrypt", device=port)
+                        writer.add(payload, tag, port, key_id)
+                        if live is not None:
+                            live.publish(data, port)
+                        if detector is not None:
+                            started = perf_counter()
+                            detector.update(data)
+                            observe("stage_seconds", perf_counter() - started, stage="detect", device=port)
+                    if records:
+                        metrics.inc("frames_total", len(records), device=port)
+            finally:
+                # Останавливаем поток чтения и дожидаемся его до закрытия порта
+                reader.stop()
+                reader.join()
 
-                        buffer = ""  # очистить буфер после записи
-
-                time.sleep(LOG_INTERVAL)
+            if reader.error is not None:
+                raise reader.error
 
     except serial.SerialException as e:
         print(f"[LOGGER] Ошибка подключения: {e}")
+    except KeyboardInterrupt:
+        print("[LOGGER] Остановка по запросу пользователя")
+    finally:
+        # Дописываем накопленные записи перед выходом
+        if rotator is not None:
+            rotator.stop()
+        writer.close()
+        print(f"[LOGGER] Статистика разбора: {parser.stats()}")
+        if reader is not None:
+            print(f"[LOGGER] Статистика чтения: {reader.stats()}")
+        print(f"[LOGGER] Задержки этапов: {metrics.stage_summary()}")
 
 
 # ---------- main ----------
 def main():
+    parser = argparse.ArgumentParser(description="Запись данных Arduino в зашифрованную базу")
+    parser.add_argument("--port", help="порт Serial (по умолчанию — поиск Arduino)")
+    parser.add_argument("--no-echo", action="store_true", help="не печатать принятый поток")
+    parser.add_argument("--metrics-port", type=int,
+                        help="порт HTTP-эндпоинта /metrics в формате Prometheus (только localhost)")
+    parser.add_argument("--stats-interval", type=float,
+                        help="печатать статистику этапов и устройств каждые N секунд")
+    parser.add_argument("--live-port", type=int,
+                        help="порт живого графика в браузере (только localhost)")
+    parser.add_argument("--anomalies", action="store_true",
+                        help="искать эпизоды тревог и аномалий датчиков на лету")
+    args = parser.parse_args()
+
     print("[LOGGER] Инициализация базы данных...")
-    init_db()
-    print("[LOGGER] Поиск Arduino...")
+    catalog = init_db()
 
-    port = detect_arduino_port()
+    port = args.port
+    if not port:
+        print("[LOGGER] Поиск Arduino...")
+        port = detect_arduino_port()
     if not port:
         print("[LOGGER] Arduino не найдено.")
         return
 
     print(f"[LOGGER] Найден порт: {port}")
-    log_serial_data(port)
+    metrics = Metrics()
+    stop_metrics = start_metrics(metrics, args.metrics_port, args.stats_interval)
+    live = live_server = None
+    if args.live_port is not None:
+        from live import LiveBuffer, serve_live
+
+        live = LiveBuffer()
+        live_server = serve_live(live, args.live_port)
+    detector = None
+    if args.anomalies:
+        from anomaly import StreamDetector
+
+        detector = StreamDetector(port, metrics)
+    try:
+        log_serial_data(port, catalog, echo=not args.no_echo, metrics=metrics, live=live,
+                        detector=detector)
+    finally:
+        if detector is not None:
+            detector.flush()
+        stop_metrics()
+        if live_server is not None:
+            live_server.shutdown()
+            live_server.server_close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,263 @@
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ---------- Настройки ----------
+PREFIX = "arduino_logger"
+METRICS_HOST = "127.0.0.1"   # только локальный доступ
+# Границы корзин задержек (сек): от 10 мкс (разбор кадра) до секунд (запись на медленный диск)
+LATENCY_BUCKETS = (
+    1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4,
+    1e-3, 2.5e-3, 5e-3, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+)
+STAGES = ("read", "queue_wait", "parse", "encrypt", "detect", "insert")
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами, как histogram в Prometheus."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # последняя — +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def copy(self):
+        other = Histogram(self.buckets)
+        other.counts = list(self.counts)
+        other.count = self.count
+        other.sum = self.sum
+        return other
+
+    def since(self, earlier):
+        """Наблюдения после снимка earlier (для статистики за интервал)."""
+        other = self.copy()
+        if earlier is not None:
+            other.counts = [a - b for a, b in zip(self.counts, earlier.counts)]
+            other.count -= earlier.count
+            other.sum -= earlier.sum
+        return other
+
+    def quantile(self, q):
+        """Оценка квантиля линейной интерполяцией внутри корзины (как histogram_quantile)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                low = self.buckets[i - 1] if i else 0.0
+                return low + (self.buckets[i] - low) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+def _labels_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+# ---------- Реестр ----------
+class Metrics:
+    """
+    Счётчики, гистограммы задержек и показатели-функции одного процесса.
+    Счётчики и гистограммы обновляются на горячем пути под одной блокировкой;
+    показатели (глубина очереди, счётчики парсера) вычисляются при чтении.
+    """
+
+    def __init__(self, prefix=PREFIX):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._counters = {}     # (имя, метки) → значение
+        self._histograms = {}   # (имя, метки) → Histogram
+        self._callbacks = {}    # (имя, метки) → (функция, тип)
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def register(self, name, func, kind="gauge", **labels):
+        """Показатель, значение которого берётся вызовом func() при каждом чтении."""
+        with self._lock:
+            self._callbacks[self._key(name, labels)] = (func, kind)
+
+    def snapshot(self):
+        """(счётчики, гистограммы) — копии на текущий момент, с показателями-функциями."""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: histogram.copy() for key, histogram in self._histograms.items()}
+            callbacks = dict(self._callbacks)
+        for key, (func, _) in callbacks.items():
+            try:
+                counters[key] = func()
+            except Exception:
+                pass  # источник уже закрыт (например, отключённое устройство)
+        return counters, histograms
+
+    def render(self):
+        """Текстовый формат Prometheus (exposition format 0.0.4)."""
+        counters, histograms = self.snapshot()
+        with self._lock:
+            kinds = {key: kind for key, (_, kind) in self._callbacks.items()}
+
+        lines = []
+        typed = set()
+        for (name, labels), value in sorted(counters.items()):
+            full = f"{self.prefix}_{name}"
+            if full not in typed:
+                lines.append(f"# TYPE {full} {kinds.get((name, labels), 'counter')}")
+                typed.add(full)
+            lines.append(f"{full}{_labels_text(labels)} {value}")
+
+        for (name, labels), histogram in sorted(histograms.items()):
+            full = f"{self.prefix}_{name}"
+            if full not in typed:
+                lines.append(f"# TYPE {full} histogram")
+                typed.add(full)
+            cumulative = 0
+            for bound, count in zip(list(histogram.buckets) + ["+Inf"], histogram.counts):
+                cumulative += count
+                lines.append(f"{full}_bucket{_labels_text(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{full}_sum{_labels_text(labels)} {histogram.sum}")
+            lines.append(f"{full}_count{_labels_text(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def stage_summary(self, histograms=None):
+        """Строка 'этап p50/p99' по гистограммам stage_seconds (все устройства вместе)."""
+        if histograms is None:
+            _, histograms = self.snapshot()
+        merged = {}
+        for (name, labels), histogram in histograms.items():
+            stage = dict(labels).get("stage")
+            if name != "stage_seconds" or not histogram.count:
+                continue
+            total = merged.get(stage)
+            if total is None:
+                merged[stage] = histogram.copy()
+            else:
+                total.counts = [a + b for a, b in zip(total.counts, histogram.counts)]
+                total.count += histogram.count
+                total.sum += histogram.sum
+
+        parts = []
+        for stage in sorted(merged, key=lambda s: STAGES.index(s) if s in STAGES else len(STAGES)):
+            histogram = merged[stage]
+            parts.append(f"{stage} p50 {histogram.quantile(0.5) * 1000:.3f} мс, "
+                         f"p99 {histogram.quantile(0.99) * 1000:.3f} мс ({histogram.count})")
+        return "; ".join(parts) or "нет наблюдений"
+
+# ---------- HTTP-эндпоинт ----------
+def serve_metrics(metrics, port, host=METRICS_HOST):
+    """Запускает HTTP-сервер /metrics в фоновом потоке; возвращает сервер (shutdown() — остановка)."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = metrics.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # запросы Prometheus не засоряют консоль логгера
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics-http").start()
+    print(f"[METRICS] Эндпоинт: http://{host}:{server.server_port}/metrics")
+    return server
+
+# ---------- Периодический журнал ----------
+class StatsLogger(threading.Thread):
+    """
+    Раз в interval секунд печатает задержки этапов за прошедший интервал
+    и по каждому устройству — скорость кадров и байт, глубину очереди и ошибки разбора.
+    """
+
+    def __init__(self, metrics, interval):
+        super().__init__(daemon=True, name="metrics-log")
+        self.metrics = metrics
+        self.interval = interval
+        self._stopping = threading.Event()
+        self._previous = ({}, {})
+
+    def run(self):
+        while not self._stopping.wait(self.interval):
+            self.log()
+
+    def log(self):
+        counters, histograms = self.metrics.snapshot()
+        previous_counters, previous_histograms = self._previous
+        self._previous = (counters, histograms)
+
+        window = {key: histogram.since(previous_histograms.get(key))
+                  for key, histogram in histograms.items()}
+        print(f"[STATS] {self.metrics.stage_summary(window)}")
+
+        devices = {}
+        for (name, labels), value in counters.items():
+            device = dict(labels).get("device")
+            if device is not None:
+                devices.setdefault(device, {})[(name, labels)] = value
+
+        for device, values in sorted(devices.items()):
+            def delta(name):
+                return sum(value - previous_counters.get(key, 0)
+                           for key, value in values.items() if key[0] == name)
+
+            def current(name):
+                return sum(value for key, value in values.items() if key[0] == name)
+
+            print(f"[STATS] {device}: {delta('frames_total') / self.interval:.1f} кадров/с, "
+                  f"{delta('bytes_total') / self.interval:.0f} Б/с, "
+                  f"очередь {current('queue_depth'):.0f}, "
+                  f"битых полей {current('parser_malformed_total'):.0f}, "
+                  f"оборванных кадров {current('parser_dropped_total'):.0f}, "
+                  f"мусора {current('parser_garbage_total'):.0f}")
+
+    def stop(self):
+        self._stopping.set()
+
+def start_metrics(metrics, port=None, interval=None):
+    """Эндпоинт и/или периодический журнал по настройкам CLI. Возвращает функцию остановки."""
+    server = serve_metrics(metrics, port) if port is not None else None
+    stats_logger = None
+    if interval:
+        stats_logger = StatsLogger(metrics, interval)
+        stats_logger.start()
+
+    def stop():
+        if stats_logger is not None:
+            stats_logger.stop()
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+    return stop
+
+def register_parser(metrics, parser, device):
+    """Счётчики FrameParser как показатели устройства."""
+    for field in ("incomplete", "malformed", "dropped", "garbage"):
+        metrics.register(f"parser_{field}_total", lambda field=field: getattr(parser, field),
+                         kind="counter", device=device)
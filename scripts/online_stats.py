@@ -0,0 +1,232 @@
+import sqlite3
+from frame_parser import normalize_state
+
+# ---------- Настройки ----------
+SENSORS = ("temperature", "humidity", "distance")
+ROWS = "rows"           # псевдодатчик: число строк в группе
+DECRYPTION_ERROR = "<DECRYPTION_ERROR>"  # значение полей строки, которую не удалось расшифровать
+
+# Разрезы агрегатов: вся история, час (YYYY-MM-DD HH), состояние системы
+SCOPE_ALL = "all"
+SCOPE_HOUR = "hour"
+SCOPE_STATE = "state"
+
+def to_float(value):
+    """Число из расшифрованного поля (старые записи хранят строки)."""
+    if value is None or isinstance(value, float):
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+# ---------- Слияние статистик ----------
+def merge_stats(a, b):
+    """
+    Объединение двух наборов (count, sum, min, max, mean, m2) по формуле Чана:
+    дисперсия Уэлфорда складывается без повторного прохода по данным.
+    """
+    if a is None:
+        return b
+    count_a, sum_a, min_a, max_a, mean_a, m2_a = a
+    count_b, sum_b, min_b, max_b, mean_b, m2_b = b
+    count = count_a + count_b
+    if count == 0:
+        return a
+    if count_a == 0:
+        return b
+    if count_b == 0:
+        return a
+    delta = mean_b - mean_a
+    return (
+        count,
+        sum_a + sum_b,
+        min(min_a, min_b),
+        max(max_a, max_b),
+        mean_a + delta * count_b / count,
+        m2_a + m2_b + delta * delta * count_a * count_b / count,
+    )
+
+def group_stats(keys, values):
+    """
+    Статистики пачки по группам за один векторный проход:
+    {ключ: (count, sum, min, max, mean, m2)}; NaN не учитываются.
+    """
+    import numpy as np
+
+    finite = np.isfinite(values)
+    keys, values = keys[finite], values[finite]
+    if len(values) == 0:
+        return {}
+
+    groups, inverse = np.unique(keys, return_inverse=True)
+    count = np.bincount(inverse, minlength=len(groups))
+    total = np.bincount(inverse, values, minlength=len(groups))
+    mean = total / count
+    m2 = np.bincount(inverse, (values - mean[inverse]) ** 2, minlength=len(groups))
+    low = np.full(len(groups), np.inf)
+    high = np.full(len(groups), -np.inf)
+    np.minimum.at(low, inverse, values)
+    np.maximum.at(high, inverse, values)
+
+    return {
+        str(group): (int(count[i]), float(total[i]), float(low[i]), float(high[i]),
+                     float(mean[i]), float(m2[i]))
+        for i, group in enumerate(groups)
+    }
+
+# ---------- Хранилище агрегатов ----------
+class StatsStore:
+    """
+    Накопительные агрегаты расшифрованных данных: count/sum/min/max и дисперсия
+    Уэлфорда по каждому датчику — за всю историю, по часам и по состояниям.
+    Работает как приёмник stream_export: каждая пачка сливается с сохранёнными
+    значениями одной транзакцией вместе с последним учтённым logs.id,
+    поэтому повторная подача тех же строк ничего не удваивает.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS aggregates (
+                scope TEXT,
+                bucket TEXT,
+                sensor TEXT,
+                count INTEGER,
+                sum REAL,
+                min REAL,
+                max REAL,
+                mean REAL,
+                m2 REAL,
+                PRIMARY KEY (scope, bucket, sensor)
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS aggregates_state (
+                key TEXT PRIMARY KEY,
+                value
+            )
+        """)
+        self.conn.commit()
+
+    def _meta(self, key, default=None):
+        row = self.conn.execute(
+            "SELECT value FROM aggregates_state WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row else default
+
+    @property
+    def last_id(self):
+        return self._meta("last_id", 0)
+
+    def write(self, batch):
+        """Сливает пачку записей (словари DataViewer) с накопленными агрегатами."""
+        # NumPy нужен только при обновлении: чтение сводки для отчёта обходится без него
+        import numpy as np
+
+        last_id = self.last_id
+        batch = [entry for entry in batch if entry["id"] > last_id]
+        if not batch:
+            return
+        # Нерасшифрованные строки в агрегаты не попадают, только в счётчик пропусков
+        new_last_id = batch[-1]["id"]
+        skipped = self._meta("skipped", 0)
+        decrypted = [entry for entry in batch if DECRYPTION_ERROR not in entry.values()]
+        skipped += len(batch) - len(decrypted)
+        batch = decrypted
+        if not batch:
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO aggregates_state (key, value) VALUES (?, ?)",
+                    [("last_id", new_last_id), ("skipped", skipped)]
+                )
+            return
+
+        timestamps = [entry["timestamp"] for entry in batch]
+        keys = {
+            SCOPE_ALL: np.full(len(batch), ""),
+            SCOPE_HOUR: np.array([ts[:13] for ts in timestamps]),
+            SCOPE_STATE: np.array([str(normalize_state(entry["state"])) for entry in batch]),
+        }
+        values = {
+            sensor: np.array([to_float(entry[sensor]) for entry in batch], dtype=np.float64)
+            for sensor in SENSORS
+        }
+        counted = np.zeros(len(batch))  # значения не важны, считаются только строки
+
+        updates = {}
+        for scope, scope_keys in keys.items():
+            for bucket, stats in group_stats(scope_keys, counted).items():
+                updates[(scope, bucket, ROWS)] = stats
+            for sensor, sensor_values in values.items():
+                for bucket, stats in group_stats(scope_keys, sensor_values).items():
+                    updates[(scope, bucket, sensor)] = stats
+
+        first_ts = self._meta("first_ts")
+        last_ts = self._meta("last_ts")
+        first_ts = min(filter(None, [first_ts, min(timestamps)]))
+        last_ts = max(filter(None, [last_ts, max(timestamps)]))
+
+        with self.conn:
+            for key, stats in updates.items():
+                stored = self.conn.execute(
+                    "SELECT count, sum, min, max, mean, m2 FROM aggregates "
+                    "WHERE scope = ? AND bucket = ? AND sensor = ?", key
+                ).fetchone()
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO aggregates VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    key + merge_stats(stored, stats)
+                )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO aggregates_state (key, value) VALUES (?, ?)",
+                [("last_id", new_last_id), ("first_ts", first_ts), ("last_ts", last_ts),
+                 ("skipped", skipped)]
+            )
+
+    def summary(self):
+        """
+        Сводка для отчёта: {'rows', 'skipped', 'first_ts', 'last_ts',
+        'sensors': {датчик: {...}}, 'states': {состояние: строк}, 'daily': {дата: строк}}.
+        """
+        sensors, states, daily = {}, {}, {}
+        rows = 0
+        for scope, bucket, sensor, count, total, low, high, mean, m2 in self.conn.execute(
+                "SELECT scope, bucket, sensor, count, sum, min, max, mean, m2 FROM aggregates"):
+            if scope == SCOPE_ALL and sensor == ROWS:
+                rows = count
+            elif scope == SCOPE_ALL:
+                sensors[sensor] = {
+                    "count": count, "mean": mean, "min": low, "max": high,
+                    "std": (m2 / (count - 1)) ** 0.5 if count > 1 else 0.0,
+                }
+            elif scope == SCOPE_STATE and sensor == ROWS:
+                # Корзины старых написаний ('Alarm!!! ') сливаются с нормализованными
+                state = normalize_state(None if bucket == "None" else bucket)
+                if state is not None:
+                    states[state] = states.get(state, 0) + count
+            elif scope == SCOPE_HOUR and sensor == ROWS:
+                day = bucket[:10]
+                daily[day] = daily.get(day, 0) + count
+        return {
+            "rows": rows,
+            "skipped": self._meta("skipped", 0),
+            "first_ts": self._meta("first_ts"),
+            "last_ts": self._meta("last_ts"),
+            "sensors": sensors,
+            "states": dict(sorted(states.items(), key=lambda item: -item[1])),
+            "daily": daily,
+        }
+
+    def close(self):
+        self.conn.close()
+
+def summarize(records):
+    """Сводка как у StatsStore.summary, но по переданным записям (в памяти, без файла)."""
+    store = StatsStore(":memory:")
+    try:
+        store.write(sorted(records, key=lambda entry: entry["id"]))
+        return store.summary()
+    finally:
+        store.close()
@@ -0,0 +1,313 @@
+import os
+import shutil
+import sqlite3
+import argparse
+from datetime import datetime, timedelta
+
+# ---------- Настройки ----------
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+LEGACY_DB_NAME = "data.db"           # исходная база до разбиения на партиции
+CATALOG_NAME = "catalog.db"          # каталог: период → файл партиции
+PARTITIONS_SUBDIR = "partitions"
+ARCHIVE_SUBDIR = "archive"
+
+PARTITION_PERIOD = "month"           # "day" или "month"
+RETENTION_PERIODS = None             # сколько последних периодов держать активными (None — все)
+RETENTION_ACTION = "archive"         # "archive" — перенести в data/archive, "drop" — удалить файл
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# ---------- Схема таблицы logs ----------
+def init_logs_schema(conn):
+    """Создаёт таблицу logs (или догоняет схему старой базы)."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT,
+            temperature REAL,
+            humidity REAL,
+            distance REAL,
+            state TEXT,
+            payload BLOB,
+            state_tag INTEGER,
+            device TEXT,
+            key_id INTEGER
+        )
+    """)
+
+    # Миграция старых баз: колонка для записей в формате одного блоба,
+    # ключевой хеш состояния для индексного фильтра, идентификатор устройства
+    # и номер ключа шифрования (NULL — ключ 1 из secret.key)
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(logs)")]
+    if "payload" not in columns:
+        conn.execute("ALTER TABLE logs ADD COLUMN payload BLOB")
+    if "state_tag" not in columns:
+        conn.execute("ALTER TABLE logs ADD COLUMN state_tag INTEGER")
+    if "device" not in columns:
+        conn.execute("ALTER TABLE logs ADD COLUMN device TEXT")
+    if "key_id" not in columns:
+        conn.execute("ALTER TABLE logs ADD COLUMN key_id INTEGER")
+
+    # Индексы для выборок по времени и по состоянию за период
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_timestamp ON logs (timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_state_tag ON logs (state_tag, timestamp)")
+
+    conn.commit()
+
+# ---------- Границы периодов ----------
+def period_bounds(moment: datetime, period=PARTITION_PERIOD):
+    """Начало и конец (не включительно) периода, в который попадает moment."""
+    if period == "day":
+        start = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+        end = datetime.fromordinal(start.toordinal() + 1)
+    elif period == "month":
+        start = moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        if start.month == 12:
+            end = start.replace(year=start.year + 1, month=1)
+        else:
+            end = start.replace(month=start.month + 1)
+    else:
+        raise ValueError(f"Неизвестный период партиционирования: {period}")
+    return start, end
+
+def partition_name(start: datetime, period=PARTITION_PERIOD):
+    return start.strftime("logs_%Y_%m_%d" if period == "day" else "logs_%Y_%m")
+
+# ---------- Каталог партиций ----------
+class PartitionCatalog:
+    """
+    Каталог партиций таблицы logs: по одному SQLite-файлу на день или месяц.
+    Запросы по диапазону времени открывают только пересекающиеся партиции,
+    а старые партиции архивируются или удаляются целым файлом без VACUUM.
+    Идентификаторы записей сквозные для всех партиций.
+    """
+
+    def __init__(self, data_dir=DATA_DIR, period=PARTITION_PERIOD):
+        self.data_dir = data_dir
+        self.period = period
+        os.makedirs(os.path.join(data_dir, PARTITIONS_SUBDIR), exist_ok=True)
+
+        self.conn = sqlite3.connect(os.path.join(data_dir, CATALOG_NAME), check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS partitions (
+                name TEXT PRIMARY KEY,
+                path TEXT,
+                period_start TEXT,
+                period_end TEXT,
+                status TEXT DEFAULT 'active'
+            )
+        """)
+        self.conn.commit()
+
+        self._current = None  # (period_start, period_end, path) последней использованной партиции
+        self.register_legacy()
+
+    def _abs(self, rel_path):
+        return os.path.join(self.data_dir, rel_path)
+
+    def register_legacy(self):
+        """Регистрирует исходную data.db как первую партицию с её фактическим диапазоном."""
+        legacy_path = self._abs(LEGACY_DB_NAME)
+        if not os.path.exists(legacy_path):
+            return
+        if self.conn.execute("SELECT 1 FROM partitions WHERE name = 'legacy'").fetchone():
+            return
+
+        conn = sqlite3.connect(legacy_path)
+        init_logs_schema(conn)
+        first_ts, last_ts = conn.execute("SELECT MIN(timestamp), MAX(timestamp) FROM logs").fetchone()
+        conn.close()
+        if first_ts is None:
+            return
+
+        last_end = datetime.strptime(last_ts, TIME_FORMAT) + timedelta(seconds=1)
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO partitions (name, path, period_start, period_end) VALUES (?, ?, ?, ?)",
+                ("legacy", LEGACY_DB_NAME, first_ts, last_end.strftime(TIME_FORMAT))
+            )
+
+    def path_for(self, timestamp: str):
+        """Путь к партиции для метки времени (партиция создаётся при необходимости)."""
+        current = self._current
+        if current and current[0] <= timestamp < current[1]:
+            return current[2]
+
+        start, end = period_bounds(datetime.strptime(timestamp, TIME_FORMAT), self.period)
+        name = partition_name(start, self.period)
+        row = self.conn.execute(
+            "SELECT path, status FROM partitions WHERE name = ?", (name,)
+        ).fetchone()
+        if row is None:
+            path = self._create_partition(name, start, end)
+        elif row[1] != "active":
+            raise RuntimeError(f"Партиция {name} уже в статусе {row[1]}, запись невозможна")
+        else:
+            path = self._abs(row[0])
+
+        self._current = (start.strftime(TIME_FORMAT), end.strftime(TIME_FORMAT), path)
+        return path
+
+    @property
+    def current_period(self):
+        """Границы периода партиции, возвращённой последним вызовом path_for."""
+        return self._current[:2] if self._current else None
+
+    def _create_partition(self, name, start, end):
+        rel_path = os.path.join(PARTITIONS_SUBDIR, name + ".db")
+        path = self._abs(rel_path)
+
+        conn = sqlite3.connect(path)
+        init_logs_schema(conn)
+        # Продолжаем сквозную нумерацию id с последней партиции
+        conn.execute("DELETE FROM sqlite_sequence WHERE name = 'logs'")
+        conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('logs', ?)", (self.max_id(),))
+        conn.commit()
+        conn.close()
+
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO partitions (name, path, period_start, period_end) VALUES (?, ?, ?, ?)",
+                (name, rel_path, start.strftime(TIME_FORMAT), end.strftime(TIME_FORMAT))
+            )
+        print(f"[STORAGE] Создана партиция {name}")
+        return path
+
+    def max_id(self):
+        """
+        Наибольший выданный id по всем сохранившимся партициям. Берутся все,
+        а не самая поздняя по period_start: у legacy-партиции period_start —
+        её первая запись, и она может оказаться позже месячной партиции с большими id.
+        Учитывается и счётчик AUTOINCREMENT, чтобы удалённые строки не выдавались снова.
+        """
+        rows = self.conn.execute("SELECT path FROM partitions WHERE status != 'dropped'").fetchall()
+        max_id = 0
+        for (rel_path,) in rows:
+            path = self._abs(rel_path)
+            if not os.path.exists(path):
+                continue
+            conn = sqlite3.connect(path)
+            try:
+                last_id = conn.execute("SELECT IFNULL(MAX(id), 0) FROM logs").fetchone()[0]
+                try:
+                    seq = conn.execute(
+                        "SELECT IFNULL(MAX(seq), 0) FROM sqlite_sequence WHERE name = 'logs'"
+                    ).fetchone()[0]
+                except sqlite3.OperationalError:  # таблица без AUTOINCREMENT
+                    seq = 0
+            finally:
+                conn.close()
+            max_id = max(max_id, last_id, seq)
+        return max_id
+
+    def partitions(self, start=None, end=None):
+        """
+        Пути активных партиций, пересекающихся с [start, end), в порядке времени.
+        start/end — строки в формате TIME_FORMAT или None (без ограничения).
+        """
+        query = "SELECT path FROM partitions WHERE status = 'active'"
+        params = []
+        if start is not None:
+            query += " AND period_end > ?"
+            params.append(start)
+        if end is not None:
+            query += " AND period_start < ?"
+            params.append(end)
+        query += " ORDER BY period_start"
+        return [self._abs(row[0]) for row in self.conn.execute(query, params)]
+
+    def apply_retention(self, keep=RETENTION_PERIODS, action=RETENTION_ACTION):
+        """
+        Оставляет активными keep последних партиций, остальные архивирует
+        (переносит файл в data/archive) или удаляет. Возвращает имена затронутых партиций.
+        """
+        if keep is None:
+            return []
+        keep = max(int(keep), 1)  # текущую партицию не трогаем никогда
+
+        rows = self.conn.execute(
+            "SELECT name, path FROM partitions WHERE status = 'active' ORDER BY period_start DESC"
+        ).fetchall()
+
+        affected = []
+        for name, rel_path in rows[keep:]:
+            path = self._abs(rel_path)
+            if action == "archive":
+                rel_archive = os.path.join(ARCHIVE_SUBDIR, os.path.basename(rel_path))
+                os.makedirs(self._abs(ARCHIVE_SUBDIR), exist_ok=True)
+                if os.path.exists(path):
+                    shutil.move(path, self._abs(rel_archive))
+                with self.conn:
+                    self.conn.execute(
+                        "UPDATE partitions SET status = 'archived', path = ? WHERE name = ?",
+                        (rel_archive, name)
+                    )
+            elif action == "drop":
+                if os.path.exists(path):
+                    os.remove(path)
+                with self.conn:
+                    self.conn.execute(
+                        "UPDATE partitions SET status = 'dropped' WHERE name = ?", (name,)
+                    )
+            else:
+                raise ValueError(f"Неизвестное действие хранения: {action}")
+
+            # WAL/SHM-файлы закрытой партиции больше не нужны
+            for suffix in ("-wal", "-shm"):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+            affected.append(name)
+            print(f"[STORAGE] Партиция {name}: {action}")
+
+        return affected
+
+    def upgrade_schema(self):
+        """Догоняет схему (колонки, индексы) активных партиций, созданных старыми версиями."""
+        for path in self.partitions():
+            conn = sqlite3.connect(path)
+            try:
+                init_logs_schema(conn)
+            finally:
+                conn.close()
+
+    def compact(self):
+        """VACUUM закрытых партиций по отдельности (текущая партиция не трогается)."""
+        rows = self.conn.execute(
+            "SELECT name, path FROM partitions WHERE status = 'active' ORDER BY period_start DESC"
+        ).fetchall()
+        for name, rel_path in rows[1:]:
+            conn = sqlite3.connect(self._abs(rel_path))
+            conn.execute("VACUUM")
+            conn.close()
+            print(f"[STORAGE] Партиция {name} сжата")
+
+    def describe(self):
+        return self.conn.execute(
+            "SELECT name, period_start, period_end, status, path FROM partitions ORDER BY period_start"
+        ).fetchall()
+
+    def close(self):
+        self.conn.close()
+
+
+# ---------- main ----------
+def main():
+    parser = argparse.ArgumentParser(description="Обслуживание партиций таблицы logs")
+    parser.add_argument("--keep", type=int, help="сколько последних периодов оставить активными")
+    parser.add_argument("--action", choices=["archive", "drop"], default=RETENTION_ACTION)
+    parser.add_argument("--compact", action="store_true", help="VACUUM закрытых партиций")
+    args = parser.parse_args()
+
+    catalog = PartitionCatalog()
+    if args.keep is not None:
+        catalog.apply_retention(args.keep, args.action)
+    if args.compact:
+        catalog.compact()
+
+    for name, start, end, status, path in catalog.describe():
+        print(f"{name:<16} {start} — {end}  [{status}]  {path}")
+    catalog.close()
+
+
+if __name__ == "__main__":
+    main()
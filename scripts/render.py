@@ -0,0 +1,262 @@
+import os
+import json
+import time
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from columnar import CACHE_DIR, NO_STATE
+
+# ---------- Настройки ----------
+RENDER_VERSION = 1   # увеличить при изменении оформления: все графики перерисуются
+MANIFEST_PATH = os.path.join(CACHE_DIR, "render.json")
+
+# Цвета полос состояния на дашборде
+STATE_COLORS = {
+    "off": "rgba(0,255,0,0.25)",      # зелёный
+    "standby": "rgba(255,255,0,0.25)", # жёлтый
+    "alarm!!!": "rgba(255,0,0,0.25)"   # красный
+}
+UNKNOWN_COLOR = "rgba(150,150,150,0.05)"
+
+# ---------- Отпечаток входных данных ----------
+def content_hash(*parts):
+    """
+    Хеш входных данных графика: массивы NumPy — по типу, форме и байтам,
+    словари — по отсортированным ключам, остальное — по repr.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"v{RENDER_VERSION}".encode())
+
+    def feed(value):
+        if isinstance(value, np.ndarray):
+            digest.update(f"{value.dtype.str}{value.shape}".encode())
+            if value.dtype == object:
+                digest.update(repr(value.tolist()).encode())
+            else:
+                digest.update(np.ascontiguousarray(value).view(np.uint8).data)
+        elif isinstance(value, dict):
+            digest.update(b"{")
+            for key in sorted(value, key=str):
+                feed(key)
+                feed(value[key])
+            digest.update(b"}")
+        elif isinstance(value, (list, tuple)):
+            digest.update(b"[")
+            for item in value:
+                feed(item)
+            digest.update(b"]")
+        else:
+            digest.update(repr(value).encode())
+
+    for part in parts:
+        feed(part)
+    return digest.hexdigest()
+
+# ---------- Графики ----------
+# Функции выполняются в отдельных процессах: принимают только массивы и словари,
+# тяжёлые библиотеки импортируются внутри, только если график действительно нужен
+
+def render_static(path, series, state_counts, dpi=300):
+    """Общий PNG 2x2: три сенсора и круговая диаграмма состояний."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    plt.style.use("seaborn-v0_8")
+    fig, axes = plt.subplots(2, 2, figsize=(14, 10))
+
+    axes[0, 0].plot(*series["temperature"], "r-")
+    axes[0, 0].set_title("Температура по времени")
+    axes[0, 0].set_ylabel("Температура (°C)")
+
+    axes[0, 1].plot(*series["humidity"], "b-")
+    axes[0, 1].set_title("Влажность по времени")
+    axes[0, 1].set_ylabel("Влажность (%)")
+
+    axes[1, 0].plot(*series["distance"], "g-")
+    axes[1, 0].set_title("Расстояние по времени")
+    axes[1, 0].set_ylabel("Расстояние (см)")
+
+    axes[1, 1].pie(
+        list(state_counts.values()),
+        labels=list(state_counts.keys()),
+        autopct="%1.1f%%",
+        startangle=90,
+    )
+    axes[1, 1].set_title("Распределение состояний системы")
+
+    plt.tight_layout()
+    plt.savefig(path, dpi=dpi)
+    plt.close(fig)
+    print(f"[OK] Сохранён общий PNG-график в {path}")
+
+def render_dashboard(path, series, starts, ends, codes, states):
+    """Интерактивный HTML: три оси сенсоров и полосы состояния системы."""
+    import plotly.graph_objects as go
+
+    fig = go.Figure()
+
+    # --- Интервалы состояния: одна залитая трасса на состояние,
+    # прямоугольники разделены None. Полосы лежат на основной оси y,
+    # а оси сенсоров её перекрывают, поэтому линии рисуются поверх полос ---
+    for code in np.unique(codes):
+        mask = codes == code
+        count = int(mask.sum())
+        name = states[code] if code != NO_STATE else "none"
+        color = STATE_COLORS.get(name.strip().lower(), UNKNOWN_COLOR)
+
+        x = np.empty(count * 5, dtype=object)
+        x[0::5] = x[1::5] = np.datetime_as_string(starts[mask].astype("datetime64[s]"))
+        x[2::5] = x[3::5] = np.datetime_as_string(ends[mask].astype("datetime64[s]"))
+        x[4::5] = None
+        y = np.tile(np.array([0, 1, 1, 0, None], dtype=object), count)
+
+        fig.add_trace(go.Scatter(
+            x=x, y=y,
+            mode="lines", fill="toself",
+            fillcolor=color, line=dict(width=0),
+            name=name.capitalize(),
+            hoverinfo="skip",
+            yaxis="y"
+        ))
+
+    # --- Основные графики ---
+    x, y = series["temperature"]
+    fig.add_trace(go.Scatter(
+        x=x, y=y,
+        mode="lines", name="Температура (°C)",
+        line=dict(color="red", width=2), legendrank=1,
+        yaxis="y2"
+    ))
+
+    x, y = series["humidity"]
+    fig.add_trace(go.Scatter(
+        x=x, y=y,
+        mode="lines", name="Влажность (%)",
+        line=dict(color="blue", width=2, dash="dot"), legendrank=2,
+        yaxis="y3"
+    ))
+
+    x, y = series["distance"]
+    fig.add_trace(go.Scatter(
+        x=x, y=y,
+        mode="lines", name="Расстояние (см)",
+        line=dict(color="green", width=2, dash="dash"), legendrank=3,
+        yaxis="y4"
+    ))
+
+    # --- Настройки осей и легенды ---
+    fig.update_layout(
+        title="📊 Температура, Влажность и Расстояние с подсветкой состояния системы",
+        xaxis=dict(title="Время"),
+        yaxis=dict(
+            range=[0, 1],
+            visible=False,
+            fixedrange=True,
+        ),
+        yaxis2=dict(
+            title=dict(text="Температура (°C)", font=dict(color="red")),
+            tickfont=dict(color="red"),
+            overlaying="y",
+            side="left",
+        ),
+        yaxis3=dict(
+            title=dict(text="Влажность (%)", font=dict(color="blue")),
+            tickfont=dict(color="blue"),
+            overlaying="y",
+            side="right",
+        ),
+        yaxis4=dict(
+            title=dict(text="Расстояние (см)", font=dict(color="green")),
+            tickfont=dict(color="green"),
+            overlaying="y",
+            side="right",
+            anchor="free",
+            position=0.98,
+        ),
+        template="plotly_white",
+        height=700,
+        legend=dict(x=0.5, y=-0.25, orientation="h", yanchor="bottom", xanchor="center"),
+        margin=dict(t=80, b=120)
+    )
+
+    fig.write_html(path)
+    size_kb = os.path.getsize(path) / 1024
+    print(f"[OK] Интерактивный дашборд сохранён: {path} ({size_kb:.0f} КБ)")
+
+# ---------- Планировщик ----------
+def _timed(func, path, inputs):
+    started = time.perf_counter()
+    func(path, **inputs)
+    return time.perf_counter() - started
+
+class RenderScheduler:
+    """
+    Отрисовка независимых графиков. График пропускается, если хеш его входных
+    данных и параметров совпадает с записанным при прошлой отрисовке и файл на месте.
+    Устаревшие графики рисуются параллельно в пуле процессов (по одному на ядро).
+    """
+
+    def __init__(self, manifest_path=MANIFEST_PATH, workers=None, force=False):
+        self.manifest_path = manifest_path
+        self.workers = workers or os.cpu_count() or 1
+        self.force = force
+        self.tasks = []
+
+    def add(self, name, func, path, **inputs):
+        self.tasks.append((name, func, path, inputs))
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self, manifest):
+        os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.manifest_path)
+
+    def run(self):
+        """Рисует устаревшие графики. Возвращает {имя: секунд отрисовки или None — пропущен}."""
+        manifest = self._load_manifest()
+        results = {}
+        stale = []
+        for name, func, path, inputs in self.tasks:
+            digest = content_hash(func.__module__, func.__name__, inputs)
+            key = os.path.abspath(path)
+            if not self.force and manifest.get(key) == digest and os.path.exists(path):
+                print(f"[RENDER] {name}: без изменений, пропущен")
+                results[name] = None
+            else:
+                os.makedirs(os.path.dirname(key), exist_ok=True)
+                stale.append((name, func, path, inputs, key, digest))
+
+        workers = min(self.workers, len(stale))
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [(task, pool.submit(_timed, task[1], task[2], task[3])) for task in stale]
+                done = [(task, future.exception() or future.result()) for task, future in futures]
+        else:
+            done = []
+            for task in stale:
+                try:
+                    done.append((task, _timed(task[1], task[2], task[3])))
+                except Exception as e:
+                    done.append((task, e))
+
+        for (name, _, _, _, key, digest), outcome in done:
+            if isinstance(outcome, Exception):
+                print(f"[RENDER] {name}: ошибка отрисовки: {outcome}")
+                manifest.pop(key, None)
+                continue
+            print(f"[RENDER] {name}: {outcome:.2f} с")
+            manifest[key] = digest
+            results[name] = outcome
+
+        if stale:
+            self._save_manifest(manifest)
+        return results
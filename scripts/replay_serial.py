@@ -0,0 +1,104 @@
+import os
+import re
+import time
+import argparse
+from frame_parser import synthetic_stream
+
+# Кадр заканчивается строкой System state (см. src/main.cpp, updateSerial)
+FRAME_END_RE = re.compile(rb"System state:[^\n]*\n")
+
+# ---------- Виртуальный порт ----------
+def open_pty():
+    """
+    Пара псевдотерминалов: в master пишет проигрыватель, к slave подключается
+    логгер как к обычному Serial-порту. Возвращает (master_fd, slave_fd, имя slave).
+    """
+    try:
+        import pty
+        import tty
+    except ImportError:
+        raise RuntimeError("Псевдотерминалы доступны только в Linux/macOS "
+                           "(в Windows используйте пару портов com0com)")
+    master, slave = pty.openpty()
+    tty.setraw(slave)  # без эха и преобразования \r\n
+    return master, slave, os.ttyname(slave)
+
+# ---------- Источник кадров ----------
+def split_frames(capture: bytes):
+    """Делит записанный поток на кадры; хвост без System state отбрасывается."""
+    frames = []
+    start = 0
+    for match in FRAME_END_RE.finditer(capture):
+        frames.append(capture[start:match.end()])
+        start = match.end()
+    return frames
+
+def load_frames(capture_path=None, frames=10000, seed=0):
+    if capture_path:
+        with open(capture_path, "rb") as f:
+            return split_frames(f.read())
+    return list(synthetic_stream(frames, seed))
+
+# ---------- Проигрывание ----------
+def replay(fd, frames, rate=None, repeat=1, on_send=None):
+    """
+    Пишет кадры в fd с частотой rate кадров/с (None — без ограничения).
+    Расписание абсолютное, поэтому задержки записи не накапливаются.
+    on_send(index, perf_counter) вызывается после записи каждого кадра.
+    Возвращает число отправленных кадров.
+    """
+    sent = 0
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for frame in frames:
+            if rate:
+                delay = started + sent / rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            view = memoryview(frame)
+            while view:
+                view = view[os.write(fd, view):]
+            if on_send is not None:
+                on_send(sent, time.perf_counter())
+            sent += 1
+    return sent
+
+# ---------- main ----------
+def main():
+    parser = argparse.ArgumentParser(description="Проигрывание потока Arduino через псевдотерминал")
+    parser.add_argument("--capture", help="файл с записанным потоком (сырые байты)")
+    parser.add_argument("--frames", type=int, default=10000, help="кадров в синтетическом потоке")
+    parser.add_argument("--rate", type=float, default=0.5,
+                        help="кадров в секунду (0 — без ограничения; прошивка даёт 0.5: INTERVAL_SENSOR = 2000 мс)")
+    parser.add_argument("--repeat", type=int, default=1, help="сколько раз проиграть поток")
+    parser.add_argument("--wait", type=float, default=None,
+                        help="пауза перед началом (сек); по умолчанию — ждать Enter")
+    args = parser.parse_args()
+
+    frames = load_frames(args.capture, args.frames)
+    master, slave, name = open_pty()
+    print(f"[REPLAY] Порт: {name}  ({len(frames)} кадров, "
+          f"{'без ограничения' if not args.rate else f'{args.rate:g} кадров/с'})")
+    print(f"[REPLAY] Например: python logger_serial.py --port {name}")
+
+    try:
+        if args.wait is None:
+            input("[REPLAY] Enter — начать проигрывание...")
+        else:
+            time.sleep(args.wait)
+
+        started = time.perf_counter()
+        sent = replay(master, frames, args.rate or None, args.repeat)
+        elapsed = time.perf_counter() - started
+        print(f"[REPLAY] Отправлено {sent} кадров за {elapsed:.2f} с")
+        # Даём логгеру дочитать буфер перед закрытием порта
+        time.sleep(1.0)
+    except KeyboardInterrupt:
+        print("[REPLAY] Остановлено")
+    finally:
+        os.close(master)
+        os.close(slave)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+import os
+import sqlite3
+import numpy as np
+from frame_parser import normalize_state
+from columnar import (
+    SensorColumns, SENSORS, MISSING, NO_STATE, MAX_GAP, FETCH_SIZE,
+    numeric_sql, state_list, gap_breaks, gapped
+)
+
+# ---------- Настройки ----------
+TIERS = (("minute", 60), ("hour", 3600), ("day", 86400))  # уровни от детального к грубому
+
+def group_index(keys):
+    """
+    (уникальные ключи, номер группы каждого элемента). Строки идут по времени,
+    поэтому для упорядоченных ключей группы находятся без сортировки.
+    """
+    if len(keys) and np.all(keys[1:] >= keys[:-1]):
+        first = np.concatenate(([True], keys[1:] != keys[:-1]))
+        return keys[first], np.cumsum(first) - 1
+    return np.unique(keys, return_inverse=True)
+
+class RollupColumns(SensorColumns):
+    """
+    Колонки уровня агрегации: timestamp — начало интервала, сенсоры — среднее,
+    state — состояние, занимавшее большую часть интервала.
+    Дополнительно: минимум/максимум сенсоров и суммарное время в каждом состоянии.
+    """
+
+    def __init__(self, width, low, high, state_time, **columns):
+        super().__init__(**columns)
+        self.width = width
+        self.low = low
+        self.high = high
+        self.state_time = state_time
+
+    def with_gaps(self, max_gap=None):
+        """
+        Как SensorColumns.with_gaps, но разрыв — пропущенный интервал
+        (интервалы без строк не хранятся); min/max получают те же строки-разрывы.
+        """
+        max_gap = self.width if max_gap is None else max_gap
+        base = super().with_gaps(max_gap)
+        if base is self:
+            return self
+        breaks = gap_breaks(self.timestamp, max_gap)
+        return RollupColumns(
+            self.width,
+            {sensor: gapped(self.timestamp, self.low[sensor], breaks, max_gap) for sensor in SENSORS},
+            {sensor: gapped(self.timestamp, self.high[sensor], breaks, max_gap) for sensor in SENSORS},
+            self.state_time,
+            timestamp=base.timestamp, state=base.state, states=base.states,
+            **{sensor: getattr(base, sensor) for sensor in SENSORS},
+        )
+
+    def envelope(self, sensor):
+        """Ряд min/max по интервалам (как прореживание minmax): пики не теряются."""
+        x = np.empty(len(self) * 2, dtype=np.int64)
+        x[0::2] = self.timestamp
+        x[1::2] = self.timestamp + self.width // 2
+        y = np.empty(len(self) * 2, dtype=np.float32)
+        y[0::2] = self.low[sensor]
+        y[1::2] = self.high[sensor]
+        return x.astype("datetime64[s]"), y
+
+# ---------- Хранилище агрегатов ----------
+class RollupStore:
+    """
+    Таблицы агрегатов по минутам, часам и дням в расшифрованном хранилище:
+    min/max/сумма/число значений каждого сенсора и время в каждом состоянии.
+    Строятся инкрементально: обрабатываются только строки sensor_data
+    с id больше сохранённого, значения сливаются с уже накопленными (UPSERT).
+    Время состояния отсчитывается до следующей записи; разрыв длиннее MAX_GAP
+    считается простоем и не начисляется. Время относится к интервалу начала отсчёта.
+    """
+
+    def __init__(self, db_path, table="sensor_data", readonly=False):
+        self.db_path = db_path
+        self.table = table
+        if readonly:
+            # Только чтение готовых агрегатов: файл (например, старый экспорт) не меняется
+            self.conn = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+            return
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS rollup_state (
+                key TEXT PRIMARY KEY,
+                value
+            )
+        """)
+        for name, _ in TIERS:
+            sensor_columns = ", ".join(
+                f"{sensor}_count INTEGER, {sensor}_sum REAL, {sensor}_min REAL, {sensor}_max REAL"
+                for sensor in SENSORS
+            )
+            self.conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS rollup_{name} (
+                    bucket INTEGER PRIMARY KEY,
+                    count INTEGER,
+                    {sensor_columns}
+                )
+            """)
+            self.conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS rollup_{name}_state (
+                    bucket INTEGER,
+                    state TEXT,
+                    seconds REAL,
+                    PRIMARY KEY (bucket, state)
+                )
+            """)
+        self.conn.commit()
+
+    def _meta(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM rollup_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def is_current(self):
+        """Агрегаты построены и учитывают все строки таблицы (проверка без update)."""
+        try:
+            last_id = self._meta("last_id", 0)
+            max_id = self.conn.execute(f"SELECT IFNULL(MAX(id), 0) FROM {self.table}").fetchone()[0]
+        except sqlite3.OperationalError:  # таблиц агрегатов нет
+            return False
+        return 0 < max_id <= last_id
+
+    # --- Построение ---
+    def update(self):
+        """Досчитывает агрегаты по новым строкам. Возвращает число обработанных строк."""
+        last_id = self._meta("last_id", 0)
+        pending = (self._meta("last_ts"), normalize_state(self._meta("last_state")) or "")
+        cur = self.conn.execute(f"""
+            SELECT id, CAST(strftime('%s', timestamp) AS INTEGER),
+                   {numeric_sql('temperature')}, {numeric_sql('humidity')},
+                   {numeric_sql('distance')}, state
+            FROM {self.table}
+            WHERE id > ? AND strftime('%s', timestamp) IS NOT NULL
+            ORDER BY id
+        """, (last_id,))
+
+        folded = 0
+        while True:
+            rows = cur.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            ids, timestamps, temperature, humidity, distance, states = zip(*rows)
+            values = {}
+            for sensor, column in zip(SENSORS, (temperature, humidity, distance)):
+                array = np.array(column, dtype=np.float64)
+                array[array == float(MISSING)] = np.nan
+                values[sensor] = array
+            timestamps = np.array(timestamps, dtype=np.int64)
+            states = np.array([normalize_state(state) or "" for state in states])
+
+            with self.conn:
+                self._fold(timestamps, values, states, pending)
+                pending = (int(timestamps[-1]), str(states[-1]))
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO rollup_state (key, value) VALUES (?, ?)",
+                    [("last_id", ids[-1]), ("last_ts", pending[0]), ("last_state", pending[1])]
+                )
+            folded += len(rows)
+        return folded
+
+    def _fold(self, timestamps, values, states, pending):
+        # Отсчёт i длится до отсчёта i+1; последний отсчёт прошлой порции — до первого нового
+        last_ts, last_state = pending
+        if last_ts is not None:
+            starts = np.concatenate(([last_ts], timestamps[:-1]))
+            held = np.concatenate(([last_state], states[:-1]))
+        else:
+            starts, held = timestamps[:-1], states[:-1]
+        durations = timestamps[len(timestamps) - len(starts):] - starts
+        durations = np.where((durations > 0) & (durations <= MAX_GAP), durations, 0)
+        # Состояния кодируются один раз на порцию: дальше группировка по целым числам
+        keep = (durations > 0) & (held != "")
+        state_names, state_codes = np.unique(held[keep], return_inverse=True)
+
+        for name, width in TIERS:
+            buckets = timestamps - timestamps % width
+            groups, inverse = group_index(buckets)
+            size = len(groups)
+            rows = [groups.tolist(), np.bincount(inverse, minlength=size).tolist()]
+            for sensor in SENSORS:
+                array = values[sensor]
+                finite = np.isfinite(array)
+                count = np.bincount(inverse[finite], minlength=size)
+                total = np.bincount(inverse[finite], array[finite], minlength=size)
+                low = np.full(size, np.inf)
+                high = np.full(size, -np.inf)
+                np.minimum.at(low, inverse[finite], array[finite])
+                np.maximum.at(high, inverse[finite], array[finite])
+                empty = count == 0
+                rows += [count.tolist(), total.tolist(),
+                         np.where(empty, np.nan, low).tolist(), np.where(empty, np.nan, high).tolist()]
+            self._upsert(name, zip(*rows))
+
+            # Время в состоянии по парам (интервал, состояние)
+            if keep.any():
+                state_buckets = starts[keep] - starts[keep] % width
+                pairs = state_buckets * len(state_names) + state_codes
+                unique, pair_inverse = np.unique(pairs, return_inverse=True)
+                seconds = np.bincount(pair_inverse, durations[keep].astype(np.float64))
+                self.conn.executemany(f"""
+                    INSERT INTO rollup_{name}_state (bucket, state, seconds) VALUES (?, ?, ?)
+                    ON CONFLICT (bucket, state) DO UPDATE SET seconds = seconds + excluded.seconds
+                """, [(pair // len(state_names), str(state_names[pair % len(state_names)]), total)
+                      for pair, total in zip(unique.tolist(), seconds.tolist())])
+
+    def _upsert(self, name, rows):
+        columns = ["bucket", "count"] + [
+            f"{sensor}_{field}" for sensor in SENSORS for field in ("count", "sum", "min", "max")
+        ]
+        updates = ["count = count + excluded.count"]
+        for sensor in SENSORS:
+            updates += [
+                f"{sensor}_count = {sensor}_count + excluded.{sensor}_count",
+                f"{sensor}_sum = {sensor}_sum + excluded.{sensor}_sum",
+                # min/max в SQLite возвращают NULL, если один из аргументов NULL
+                f"{sensor}_min = min(IFNULL({sensor}_min, excluded.{sensor}_min), "
+                f"IFNULL(excluded.{sensor}_min, {sensor}_min))",
+                f"{sensor}_max = max(IFNULL({sensor}_max, excluded.{sensor}_max), "
+                f"IFNULL(excluded.{sensor}_max, {sensor}_max))",
+            ]
+        self.conn.executemany(f"""
+            INSERT INTO rollup_{name} ({", ".join(columns)})
+            VALUES ({", ".join("?" for _ in columns)})
+            ON CONFLICT (bucket) DO UPDATE SET {", ".join(updates)}
+        """, [tuple(None if value != value else value for value in row) for row in rows])
+
+    # --- Чтение ---
+    @staticmethod
+    def _span(start, end):
+        """Условие WHERE и параметры для периода [start, end)."""
+        where, params = "", []
+        if start is not None:
+            where += " AND bucket >= ?"
+            params.append(start)
+        if end is not None:
+            where += " AND bucket < ?"
+            params.append(end)
+        return where, params
+
+    def span_counts(self, name, start=None, end=None):
+        """(исходных строк, интервалов уровня name) в периоде [start, end)."""
+        where, params = self._span(start, end)
+        rows, buckets = self.conn.execute(
+            f"SELECT IFNULL(SUM(count), 0), COUNT(*) FROM rollup_{name} WHERE 1{where}", params
+        ).fetchone()
+        return rows, buckets
+
+    def choose_tier(self, start=None, end=None, max_points=None):
+        """
+        Самый детальный источник, укладывающийся в max_points точек:
+        None (исходные строки), затем минуты, часы, дни.
+        Месяц данных с шагом 2 с — это ~720 часовых интервалов вместо ~1.3 млн строк.
+        """
+        rows, _ = self.span_counts(TIERS[0][0], start, end)
+        if max_points is None or rows <= max_points:
+            return None
+        for name, _ in TIERS:
+            if self.span_counts(name, start, end)[1] <= max_points:
+                return name
+        return TIERS[-1][0]
+
+    def load(self, name, start=None, end=None):
+        """Колонки уровня name за период [start, end) для построения графиков."""
+        width = dict(TIERS)[name]
+        where, params = self._span(start, end)
+        sensor_columns = ", ".join(
+            f"{sensor}_sum / NULLIF({sensor}_count, 0), {sensor}_min, {sensor}_max"
+            for sensor in SENSORS
+        )
+        rows = self.conn.execute(
+            f"SELECT bucket, {sensor_columns} FROM rollup_{name} WHERE 1{where} ORDER BY bucket",
+            params
+        ).fetchall()
+        data = np.array(rows, dtype=np.float64).reshape(len(rows), 1 + 3 * len(SENSORS))
+        timestamp = data[:, 0].astype(np.int64)
+
+        means, low, high = {}, {}, {}
+        for i, sensor in enumerate(SENSORS):
+            means[sensor] = data[:, 1 + 3 * i].astype(np.float32)
+            low[sensor] = data[:, 2 + 3 * i].astype(np.float32)
+            high[sensor] = data[:, 3 + 3 * i].astype(np.float32)
+
+        # Преобладающее состояние интервала и суммарное время по состояниям
+        state_rows = self.conn.execute(
+            f"SELECT bucket, state, seconds FROM rollup_{name}_state WHERE 1{where} "
+            f"ORDER BY bucket, seconds", params
+        ).fetchall()
+        states = state_list(state for _, state, _ in state_rows)
+        codes = {state: code for code, state in enumerate(states)}
+        dominant = {}
+        state_time = {}
+        for bucket, state, seconds in state_rows:
+            state = normalize_state(state) or ""
+            dominant[bucket] = codes.get(state, NO_STATE)  # по возрастанию seconds: последнее — наибольшее
+            state_time[state] = state_time.get(state, 0.0) + seconds
+        state = np.array([dominant.get(bucket, NO_STATE) for bucket in timestamp.tolist()],
+                         dtype=np.uint8)
+
+        return RollupColumns(
+            width, low, high, state_time,
+            timestamp=timestamp, state=state, states=states, **means
+        )
+
+    def close(self):
+        self.conn.close()
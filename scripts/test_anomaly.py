@@ -0,0 +1,61 @@
+import numpy as np
+from columnar import SensorColumns, KNOWN_STATES, SENSORS
+from anomaly import detect, StreamDetector, ewm_filter, SCORED_SENSORS
+
+def synthetic_columns(n=3000, seed=0):
+    """Ряд с кадром раз в 2 с: скачок температуры, тревога по дистанции и простой логгера."""
+    rng = np.random.default_rng(seed)
+    timestamp = np.arange(n, dtype=np.int64) * 2 + 1790000000
+    timestamp[n // 2:] += 3600
+    temperature = (22 + rng.normal(0, 0.3, n)).astype(np.float32)
+    temperature[1000:1005] += 10
+    humidity = (45 + rng.normal(0, 1.5, n)).astype(np.float32)
+    distance = np.full(n, 150.0, dtype=np.float32)
+    distance[2000:2010] = 30.0
+    standby, alarm = KNOWN_STATES.index("Standby"), KNOWN_STATES.index("Alarm!!!")
+    state = np.full(n, standby, dtype=np.uint8)
+    state[2000:2012] = alarm
+    return SensorColumns(timestamp, temperature, humidity, distance, state, KNOWN_STATES)
+
+def stream(columns):
+    detector = StreamDetector()
+    found = {}
+    for i in range(len(columns)):
+        data = {sensor: float(getattr(columns, sensor)[i]) for sensor in SENSORS}
+        data["state"] = columns.states[columns.state[i]]
+        for kind, episode in detector.update(data, int(columns.timestamp[i])):
+            found.setdefault(kind, []).append(tuple(episode))
+    for kind, episode in detector.flush():
+        found.setdefault(kind, []).append(tuple(episode))
+    return found
+
+def test_ewm_filter_matches_loop():
+    rng = np.random.default_rng(1)
+    b = rng.normal(size=2000)
+    expected, last = np.empty_like(b), 2.0
+    for i, value in enumerate(b):
+        last = 0.97 * last + value
+        expected[i] = last
+    np.testing.assert_allclose(ewm_filter(b, 0.97, 2.0), expected, rtol=1e-9, atol=1e-9)
+
+def test_batch_finds_injected_episodes():
+    columns = synthetic_columns()
+    result = detect(columns)
+    start = columns.timestamp
+    assert [(e["start"], e["peak"]) for e in result["alarm"]] == [(start[2000], 30.0)]
+    assert len(result["reported"]) == 1
+    assert [e["start"] for e in result["temperature"]] == [start[1000]]
+    assert len(result["humidity"]) == 0
+
+def test_stream_matches_batch():
+    """Потоковый детектор на пути приёма находит те же эпизоды, что пакетный проход."""
+    columns = synthetic_columns()
+    batch = detect(columns)
+    found = stream(columns)
+    for kind in ("alarm",) + SCORED_SENSORS:
+        expected = batch[kind]
+        got = np.array(found.get(kind, []), dtype=expected.dtype)
+        assert len(got) == len(expected), kind
+        for field in ("start", "end", "samples"):
+            np.testing.assert_array_equal(got[field], expected[field])
+        np.testing.assert_allclose(got["peak"], expected["peak"], rtol=1e-4)
@@ -0,0 +1,69 @@
+import sqlite3
+import numpy as np
+from columnar import read_columns, load_columns, fill_gaps, NO_STATE, KNOWN_STATES
+
+ROWS = [
+    (1, "2026-10-01 00:00:04", 21.0, 40.0, 100.0, "OFF"),
+    (2, "2026-10-01 00:00:00", 20.0, "<DECRYPTION_ERROR>", 90.0, "Alarm!!! "),
+    (3, "2026-10-01 00:00:02", "20.5", None, 95.0, "Alarm!!!"),
+    (4, "2026-10-01 00:00:06", 22.0, 42.0, 110.0, None),
+    (5, "2026-10-01 00:00:08", 23.0, 43.0, 120.0, "Service"),
+]
+
+def make_db(path):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE sensor_data (id INTEGER PRIMARY KEY, timestamp TEXT, temperature, "
+                 "humidity, distance, state TEXT, device TEXT)")
+    with conn:
+        conn.executemany("INSERT INTO sensor_data VALUES (?, ?, ?, ?, ?, ?, NULL)", ROWS)
+    conn.close()
+
+def test_read_columns_types_and_states(tmp_path):
+    """Колонки типизированы и упорядочены по времени; нечисловое — NaN, состояния — коды."""
+    path = str(tmp_path / "data.db")
+    make_db(path)
+    columns = read_columns(path)
+
+    assert columns.timestamp.dtype == np.int64 and columns.temperature.dtype == np.float32
+    assert np.all(np.diff(columns.timestamp) == 2)
+    np.testing.assert_array_equal(columns.temperature, [20.0, np.nan, 21.0, 22.0, 23.0])
+    np.testing.assert_array_equal(columns.humidity, [np.nan, np.nan, 40.0, 42.0, 43.0])
+    assert columns.states == KNOWN_STATES + ["Service"]
+    alarm, off, service = (columns.states.index(s) for s in ("Alarm!!!", "OFF", "Service"))
+    assert columns.state.tolist() == [alarm, alarm, off, NO_STATE, service]
+
+def test_load_columns_cache_follows_source(tmp_path):
+    """Повторная загрузка идёт из кеша .npy; изменение базы его сбрасывает."""
+    path = str(tmp_path / "data.db")
+    make_db(path)
+    cache_dir = str(tmp_path / "cache")
+    first = load_columns(path, cache_dir=cache_dir)
+    cached = load_columns(path, cache_dir=cache_dir)
+    assert isinstance(cached.timestamp, np.memmap)
+    np.testing.assert_array_equal(cached.distance, first.distance)
+
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("INSERT INTO sensor_data VALUES (6, '2026-10-01 00:00:10', 24, 44, 130, 'OFF', NULL)")
+    conn.close()
+    assert len(load_columns(path, cache_dir=cache_dir)) == 6
+
+def test_gaps_interpolate_short_and_break_long():
+    """Короткий пропуск интерполируется по времени, простой остаётся разрывом."""
+    timestamp = np.array([0, 2, 4, 8, 100, 102])
+    values = np.array([1.0, np.nan, 3.0, np.nan, 7.0, np.nan], dtype=np.float32)
+    filled = fill_gaps(timestamp, values, max_gap=30)
+    np.testing.assert_allclose(filled[:3], [1.0, 2.0, 3.0])
+    assert np.isnan(filled[3]) and np.isnan(filled[5])  # за простоем и на краю ряда
+
+def test_with_gaps_inserts_break_rows(tmp_path):
+    path = str(tmp_path / "data.db")
+    make_db(path)
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("INSERT INTO sensor_data VALUES (6, '2026-10-01 01:00:00', 24, 44, 130, 'OFF', NULL)")
+    conn.close()
+    columns = read_columns(path).with_gaps()
+    assert len(columns) == 7
+    assert np.isnan(columns.temperature[5]) and columns.state[5] == NO_STATE
+    assert np.isnan(columns.humidity[:2]).all()  # начало ряда не выдумывается
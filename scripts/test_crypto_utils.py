@@ -0,0 +1,60 @@
+import os
+import pytest
+from cryptography.fernet import Fernet, InvalidToken
+from crypto_utils import KeyRing, KeyringError, load_keyring, LEGACY_KEY_ID, RECORD_FORMAT_BLOB
+
+@pytest.fixture
+def keyring(tmp_path):
+    return KeyRing({LEGACY_KEY_ID: Fernet.generate_key()}, LEGACY_KEY_ID,
+                   Fernet.generate_key(), str(tmp_path / "keyring.json"))
+
+def test_record_round_trip(keyring):
+    """Запись — один токен с байтом формата; пустые поля возвращаются как None."""
+    data = {"temperature": 23.4, "humidity": None, "distance": -1.5, "state": "Alarm!!!"}
+    blob, key_id = keyring.encrypt_record(data)
+    assert key_id == keyring.active_id
+    assert blob[0] == RECORD_FORMAT_BLOB
+    assert keyring.decrypt_record(blob, key_id) == data
+    assert keyring.decrypt_record(keyring.encrypt_record({})[0], key_id) == dict.fromkeys(data)
+
+def test_record_rejects_tampering_and_old_keys(keyring):
+    blob, key_id = keyring.encrypt_record({"temperature": 1.0, "state": "OFF"})
+    with pytest.raises(InvalidToken):
+        keyring.decrypt_record(blob[:-1] + bytes([blob[-1] ^ 1]), key_id)
+    with pytest.raises(ValueError):
+        keyring.decrypt_record(b"\x01" + blob[1:], key_id)
+    # После ротации старые строки расшифровываются своим ключом
+    keyring.rotate()
+    assert keyring.decrypt_record(blob, key_id)["state"] == "OFF"
+
+def test_state_tag_is_normalized(keyring):
+    """Старое написание с пробелом даёт тот же тег; пустое состояние тега не имеет."""
+    assert keyring.state_tag("Alarm!!! ") == keyring.state_tag("Alarm!!!")
+    assert keyring.state_tag(b"Standby\r") == keyring.state_tag("Standby")
+    assert keyring.state_tag("OFF") != keyring.state_tag("Standby")
+    assert keyring.state_tag("  ") is None
+    assert keyring.state_tag(None) is None
+
+def test_tag_survives_rotation_and_retire(keyring):
+    """Тег считается отдельным ключом: ротация и вывод ключа 1 его не меняют."""
+    tag = keyring.state_tag("Alarm!!!")
+    keyring.rotate()
+    keyring.retire(LEGACY_KEY_ID)
+    assert keyring.state_tag("Alarm!!!") == tag
+    with pytest.raises(KeyringError):
+        keyring.retire(keyring.active_id)
+
+def test_legacy_key_gets_separate_tag_key(tmp_path):
+    """secret.key становится ключом 1, а ключ state_tag создаётся новый."""
+    secrets = tmp_path / "secrets"
+    secrets.mkdir()
+    key = Fernet.generate_key()
+    (secrets / "secret.key").write_bytes(key)
+
+    keyring = load_keyring(str(secrets / "keyring.json"))
+    assert keyring.material()[0] == {LEGACY_KEY_ID: key}
+    assert keyring.tag_key != key
+
+    reloaded = KeyRing.load(str(secrets / "keyring.json"))
+    assert reloaded.tag_key == keyring.tag_key
+    assert os.path.exists(secrets / "secret.key")
@@ -0,0 +1,82 @@
+import sqlite3
+import pytest
+import data_view
+from data_view import DataViewer
+from crypto_utils import load_keyring
+from frame_parser import synthetic_stream, FrameParser
+from partitions import PartitionCatalog
+from online_stats import StatsStore
+
+ROWS = 300
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """Партиция с ROWS зашифрованными строками; ключи и экспорты — во временной папке."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(data_view, "BASE_DIR", str(tmp_path))
+    keyring = load_keyring()
+    records = FrameParser().feed(b"".join(synthetic_stream(ROWS)))
+    catalog = PartitionCatalog(str(tmp_path / "data"))
+    conn = sqlite3.connect(catalog.path_for("2026-10-01 00:00:00"))
+    with conn:
+        conn.executemany(
+            "INSERT INTO logs (timestamp, payload, key_id, state_tag) VALUES (?, ?, ?, ?)",
+            [(f"2026-10-01 00:{i // 60:02d}:{i % 60:02d}", *keyring.encrypt_record(data),
+              keyring.state_tag(data["state"])) for i, data in enumerate(records)]
+        )
+    conn.close()
+    catalog.close()
+    return str(tmp_path / "data")
+
+def test_parallel_path_uses_cache(data_dir, monkeypatch, capsys):
+    """Параллельная расшифровка берёт строки из кеша и возвращает те же записи по порядку."""
+    monkeypatch.setattr(data_view, "PARALLEL_MIN_ROWS", 1)
+    viewer = DataViewer(workers=2, data_dir=data_dir)
+    first = [entry for batch in viewer.iter_batches(batch_size=64) for entry in batch]
+    assert "Параллельная расшифровка" in capsys.readouterr().out
+    viewer.cache.hits = viewer.cache.misses = 0
+
+    # Кеш покрывает всю таблицу, поэтому оценка выбирает последовательный путь:
+    # параллельный вызывается напрямую
+    ranges = viewer._id_ranges()
+    second = [entry for batch in viewer._iter_parallel(ranges, 64) for entry in batch]
+
+    assert [entry["id"] for entry in first] == list(range(1, ROWS + 1))
+    assert second == first
+    assert (viewer.cache.hits, viewer.cache.misses) == (ROWS, 0)
+
+def set_key_id(data_dir, row_id, key_id):
+    catalog = PartitionCatalog(data_dir)
+    for path in catalog.partitions():
+        conn = sqlite3.connect(path)
+        with conn:
+            conn.execute("UPDATE logs SET key_id = ? WHERE id = ?", (key_id, row_id))
+        conn.close()
+    catalog.close()
+
+def test_incremental_export_resumes_at_failed_row(data_dir, tmp_path):
+    """
+    Экспорт останавливается на первой нерасшифрованной строке и после
+    восстановления ключа продолжает с неё: строк не теряется и не дублируется.
+    """
+    set_key_id(data_dir, 150, 99)  # ключа 99 в связке нет
+    viewer = DataViewer(workers=1, data_dir=data_dir)
+    path = viewer.export_incremental()
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT COUNT(*), MAX(id) FROM sensor_data").fetchone() == (149, 149)
+    conn.close()
+
+    set_key_id(data_dir, 150, 1)
+    viewer = DataViewer(workers=1, data_dir=data_dir)
+    viewer.export_incremental()
+    viewer.export_incremental()  # новых строк нет — ничего не меняется
+    conn = sqlite3.connect(path)
+    ids = [row[0] for row in conn.execute("SELECT id FROM sensor_data ORDER BY id")]
+    assert conn.execute("SELECT value FROM export_state WHERE key = 'last_id'").fetchone() == (ROWS,)
+    conn.close()
+    assert ids == list(range(1, ROWS + 1))
+
+    stats = StatsStore(str(tmp_path / "exports" / "aggregates.db"))
+    summary = stats.summary()
+    stats.close()
+    assert (summary["rows"], summary["skipped"]) == (ROWS, 0)
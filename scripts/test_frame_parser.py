@@ -0,0 +1,79 @@
+import random
+from frame_parser import FrameParser, format_frame, synthetic_stream, normalize_state
+
+def feed_all(parser, chunks):
+    records = []
+    for chunk in chunks:
+        records += parser.feed(chunk)
+    return records
+
+def record(temperature, humidity, distance, state):
+    return {"temperature": temperature, "humidity": humidity, "distance": distance, "state": state}
+
+def test_frame_split_across_chunks():
+    """Кадр, разрезанный в любом месте (и побайтно), собирается в одну запись."""
+    frame = format_frame(23.4, 40.0, 120.0, "Alarm!!!")
+    for cut in range(1, len(frame)):
+        parser = FrameParser()
+        assert feed_all(parser, [frame[:cut], frame[cut:]]) == [record(23.4, 40.0, 120.0, "Alarm!!!")]
+    parser = FrameParser()
+    assert feed_all(parser, [bytes([b]) for b in frame]) == [record(23.4, 40.0, 120.0, "Alarm!!!")]
+
+def test_crlf_and_lf_line_endings():
+    """Serial.println даёт \\r\\n; \\r и пробелы не попадают в состояние."""
+    lf = b"Temperature: 21.5 C\nHumidity: 35 %\nDistance: 7.25 sm\nSystem state: Standby\n"
+    crlf = lf.replace(b"\n", b"\r\n")
+    for stream in (lf, crlf):
+        parser = FrameParser()
+        assert parser.feed(stream) == [record(21.5, 35.0, 7.25, "Standby")]
+        assert parser.stats()["garbage"] == 0
+
+def test_garbage_between_frames():
+    """Мусорные строки между кадрами считаются, а кадры вокруг них не теряются."""
+    stream = (b"\x00\xffboot v1.2\r\n"
+              + format_frame(20.0, 40.0, 100.0, "OFF")
+              + b"random noise\r\n\r\n"
+              + format_frame(21.0, 41.0, 101.0, "Standby"))
+    parser = FrameParser()
+    assert feed_all(parser, [stream[i:i + 5] for i in range(0, len(stream), 5)]) == [
+        record(20.0, 40.0, 100.0, "OFF"),
+        record(21.0, 41.0, 101.0, "Standby"),
+    ]
+    assert parser.stats()["garbage"] == 2
+
+def test_truncated_frame_and_bad_value():
+    """Оборванный кадр и нечитаемое поле не сдвигают следующий кадр."""
+    stream = (b"Temperature: 20.0 C\r\nHumidity: 40.0 %\r\n"
+              + format_frame(22.0, 42.0, 102.0, "OFF")
+              + b"Temperature: 23.0 C\r\nHumidity: ?? %\r\nDistance: 1.0 sm\r\nSystem state: Alarm!!! \r\n")
+    parser = FrameParser()
+    assert parser.feed(stream) == [
+        record(22.0, 42.0, 102.0, "OFF"),
+        record(23.0, None, 1.0, "Alarm!!!"),
+    ]
+    stats = parser.stats()
+    assert (stats["dropped"], stats["malformed"], stats["incomplete"]) == (1, 1, 1)
+
+def test_long_line_without_newline_is_dropped():
+    parser = FrameParser()
+    assert parser.feed(b"x" * 1000) == []
+    assert parser.stats()["garbage"] == 1
+    assert parser.feed(format_frame(20.0, 40.0, 100.0, "OFF")) == [record(20.0, 40.0, 100.0, "OFF")]
+
+def test_random_chunking_matches_whole_stream():
+    """Порции случайного размера дают те же записи, что весь поток целиком."""
+    stream = b"".join(synthetic_stream(300, seed=1))
+    expected = FrameParser().feed(stream)
+    assert len(expected) == 300
+
+    rng = random.Random(2)
+    offsets = [0]
+    while offsets[-1] < len(stream):
+        offsets.append(offsets[-1] + rng.randint(1, 200))
+    chunks = [stream[a:b] for a, b in zip(offsets, offsets[1:])]
+    assert feed_all(FrameParser(), chunks) == expected
+
+def test_normalize_state():
+    assert normalize_state(b"Alarm!!! \r") == "Alarm!!!"
+    assert normalize_state(" ") is None
+    assert normalize_state(None) is None
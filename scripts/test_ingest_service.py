@@ -0,0 +1,86 @@
+import os
+import time
+import sqlite3
+import asyncio
+import pytest
+from frame_parser import FrameParser
+from partitions import PartitionCatalog
+from ingest_service import IngestService, DeviceReader
+from replay_serial import open_pty, load_frames, replay
+
+FRAMES = 200
+TIMEOUT = 30.0  # предел ожидания подключения и приёма всех кадров (сек)
+
+pytestmark = pytest.mark.skipif(os.name == "nt", reason="псевдотерминалы только в Linux/macOS")
+
+@pytest.fixture
+def catalog(tmp_path, monkeypatch):
+    # Ключи (secrets/) создаются в рабочей папке — тест не трогает ключи проекта
+    monkeypatch.chdir(tmp_path)
+    catalog = PartitionCatalog(str(tmp_path / "data"))
+    yield catalog
+    catalog.close()
+
+async def wait_for(condition):
+    deadline = time.monotonic() + TIMEOUT
+    while not condition():
+        assert time.monotonic() < deadline, "истёк таймаут ожидания"
+        await asyncio.sleep(0.05)
+
+def stored_rows(catalog):
+    rows = []
+    for path in catalog.partitions():
+        conn = sqlite3.connect(path)
+        rows += conn.execute("SELECT payload, key_id, state_tag, device FROM logs ORDER BY id").fetchall()
+        conn.close()
+    return rows
+
+def test_ingest_from_pty(catalog):
+    """Кадры, проигранные в псевдотерминал, доходят до базы целыми и по порядку."""
+    frames = load_frames(None, FRAMES)
+    master, slave, name = open_pty()
+    service = IngestService(catalog, [name], detect=False, scan_interval=0.1)
+
+    async def scenario():
+        task = asyncio.create_task(service.run())
+        await wait_for(lambda: name in service.readers and service.readers[name].connected)
+        await asyncio.get_running_loop().run_in_executor(None, replay, master, frames, 200)
+        await wait_for(lambda: service.readers[name].records == FRAMES)
+        service.stop()
+        await task
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        os.close(master)
+        os.close(slave)
+
+    expected = FrameParser().feed(b"".join(frames))
+    rows = stored_rows(catalog)
+    assert len(rows) == FRAMES
+    keyring = service.keyring
+    for (payload, key_id, tag, device), data in zip(rows, expected):
+        assert keyring.decrypt_record(payload, key_id) == data
+        assert tag == keyring.state_tag(data["state"])
+        assert device == name
+
+def test_reader_error_is_logged(catalog, monkeypatch, capsys):
+    """Непредвиденная ошибка чтения печатается, порт перезапускается при следующем опросе."""
+    async def broken(self):
+        raise ValueError("сбой разбора")
+
+    monkeypatch.setattr(DeviceReader, "run", broken)
+    service = IngestService(catalog, detect=False)
+
+    async def scenario():
+        service._start("pty-test", "board")
+        await asyncio.sleep(0.1)
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        service.executor.shutdown()
+        service.writer.close()
+
+    assert "ValueError('сбой разбора')" in capsys.readouterr().out
+    assert "pty-test" not in service._tasks
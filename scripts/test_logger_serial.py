@@ -0,0 +1,60 @@
+import sqlite3
+import pytest
+from logger_serial import BatchWriter
+from partitions import PartitionCatalog
+
+@pytest.fixture
+def catalog(tmp_path):
+    catalog = PartitionCatalog(str(tmp_path / "data"))
+    yield catalog
+    catalog.close()
+
+def stored(catalog):
+    rows = []
+    for path in catalog.partitions():
+        conn = sqlite3.connect(path)
+        rows += conn.execute("SELECT id, payload, state_tag, device, key_id FROM logs ORDER BY id").fetchall()
+        conn.close()
+    return rows
+
+def locked(timestamp):
+    raise sqlite3.OperationalError("database is locked")
+
+def test_rows_written_in_one_batch(catalog):
+    """Строки копятся в очереди и пишутся пачкой по flush() в порядке добавления."""
+    with BatchWriter(catalog, batch_size=1000, flush_interval=60) as writer:
+        for i in range(5):
+            writer.add(bytes([i]), tag=i, device="pty", key_id=1)
+        assert stored(catalog) == []
+        writer.flush()
+        assert stored(catalog) == [(i + 1, bytes([i]), i, "pty", 1) for i in range(5)]
+
+def test_write_error_keeps_rows_queued(catalog, monkeypatch, capsys):
+    """Сбой записи не выходит из add(): строки ждут в очереди и пишутся после восстановления."""
+    writer = BatchWriter(catalog, batch_size=1000, flush_interval=60)
+    monkeypatch.setattr(catalog, "path_for", locked)
+    writer.add(b"a")
+    writer.add(b"b")
+    with pytest.raises(sqlite3.OperationalError):
+        writer.flush()
+    writer.add(b"c")  # очередь продолжает принимать строки
+    monkeypatch.undo()
+    writer.flush()
+    writer.close()
+
+    assert [row[1] for row in stored(catalog)] == [b"a", b"b", b"c"]
+    out = capsys.readouterr().out
+    assert "database is locked" in out and "Запись восстановлена" in out
+
+def test_queue_is_bounded(catalog, monkeypatch, capsys):
+    """Пока база недоступна, очередь не растёт дальше max_pending: отбрасываются старейшие."""
+    writer = BatchWriter(catalog, batch_size=1000, flush_interval=60, max_pending=3)
+    monkeypatch.setattr(catalog, "path_for", locked)
+    for i in range(5):
+        writer.add(bytes([i]))
+    assert writer.dropped == 2
+    monkeypatch.undo()
+    writer.close()
+
+    assert [row[1] for row in stored(catalog)] == [b"\x02", b"\x03", b"\x04"]
+    assert "переполнена" in capsys.readouterr().out
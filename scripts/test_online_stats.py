@@ -0,0 +1,53 @@
+import statistics
+import pytest
+from online_stats import StatsStore, summarize, DECRYPTION_ERROR
+
+def entry(id, timestamp, temperature, state="OFF"):
+    return {"id": id, "timestamp": timestamp, "temperature": temperature,
+            "humidity": 40.0, "distance": 100.0, "state": state, "device": None}
+
+RECORDS = [
+    entry(1, "2026-10-01 10:00:00", 20.0),
+    entry(2, "2026-10-01 10:30:00", 22.0, "Alarm!!! "),
+    entry(3, "2026-10-01 11:00:00", 27.0, "Alarm!!!"),
+    entry(4, "2026-10-02 09:00:00", "25.5"),  # старые записи хранят строки
+]
+
+def test_batches_merge_like_one_pass(tmp_path):
+    """Агрегаты по пачкам совпадают с расчётом по всем строкам сразу."""
+    store = StatsStore(str(tmp_path / "aggregates.db"))
+    store.write(RECORDS[:1])
+    store.write(RECORDS[1:])
+    summary = store.summary()
+    store.close()
+
+    temperature = summary["sensors"]["temperature"]
+    values = [20.0, 22.0, 27.0, 25.5]
+    assert summary["rows"] == 4
+    assert temperature["count"] == 4 and temperature["min"] == 20.0 and temperature["max"] == 27.0
+    assert temperature["mean"] == pytest.approx(statistics.mean(values))
+    assert temperature["std"] == pytest.approx(statistics.stdev(values))
+    assert summary["states"] == {"Alarm!!!": 2, "OFF": 2}
+    assert summary["daily"] == {"2026-10-01": 3, "2026-10-02": 1}
+    assert (summary["first_ts"], summary["last_ts"]) == ("2026-10-01 10:00:00", "2026-10-02 09:00:00")
+
+def test_repeated_rows_are_not_counted_twice(tmp_path):
+    """Строки с id не больше сохранённого last_id (повтор после сбоя) пропускаются."""
+    path = str(tmp_path / "aggregates.db")
+    store = StatsStore(path)
+    store.write(RECORDS[:3])
+    store.close()
+    store = StatsStore(path)
+    store.write(RECORDS)
+    assert store.last_id == 4
+    assert store.summary()["rows"] == 4
+    store.close()
+
+def test_undecrypted_rows_are_skipped():
+    """Нерасшифрованные строки не попадают в агрегаты, а считаются отдельно."""
+    failed = {**entry(5, "2026-10-02 10:00:00", None), "temperature": DECRYPTION_ERROR,
+              "humidity": DECRYPTION_ERROR, "distance": DECRYPTION_ERROR, "state": DECRYPTION_ERROR}
+    summary = summarize(RECORDS + [failed])
+    assert summary["rows"] == 4
+    assert summary["skipped"] == 1
+    assert DECRYPTION_ERROR not in summary["states"]
@@ -0,0 +1,74 @@
+import os
+import sqlite3
+import pytest
+from partitions import PartitionCatalog, init_logs_schema, LEGACY_DB_NAME
+
+def insert(catalog, timestamps):
+    """Пишет строки в партиции по меткам времени, как BatchWriter; возвращает их id."""
+    ids = []
+    for timestamp in timestamps:
+        conn = sqlite3.connect(catalog.path_for(timestamp))
+        with conn:
+            cur = conn.execute("INSERT INTO logs (timestamp, payload) VALUES (?, x'00')", (timestamp,))
+        ids.append(cur.lastrowid)
+        conn.close()
+    return ids
+
+@pytest.fixture
+def data_dir(tmp_path):
+    return str(tmp_path / "data")
+
+@pytest.fixture
+def legacy(data_dir):
+    """Исходная data.db: пять строк в середине октября."""
+    os.makedirs(data_dir)
+    conn = sqlite3.connect(os.path.join(data_dir, LEGACY_DB_NAME))
+    init_logs_schema(conn)
+    with conn:
+        conn.executemany("INSERT INTO logs (timestamp, payload) VALUES (?, x'00')",
+                         [(f"2026-10-15 12:00:0{i}",) for i in range(5)])
+    conn.close()
+
+def test_ids_continue_after_legacy_partition(data_dir, legacy):
+    """
+    period_start legacy-партиции (15 октября) позже, чем у месячной logs_2026_10,
+    но следующая партиция всё равно продолжает нумерацию с наибольшего id.
+    """
+    catalog = PartitionCatalog(data_dir)
+    october = insert(catalog, [f"2026-10-20 00:00:0{i}" for i in range(7)])
+    november = insert(catalog, ["2026-11-01 00:00:00", "2026-11-02 00:00:00"])
+    catalog.close()
+
+    assert october == list(range(6, 13))
+    assert november == [13, 14]
+
+def test_ids_not_reused_after_delete(data_dir):
+    """Удалённые строки последней партиции не отдают свои id новой партиции."""
+    catalog = PartitionCatalog(data_dir)
+    insert(catalog, ["2026-10-20 00:00:00", "2026-10-20 00:00:01"])
+    conn = sqlite3.connect(catalog.path_for("2026-10-20 00:00:00"))
+    with conn:
+        conn.execute("DELETE FROM logs WHERE id = 2")
+    conn.close()
+    assert insert(catalog, ["2026-11-01 00:00:00"]) == [3]
+    catalog.close()
+
+def test_range_selects_partitions(data_dir):
+    catalog = PartitionCatalog(data_dir)
+    insert(catalog, ["2026-09-10 00:00:00", "2026-10-10 00:00:00", "2026-11-10 00:00:00"])
+    names = [os.path.basename(path) for path in catalog.partitions("2026-10-05 00:00:00",
+                                                                   "2026-10-06 00:00:00")]
+    catalog.close()
+    assert names == ["logs_2026_10.db"]
+
+def test_archived_partition_rejects_writes(data_dir):
+    """После архивации партиция не читается как активная, а запись в её период — ошибка."""
+    catalog = PartitionCatalog(data_dir)
+    insert(catalog, ["2026-09-10 00:00:00", "2026-10-10 00:00:00"])
+    assert catalog.apply_retention(keep=1, action="archive") == ["logs_2026_09"]
+    assert [os.path.basename(path) for path in catalog.partitions()] == ["logs_2026_10.db"]
+    with pytest.raises(RuntimeError):
+        catalog.path_for("2026-09-11 00:00:00")
+    # Архивные id по-прежнему учитываются при нумерации
+    assert insert(catalog, ["2026-11-01 00:00:00"]) == [3]
+    catalog.close()
@@ -0,0 +1,88 @@
+import os
+import sqlite3
+import numpy as np
+import pytest
+from rollups import RollupStore
+
+START = 1790000040  # 2026-09-21 14:14:00 UTC, начало минуты
+
+def make_store(path, rows):
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sensor_data (
+            id INTEGER PRIMARY KEY, timestamp TEXT, temperature REAL,
+            humidity REAL, distance REAL, state TEXT, device TEXT
+        )
+    """)
+    with conn:
+        conn.executemany("INSERT INTO sensor_data VALUES (?, ?, ?, ?, ?, ?, NULL)", rows)
+    conn.close()
+
+def sample_rows():
+    """Кадры раз в 2 с: 5 минут, простой 10 минут, ещё 2 минуты; состояние меняется."""
+    rows = []
+    seconds = list(range(0, 300, 2)) + list(range(900, 1020, 2))
+    for i, offset in enumerate(seconds):
+        ts = str(np.datetime64(START + offset, "s")).replace("T", " ")
+        state = "Alarm!!! " if 60 <= offset < 120 else "OFF"
+        rows.append((i + 1, ts, 20.0 + i % 7, None if i == 3 else 40.0, float(i), state))
+    return rows
+
+@pytest.fixture
+def store_path(tmp_path):
+    path = str(tmp_path / "decrypted_store.db")
+    make_store(path, sample_rows())
+    return path
+
+def test_minute_rollup_matches_rows(store_path):
+    rollups = RollupStore(store_path)
+    assert rollups.update() == 210
+    data = rollups.load("minute")
+    rollups.close()
+
+    temperature = np.array([row[2] for row in sample_rows()[:30]])  # первая минута
+    assert data.timestamp[0] == START
+    assert data.temperature[0] == pytest.approx(temperature.mean())
+    assert (data.low["temperature"][0], data.high["temperature"][0]) == (temperature.min(), temperature.max())
+    assert len(data) == 7  # 5 минут до простоя и 2 после
+    # Время в состоянии: простой не начисляется, 'Alarm!!! ' сливается с 'Alarm!!!'
+    assert data.state_time == {"OFF": pytest.approx(240 - 2 + 118), "Alarm!!!": 60}
+
+def test_incremental_update_matches_full(store_path, tmp_path):
+    """Досчёт по частям даёт те же агрегаты, что построение за один раз."""
+    rows = sample_rows()
+    part_path = str(tmp_path / "parts.db")
+    make_store(part_path, rows[:100])
+    rollups = RollupStore(part_path)
+    rollups.update()
+    make_store(part_path, rows[100:])
+    rollups.update()
+    parts = rollups.load("minute")
+    rollups.close()
+
+    rollups = RollupStore(store_path)
+    rollups.update()
+    full = rollups.load("minute")
+    rollups.close()
+
+    np.testing.assert_array_equal(parts.timestamp, full.timestamp)
+    for sensor in ("temperature", "humidity", "distance"):
+        np.testing.assert_allclose(getattr(parts, sensor), getattr(full, sensor))
+    assert parts.state_time == pytest.approx(full.state_time)
+
+def test_choose_tier_and_readonly(store_path):
+    """Уровень выбирается по числу точек; только чтение не меняет файл без агрегатов."""
+    modified = os.path.getmtime(store_path)
+    readonly = RollupStore(store_path, readonly=True)
+    assert not readonly.is_current()
+    readonly.close()
+    assert os.path.getmtime(store_path) == modified
+
+    rollups = RollupStore(store_path)
+    rollups.update()
+    assert rollups.is_current()
+    assert rollups.choose_tier(max_points=1000) is None
+    assert rollups.choose_tier(max_points=100) == "minute"
+    assert rollups.choose_tier(max_points=5) == "hour"
+    assert rollups.choose_tier(START, START + 120, max_points=100) is None
+    rollups.close()
@@ -0,0 +1,79 @@
+import os
+import sys
+import time
+import shutil
+import subprocess
+import pytest
+
+# ---------- Настройки ----------
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(SCRIPTS_DIR)
+STARTUP_BUDGET_MS = 200   # бюджет быстрой команды от запуска до выхода
+IMPORT_BUDGET_MS = 100    # бюджет импортов быстрых команд (без самого интерпретатора)
+RUNS = 3                  # замеров на команду, берётся лучший
+
+# Модули, которые быстрые команды загружать не должны
+HEAVY_MODULES = ("pandas", "numpy", "matplotlib", "plotly", "pyarrow", "openpyxl")
+# Импорты пути быстрых команд: cli и то, что импортируют tail/query/report
+QUICK_IMPORTS = "import cli, data_view"
+QUICK_COMMANDS = (
+    ["--help"],
+    ["tail", "-n", "10"],
+    ["query", "--last", "1h", "--limit", "10"],
+    ["report"],
+)
+
+@pytest.fixture(scope="module")
+def project(tmp_path_factory):
+    """
+    Копия проекта (скрипты, data/, secrets/): пути к данным считаются от scripts/,
+    поэтому команды меняют схему и создают каталог, связку ключей и агрегаты в копии,
+    а не в отслеживаемых файлах.
+    """
+    root = tmp_path_factory.mktemp("project")
+    shutil.copytree(SCRIPTS_DIR, root / "scripts", ignore=shutil.ignore_patterns("__pycache__"))
+    for name in ("data", "secrets"):
+        if os.path.isdir(os.path.join(PROJECT_DIR, name)):
+            shutil.copytree(os.path.join(PROJECT_DIR, name), root / name)
+    return root
+
+def import_times(cwd, statement=QUICK_IMPORTS):
+    """
+    Разбор вывода python -X importtime: {модуль верхнего уровня: мкс (cumulative)}
+    и множество всех загруженных модулей.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=cwd, capture_output=True, text=True, check=True,
+    )
+    top_level = {}
+    loaded = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        loaded.add(name.strip())
+        if not name.startswith("  "):  # вложенные импорты идут с отступом
+            top_level[name.strip()] = int(cumulative)
+    return top_level, loaded
+
+def test_quick_imports(project):
+    """Быстрые команды не загружают NumPy/pandas/графику и укладываются в бюджет импортов."""
+    cwd = project / "scripts"
+    import_times(cwd)  # первый запуск компилирует .pyc копии
+    top_level, loaded = import_times(cwd)
+    assert not sorted({name.split(".")[0] for name in loaded} & set(HEAVY_MODULES))
+    assert sum(top_level.values()) / 1000 <= IMPORT_BUDGET_MS
+
+@pytest.mark.parametrize("argv", QUICK_COMMANDS, ids=" ".join)
+def test_quick_command(project, argv):
+    """Лучшее из RUNS время команды cli.py от запуска до выхода."""
+    best = None
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        result = subprocess.run([sys.executable, str(project / "scripts" / "cli.py"), *argv],
+                                cwd=project, capture_output=True, text=True)
+        elapsed = (time.perf_counter() - started) * 1000
+        assert result.returncode == 0, result.stderr
+        best = elapsed if best is None else min(best, elapsed)
+    assert best <= STARTUP_BUDGET_MS